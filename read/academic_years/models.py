@@ -16,6 +16,7 @@ from django.db import models
 from django.utils.crypto import get_random_string
 
 from read.constants import PUBLIC_KEY_LENGTH_ACADEMIC_YEAR
+from read.reference_data import register_reference_data
 
 
 def generate_academic_year_key():
@@ -33,3 +34,6 @@ class AcademicYear(models.Model):
 
     def __str__(self):
         return self.name
+
+
+register_reference_data(AcademicYear, ('key', 'name'))
@@ -19,6 +19,7 @@ from rest_framework.response import Response
 from academic_years.serializers import AcademicYearSerializer
 from academic_years.models import AcademicYear
 from read.utils import get_current_academic_year
+from read.reference_data import get_reference_data
 
 
 class AcademicYearViewSet(ViewSet):
@@ -38,7 +39,7 @@ class AcademicYearViewSet(ViewSet):
     def get_current_academic_year(self, request):
         year = get_current_academic_year()
         try:
-            academic_year = AcademicYear.objects.get(name=year)
+            academic_year = get_reference_data(AcademicYear).get(name=year)
         except AcademicYear.DoesNotExist as e:
             return Response(status=404, data={"message": str(e)})
 
@@ -18,6 +18,7 @@ from django.utils.translation import gettext
 
 from read.constants import PUBLIC_KEY_LENGTH_BOOK, LENGTH_BOOK_NAME_FIELD, LENGTH_BOOK_AUTHOR_FIELD, \
     LENGTH_BOOK_PUBLISHER_FIELD, BOOK_LEVEL_1, BOOK_LEVEL_2, BOOK_LEVEL_3, BOOK_LEVEL_4
+from read.reference_data import register_reference_data
 from users.permissions import PERMISSION_CAN_IMPORT_BOOKS, PERMISSION_CAN_EXPORT_BOOKS
 
 
@@ -82,3 +83,6 @@ class Inventory(models.Model):
     class Meta:
         db_table = 'inventory'
         unique_together = ('book', 'serial_number')
+
+
+register_reference_data(BookLevel, ('name',), BookLevel.BOOK_LEVELS)
@@ -12,6 +12,64 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+
 from django.test import TestCase
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from read import labels
+from read.constants import INVENTORY_BOOKS_EXCEL_FIELDS, INVENTORY_BOOK_WORKSHEET_NAME
+from read.labels import encode_qr_code
+
+
+class QRCodeTestCase(TestCase):
+
+    def generate_qr_code(self, serial_numbers):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.title = INVENTORY_BOOK_WORKSHEET_NAME
+        worksheet.append(INVENTORY_BOOKS_EXCEL_FIELDS)
+        for serial_number in serial_numbers:
+            worksheet.append([None, serial_number, 'Good', '2019'])
+        output = BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        output.name = 'Stories.xlsx'
+
+        response = APIClient().post('/books/generate_qr_code/', {'file': output, 'file_name': 'Stories.xlsx'},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        return b''.join(response.streaming_content)
+
+    def test_generate_qr_code_draws_one_label_per_serial_number(self):
+        pdf = self.generate_qr_code(['PMC-%d.1' % index for index in range(70)])
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertIn(b'/Count 2', pdf)
+
+    @mock.patch.dict(labels._qr_glyphs, clear=True)
+    def test_reprint_only_encodes_new_serial_numbers(self):
+        self.generate_qr_code(['PMC-1.1', 'PMC-2.1'])
+        with mock.patch('read.labels.encode_qr_code', wraps=encode_qr_code) as encode:
+            self.generate_qr_code(['PMC-1.1', 'PMC-2.1', 'PMC-3.1'])
+        encode.assert_called_once_with('PMC-3.1')
+
+    @mock.patch.dict(labels._qr_glyphs, clear=True)
+    def test_label_sheets_share_one_bounded_pool(self):
+        with mock.patch('read.labels.LABEL_PROCESSES', 2), mock.patch('read.labels._label_pool', None), \
+                mock.patch('read.labels.ProcessPoolExecutor', wraps=ThreadPoolExecutor) as pool_class:
+            first = labels.get_qr_glyphs(['A-%d' % index for index in range(100)])
+            second = labels.get_qr_glyphs(['B-%d' % index for index in range(100)])
+            labels._label_pool.shutdown()
+        pool_class.assert_called_once_with(2)
+        self.assertEqual(first['A-1'], encode_qr_code('A-1'))
+        self.assertEqual(len(second), 100)
 
-# Create your tests here.
+    def test_qr_code_cache_drops_least_recently_used(self):
+        with mock.patch('read.labels.QR_CODE_CACHE_SIZE', 2), mock.patch.dict(labels._qr_glyphs, clear=True):
+            labels.get_qr_glyphs(['A', 'B'])
+            labels.get_qr_glyphs(['A', 'C'])
+            self.assertEqual(list(labels._qr_glyphs), ['A', 'C'])
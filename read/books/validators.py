@@ -36,41 +36,37 @@ def validate_book_file_import(request):
     return True, "No error"
 
 
-def validate_book_file_excel_content(rows):
-    if len(rows) == 0:
+def validate_book_file_excel_content(header_row):
+    if not header_row:
         return False, "Empty rows"
-    header_row = [cell.value for cell in rows[0]]
-    if header_row != BOOKS_EXCEL_FIELDS:
+    if [cell.value for cell in header_row] != BOOKS_EXCEL_FIELDS:
         return False, "Error in header"
 
     return True, "No error"
 
 
-def validate_book_and_inventory_file_excel_content(rows):
-    if len(rows) == 0:
+def validate_book_and_inventory_file_excel_content(header_row):
+    if not header_row:
         return False, "Empty rows"
-    header_row = [cell.value for cell in rows[0]]
-    if header_row != BOOKS_AND_INVENTORY_EXCEL_FIELDS:
+    if [cell.value for cell in header_row] != BOOKS_AND_INVENTORY_EXCEL_FIELDS:
         return False, "Error in header"
 
     return True, "No error"
 
 
-def validate_inventory_book_file_excel_content(rows):
-    if len(rows) == 0:
+def validate_inventory_book_file_excel_content(header_row):
+    if not header_row:
         return False, "Empty rows"
-    header_row = [cell.value for cell in rows[0]]
-    if header_row != INVENTORY_BOOKS_EXCEL_FIELDS:
+    if [cell.value for cell in header_row] != INVENTORY_BOOKS_EXCEL_FIELDS:
         return False, "Error in header"
 
     return True, "No error"
 
 
-def validate_school_file_excel_content(rows):
-    if len(rows) == 0:
+def validate_school_file_excel_content(header_row):
+    if not header_row:
         return False, "Empty rows"
-    header_row = [cell.value for cell in rows[0]]
-    if header_row != SCHOOLS_EXCEL_FIELDS:
+    if [cell.value for cell in header_row] != SCHOOLS_EXCEL_FIELDS:
         return False, "Error in header"
 
     return True, "No error"
@@ -12,18 +12,14 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import base64
 import logging
 
-import pyqrcode
 from datetime import datetime
 from django.db import DatabaseError
-from django.http import HttpResponse
+from django.db.models import Q
+from django.http import FileResponse
 from django.shortcuts import get_object_or_404
-from django.utils.crypto import get_random_string
 from io import BytesIO
-from openpyxl import load_workbook
-from reportlab.pdfgen import canvas
 from rest_framework import pagination
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
@@ -35,12 +31,17 @@ from books.models import Book, Inventory, BookLevel
 from books.serializers import BookSerializer, InventorySerializer
 from books.validators import validate_inventory_book_file_excel_content, validate_book_and_inventory_file_excel_content
 from read.common import convert_to_dropdown
-from read.constants import ERROR_403_JSON, BOOK_WORKSHEET_NAME, INVENTORY_BOOK_WORKSHEET_NAME, \
-    LENGTH_QR_CODE_SVG_FILENAME
+from read.constants import ERROR_403_JSON, BOOK_WORKSHEET_NAME, INVENTORY_BOOK_WORKSHEET_NAME
+from read.excel_import import load_import_workbook, read_import_rows
+from read.labels import write_label_sheet
+from read.activation import set_keys_active
+from read.sync import create_sync_response
+from read.tenancy import belongs_to_ngo
 from read.utils import create_response_error, create_serializer_error, request_user_belongs_to_book_ngo, \
-    request_user_belongs_to_books_ngo, write_to_pdf, create_response_data, get_inventory_status, \
+    create_response_data, get_inventory_status, \
     create_file_upload_error, get_valid_inventory_statuses, get_book_level, get_valid_book_levels, \
     create_file_upload_serializer_error
+from read.reference_data import get_reference_data
 from users.permissions import has_permission, PERMISSION_CAN_VIEW_BOOK, PERMISSION_CAN_CHANGE_BOOK, \
     PERMISSION_CAN_CHANGE_INVENTORY, CanDeleteInventory, CanDeleteBook, CanViewInventory
 from users.validators import validate_user_file_import
@@ -70,7 +71,7 @@ class BookViewSet(ViewSet):
         try:
             book = Book.objects.get(key=pk)
             if book_level_name is not None:
-                book_level = BookLevel.objects.get(name=book_level_name)
+                book_level = get_reference_data(BookLevel).get(name=book_level_name)
         except (Book.DoesNotExist, BookLevel.DoesNotExist) as e:
             return Response(status=404, data=create_response_error(e))
 
@@ -91,20 +92,21 @@ class BookViewSet(ViewSet):
             return Response(serializer.data)
         return Response(status=400, data=create_serializer_error(serializer))
 
-    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteBook])
+    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteBook, belongs_to_ngo(Book)])
     def deactivate_book(self, request, pk=None):
         keys = request.data.get('keys')
         book_keys = json.loads(keys)
 
-        if not request_user_belongs_to_books_ngo(request, book_keys):
-            return Response(status=403, data=ERROR_403_JSON())
-        # TODO use atomic transactions
-        books = Book.objects.filter(key__in=book_keys, ngo=request.user.ngo)
-        for book in books:
-            book.is_active = False
-            book.save()
+        count = set_keys_active(Book, book_keys, False, ngo=request.user.ngo)
+        return Response({'books': count})
+
+    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteBook, belongs_to_ngo(Book)])
+    def activate_book(self, request, pk=None):
+        keys = request.data.get('keys')
+        book_keys = json.loads(keys)
 
-        return Response(status=204)
+        count = set_keys_active(Book, book_keys, True, ngo=request.user.ngo)
+        return Response({'books': count})
 
     @action(detail=True, methods=['GET'], permission_classes=[CanViewInventory])
     def inventory(self, request, pk=None):
@@ -133,9 +135,10 @@ class BookViewSet(ViewSet):
         if not request_user_belongs_to_book_ngo(request, book):
             return Response(status=403, data=ERROR_403_JSON())
 
-        books = Inventory.objects.filter(book__key=pk, book__is_active=True, is_active=True)
-        serializer = InventorySerializer(books, many=True)
-        return Response(serializer.data)
+        inventory = Inventory.objects.filter(book=book)
+        books = inventory.filter(book__is_active=True, is_active=True)
+        return create_sync_response(request, inventory, books, InventorySerializer,
+                                    changed=lambda since: Q(book__last_modification_time__gt=since))
 
     @action(detail=False, methods=['POST'], permission_classes=[AllowAny])
     def generate_qr_code(self, request, pk=None):
@@ -144,11 +147,10 @@ class BookViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         worksheet = workbook[INVENTORY_BOOK_WORKSHEET_NAME]
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_inventory_book_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_inventory_book_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
@@ -161,9 +163,7 @@ class BookViewSet(ViewSet):
         serial_numbers = []
         error_in_file = False
         try:
-            for index, row in enumerate(rows):
-                if index == 0:
-                    continue
+            for index, row in rows:
                 key = str(row[0].value).strip() if row[0].value else None
                 serial_number = str(row[1].value).strip() if row[1].value else None
                 status_string = str(row[2].value).strip() if row[2].value else None
@@ -208,32 +208,11 @@ class BookViewSet(ViewSet):
             return Response(status=200, data=create_response_data(response))
 
         buffer = BytesIO()
-        my_canvas = canvas.Canvas(buffer, bottomup=0)
-        my_canvas.setFontSize(6)
-        my_canvas.setTitle(book_name)
-        count = 0
-        for serial_number in serial_numbers:
-            qr_code = serial_number
-            qr_label = qr_code + " " + book_name
-
-            file_path = "/tmp/" + get_random_string(LENGTH_QR_CODE_SVG_FILENAME) + ".svg"
-            qr0 = pyqrcode.create(qr_code)
-            svg = qr0.svg(file_path)
-            write_to_pdf(my_canvas, file_path, qr_label, count)
-            import os
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            count += 1
-            if count % 63 == 0:
-                my_canvas.showPage()
-                my_canvas.setFontSize(6)
-
-        my_canvas.save()
-
-        base64_excel_data = base64.b64encode(buffer.getvalue())
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename=' + BOOK_WORKSHEET_NAME + '.xlsx'
-        response.write(base64_excel_data)
+        write_label_sheet(buffer, book_name,
+                          [(serial_number, serial_number + " " + book_name) for serial_number in serial_numbers])
+        buffer.seek(0)
+        response = FileResponse(buffer, content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename=' + book_name + '.pdf'
         return response
 
     @action(detail=False, methods=['POST'], permission_classes=[AllowAny])
@@ -243,27 +222,19 @@ class BookViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         worksheet = workbook[BOOK_WORKSHEET_NAME]
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_book_and_inventory_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_book_and_inventory_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        book_levels = BookLevel.objects.all()
+        book_levels = get_reference_data(BookLevel)
         response = []
         error_in_file = False
-        buffer = BytesIO()
-        my_canvas = canvas.Canvas(buffer, bottomup=0)
-        my_canvas.setFontSize(6)
-        my_canvas.setTitle("PMC")
+        labels = []
 
-        count = 0
-
-        for index, row in enumerate(rows):
-            if index == 0:
-                continue
+        for index, row in rows:
             key = row[0].value.strip() if row[0].value else None
             book_name = row[1].value.strip() if row[1].value else None
             book_level_name = row[2].value.strip() if row[2].value else None
@@ -320,49 +291,26 @@ class BookViewSet(ViewSet):
                 qr_code = serial_number
                 qr_label = qr_code + " " + book_name
 
-                file_path = "/tmp/" + get_random_string(LENGTH_QR_CODE_SVG_FILENAME) + ".svg"
-                qr0 = pyqrcode.create(qr_code)
-                svg = qr0.svg(file_path)
-                write_to_pdf(my_canvas, file_path, qr_label, count)
-                import os
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                count += 1
-                if count % 63 == 0:
-                    my_canvas.showPage()
-                    my_canvas.setFontSize(6)
+                labels.append((qr_code, qr_label))
 
             # FOR PCMC
 
-            # my_canvas.setTitle(book_name)
             # serial_base = serial[:-5]
             # print(index)
             # for x in range(1, copies + 1):
             #     serial_number = serial_base + '-' + ("%04d" % x)
             #     qr_code = serial_number
             #     qr_label = qr_code + " " + book_name
-            #
-            #     file_path = "/tmp/" + get_random_string(LENGTH_QR_CODE_SVG_FILENAME) + ".svg"
-            #     qr0 = pyqrcode.create(qr_code)
-            #     svg = qr0.svg(file_path)
-            #     write_to_pdf(my_canvas, file_path, qr_label, count)
-            #     import os
-            #     if os.path.exists(file_path):
-            #         os.remove(file_path)
-            #     count += 1
-            #     if count % 63 == 0:
-            #         my_canvas.showPage()
-            #         my_canvas.setFontSize(6)
+            #     labels.append((qr_code, qr_label))
 
         if error_in_file:
             raise DatabaseError
 
-        my_canvas.save()
-
-        base64_excel_data = base64.b64encode(buffer.getvalue())
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename=' + BOOK_WORKSHEET_NAME + '.xlsx'
-        response.write(base64_excel_data)
+        buffer = BytesIO()
+        write_label_sheet(buffer, "PMC", labels)
+        buffer.seek(0)
+        response = FileResponse(buffer, content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename=PMC.pdf'
         return response
 
 
@@ -390,18 +338,17 @@ class InventoryViewSet(ViewSet):
             return Response(serializer.data)
         return Response(status=400, data=create_serializer_error(serializer))
 
-    @action(methods=['POST'], detail=False, permission_classes=[CanDeleteInventory])
+    @action(methods=['POST'], detail=False, permission_classes=[CanDeleteInventory, belongs_to_ngo(Inventory)])
     def deactivate_inventory_books(self, request, pk=None):
-        if not request.user.ngo:
-            return Response(status=403, data=ERROR_403_JSON())
+        inventory_keys = json.loads(request.data.get("keys"))
+        count = set_keys_active(Inventory, inventory_keys, False, ngo=request.user.ngo)
+        return Response({'inventory': count})
 
-        # TODO SEND BOOK key too.
+    @action(methods=['POST'], detail=False, permission_classes=[CanDeleteInventory, belongs_to_ngo(Inventory)])
+    def activate_inventory_books(self, request, pk=None):
         inventory_keys = json.loads(request.data.get("keys"))
-        inventory_books = Inventory.objects.filter(key__in=inventory_keys)
-        for inventory in inventory_books:
-            inventory.is_active = False
-            inventory.save()
-        return Response(status=204)
+        count = set_keys_active(Inventory, inventory_keys, True, ngo=request.user.ngo)
+        return Response({'inventory': count})
 
 
 class BookLevelViewSet(ViewSet):
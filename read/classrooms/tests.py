@@ -12,6 +12,93 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import base64
+from io import BytesIO
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook, load_workbook
+from rest_framework.test import APIClient
+
+from academic_years.models import AcademicYear
+from classrooms.models import Classroom, ClassroomAcademicYear
+from ngos.models import NGO
+from read.constants import STUDENTS_EXCEL_FIELDS, DEFAULT_WORKSHEET_NAME, STUDENT_WORKSHEET_NAME, EXPORT_MODE_STREAM
+from schools.models import School, SchoolCategory, SchoolType, SchoolMedium, Standard
+from students.models import Student
+from users.models import User
+
+
+class ClassroomImportTestCase(TestCase):
+
+    def setUp(self):
+        self.ngo = NGO.objects.create(name='NGO', address='Pune')
+        self.academic_year = AcademicYear.objects.create(name='AY 19-20')
+        school = School.objects.create(name='School', address='Pune', pin_code=411001, ngo=self.ngo,
+                                       school_category=SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED'),
+                                       school_type=SchoolType.objects.create(name='SCHOOL_TYPE_PMC'),
+                                       medium=SchoolMedium.objects.create(name='SCHOOL_MEDIUM_MARATHI'))
+        self.classroom = Classroom.objects.create(school=school, standard=Standard.objects.create(name='STANDARD_I'),
+                                                  division='A')
+        admin = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                              first_name='Admin', last_name='User', ngo=self.ngo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=admin)
+
+    def import_students(self, rows):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.title = DEFAULT_WORKSHEET_NAME
+        worksheet.append(STUDENTS_EXCEL_FIELDS)
+        for row in rows:
+            worksheet.append(row)
+        output = BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        output.name = 'students.xlsx'
+        return self.client.post('/classrooms/%s/import_students/' % self.classroom.key,
+                                {'file': output, 'academic_year': self.academic_year.key}, format='multipart')
+
+    def student_rows(self, count, offset=0):
+        return [[None, 'Student', None, str(index), 'Pune', 'Female', 'Marathi', '2012-01-01', 'yes']
+                for index in range(offset, offset + count)]
+
+    def test_import_students_creates_and_reports_duplicates(self):
+        rows = self.student_rows(2)
+        response = self.import_students(rows + [rows[0], [None] * len(STUDENTS_EXCEL_FIELDS)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([list(error) for error in response.data['message']], [['3']])
+        self.assertEqual(ClassroomAcademicYear.objects.filter(classroom=self.classroom).count(), 2)
+
+        student = Student.objects.get(last_name='0')
+        response = self.import_students([[student.key, 'Asha', None, '0', 'Pune', 'Female', 'Marathi',
+                                          '2012-01-01', 'no']])
+        self.assertEqual(response.data['message'], [])
+        student.refresh_from_db()
+        self.assertEqual(student.first_name, 'Asha')
+        self.assertFalse(student.has_attended_preschool)
+        self.assertEqual(ClassroomAcademicYear.objects.filter(classroom=self.classroom).count(), 2)
+
+    def test_import_students_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few_rows:
+            self.import_students(self.student_rows(5))
+        with CaptureQueriesContext(connection) as many_rows:
+            self.import_students(self.student_rows(50, offset=5))
+        self.assertEqual(Student.objects.count(), 55)
+        self.assertEqual(len(few_rows), len(many_rows))
+
+    def export_students(self, **params):
+        params['academic_year'] = self.academic_year.key
+        response = self.client.get('/classrooms/%s/export_students/' % self.classroom.key, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def read_students(self, content):
+        worksheet = load_workbook(BytesIO(content), read_only=True)[STUDENT_WORKSHEET_NAME]
+        return sorted(row[3] for row in worksheet.iter_rows(min_row=2, values_only=True) if row[0])
 
-# Create your tests here.
+    def test_export_students_streams_workbook(self):
+        self.import_students(self.student_rows(3))
+        self.assertEqual(self.read_students(self.export_students(mode=EXPORT_MODE_STREAM)), ['0', '1', '2'])
+        self.assertEqual(self.read_students(base64.b64decode(self.export_students())), ['0', '1', '2'])
@@ -12,14 +12,10 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import base64
 
 import datetime
-from django.db import transaction, DatabaseError
-from django.http import HttpResponse
+from django.db import transaction, DatabaseError, connection
 from django.shortcuts import get_object_or_404
-from io import BytesIO
-from openpyxl import load_workbook
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
@@ -31,8 +27,11 @@ from classrooms.serializers import ClassroomSerializer, ClassroomAcademicYearSer
 from classrooms.validators import validate_student_request, \
     validate_students_file_export, validate_students_file_import
 from read.constants import FileType, STUDENT_WORKSHEET_NAME, FEMALE, MALE, ERROR_403_JSON, DEFAULT_WORKSHEET_NAME
-from read.utils import write_to_excel, create_file_upload_error, create_file_upload_serializer_error, \
+from read.excel_export import create_excel_response
+from read.excel_import import load_import_workbook, read_import_rows, chunk_import_rows
+from read.utils import create_file_upload_error, create_file_upload_serializer_error, \
     create_response_data, create_serializer_error, create_response_error, request_user_belongs_to_classroom_ngo
+from read.reference_data import get_reference_data
 from students.models import Student
 from students.serializers import StudentSerializer
 from students.validators import validate_student_file_excel_content
@@ -72,7 +71,7 @@ class ClassroomViewSet(ViewSet):
         academic_year_key = request.data.get('academic_year')
         try:
             classroom = Classroom.objects.get(key=pk)
-            academic_year = AcademicYear.objects.get(key=academic_year_key)
+            academic_year = get_reference_data(AcademicYear).get(key=academic_year_key)
         except (Classroom.DoesNotExist, AcademicYear.DoesNotExist):
             return Response(status=404)
 
@@ -113,12 +112,11 @@ class ClassroomViewSet(ViewSet):
 
         academic_year_key = request.POST.get('academic_year')
         try:
-            academic_year = AcademicYear.objects.get(key=academic_year_key)
+            academic_year = get_reference_data(AcademicYear).get(key=academic_year_key)
         except AcademicYear.DoesNotExist as e:
             return Response(status=404, data=create_response_error(e))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         try:
             worksheet = workbook[STUDENT_WORKSHEET_NAME]
         except KeyError as e:
@@ -128,123 +126,126 @@ class ClassroomViewSet(ViewSet):
             worksheet = workbook[DEFAULT_WORKSHEET_NAME]
         except KeyError as e:
             return Response(create_response_data("Incorrect excel sheet name"))
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_student_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_student_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
         response = []
+        # Students already in the classroom, so new rows with the same name and gender are reported as duplicates
+        enrolled_students = set(ClassroomAcademicYear.objects.filter(classroom=classroom, academic_year=academic_year)
+                                .values_list('student__first_name', 'student__last_name', 'student__gender'))
         try:
             with transaction.atomic():
                 error_in_file = False
-                for index, row in enumerate(rows):
-                    if index == 0:
-                        continue
-                    key = str(row[0].value).strip() if row[0].value else None
-                    first_name = str(row[1].value).strip() if row[1].value else None
-                    middle_name = str(row[2].value).strip() if row[2].value else None
-                    last_name = str(row[3].value).strip() if row[3].value else None
-                    address = str(row[4].value).strip() if row[4].value else None
-                    gender = str(row[5].value).strip() if row[5].value else None
-                    mother_tongue = str(row[6].value).strip() if row[6].value else None
-                    birth_date_string = row[7].value
-                    has_attended_preschool = str(row[8].value).strip() if row[8].value else None
-
-                    if key is None and first_name is None and last_name is None and gender is None and birth_date_string is None:
-                        continue
-
-                    if gender and gender.lower() == "female":
-                        gender = FEMALE
-                    elif gender and gender.lower() == "male":
-                        gender = MALE
-                    else:
-                        error_in_file = True
-                        response.append(create_file_upload_error(index, 'gender', 'Value must be Female or Male'))
-                        continue
-
-                    birth_date = None
-                    if birth_date_string:
-                        try:
-                            if type(birth_date_string) is not datetime.datetime:
-                                birth_date_string = birth_date_string.strip() if row[7].value else None
-                                birth_date = datetime.datetime.strptime(birth_date_string, "%Y-%m-%d").date()
-                            else:
-                                birth_date = birth_date_string.date()
-                        except ValueError:
-                            error_in_file = True
-                            response.append(create_file_upload_error(index, 'birth_date', 'Value must be yyyy-mm-dd'))
+                for chunk in chunk_import_rows(rows):
+                    existing_students = Student.objects.in_bulk(
+                        [str(row[0].value).strip() for index, row in chunk if row[0].value], field_name='key')
+                    new_students = []
+                    updated_students = {}
+                    for index, row in chunk:
+                        key = str(row[0].value).strip() if row[0].value else None
+                        first_name = str(row[1].value).strip() if row[1].value else None
+                        middle_name = str(row[2].value).strip() if row[2].value else None
+                        last_name = str(row[3].value).strip() if row[3].value else None
+                        address = str(row[4].value).strip() if row[4].value else None
+                        gender = str(row[5].value).strip() if row[5].value else None
+                        mother_tongue = str(row[6].value).strip() if row[6].value else None
+                        birth_date_string = row[7].value
+                        has_attended_preschool = str(row[8].value).strip() if row[8].value else None
+
+                        if key is None and first_name is None and last_name is None and gender is None and birth_date_string is None:
                             continue
-                    else:
-                        error_in_file = True
-                        response.append(create_file_upload_error(index, 'birth_date', 'Value must be yyyy-mm-dd'))
-                        continue
-
-                    if has_attended_preschool:
-                        if has_attended_preschool.lower() == "yes":
-                            has_attended_preschool = True
-                        elif has_attended_preschool.lower() == "no":
-                            has_attended_preschool = False
+
+                        if gender and gender.lower() == "female":
+                            gender = FEMALE
+                        elif gender and gender.lower() == "male":
+                            gender = MALE
                         else:
                             error_in_file = True
-                            response.append(create_file_upload_error(index, 'has_attended_preschool',
-                                                                     'Value must be yes or no'))
+                            response.append(create_file_upload_error(index, 'gender', 'Value must be Female or Male'))
                             continue
 
-                    student_data = {
-                        'first_name': first_name,
-                        'middle_name': middle_name,
-                        'last_name': last_name,
-                        'address': address,
-                        'gender': gender,
-                        'mother_tongue': mother_tongue,
-                        'birth_date': birth_date,
-                        'has_attended_preschool': has_attended_preschool,
-                    }
-
-                    if key:
-                        student = Student.objects.filter(key=key).first()
-                        if not student:
-                            # Student does not exist
+                        birth_date = None
+                        if birth_date_string:
+                            try:
+                                if type(birth_date_string) is not datetime.datetime:
+                                    birth_date_string = birth_date_string.strip() if row[7].value else None
+                                    birth_date = datetime.datetime.strptime(birth_date_string, "%Y-%m-%d").date()
+                                else:
+                                    birth_date = birth_date_string.date()
+                            except ValueError:
+                                error_in_file = True
+                                response.append(create_file_upload_error(index, 'birth_date', 'Value must be yyyy-mm-dd'))
+                                continue
+                        else:
                             error_in_file = True
-                            response.append(create_file_upload_error(index, 'key',
-                                                                     'Student with specified key does not exist'))
+                            response.append(create_file_upload_error(index, 'birth_date', 'Value must be yyyy-mm-dd'))
                             continue
 
-                        student_serializer = StudentSerializer(student, data=student_data)
-                        if student_serializer.is_valid():
-                            student_serializer.save()
-                        else:
-                            response.append(create_file_upload_serializer_error(index, student_serializer.errors))
-
-                        classroom_academic_year, created = ClassroomAcademicYear.objects.get_or_create(
-                            student=student,
-                            classroom=classroom,
-                            academic_year=academic_year,
-                        )
-                    else:
-
-                        # Create the student and add him/her to the classroomacademicyear
-                        student_serializer = StudentSerializer(data=student_data)
-                        if student_serializer.is_valid():
-                            # Check if another student with the same credentials exists
-                            students = Student.objects.filter(first_name=first_name, last_name=last_name, gender=gender)
-                            duplicate_students = ClassroomAcademicYear.objects.filter(student__in=students,
-                                                                                      classroom=classroom,
-                                                                                      academic_year=academic_year)
-                            if duplicate_students:
-                                response.append(create_file_upload_error(index, 'student',
-                                                                         'Student with the same name, gender and dob exists in the same classroom'))
+                        if has_attended_preschool:
+                            if has_attended_preschool.lower() == "yes":
+                                has_attended_preschool = True
+                            elif has_attended_preschool.lower() == "no":
+                                has_attended_preschool = False
+                            else:
+                                error_in_file = True
+                                response.append(create_file_upload_error(index, 'has_attended_preschool',
+                                                                         'Value must be yes or no'))
+                                continue
+
+                        student_data = {
+                            'first_name': first_name,
+                            'middle_name': middle_name,
+                            'last_name': last_name,
+                            'address': address,
+                            'gender': gender,
+                            'mother_tongue': mother_tongue,
+                            'birth_date': birth_date,
+                            'has_attended_preschool': has_attended_preschool,
+                        }
+
+                        if key:
+                            student = existing_students.get(key)
+                            if not student:
+                                # Student does not exist
+                                error_in_file = True
+                                response.append(create_file_upload_error(index, 'key',
+                                                                         'Student with specified key does not exist'))
+                                continue
+
+                            student_serializer = StudentSerializer(student, data=student_data)
+                            if student_serializer.is_valid():
+                                student_serializer.save()
                             else:
-                                student = student_serializer.save()
-                                ClassroomAcademicYear.objects.create(
-                                    student=student,
-                                    classroom=classroom,
-                                    academic_year=academic_year,
-                                )
-                                print("Creating new students:")
+                                response.append(create_file_upload_serializer_error(index, student_serializer.errors))
+                            updated_students[student.id] = student
                         else:
-                            error_in_file = True
-                            response.append(create_file_upload_serializer_error(index, student_serializer.errors))
+
+                            # Create the student and add him/her to the classroomacademicyear
+                            student_serializer = StudentSerializer(data=student_data)
+                            if student_serializer.is_valid():
+                                if (first_name, last_name, gender) in enrolled_students:
+                                    response.append(create_file_upload_error(index, 'student',
+                                                                             'Student with the same name, gender and dob exists in the same classroom'))
+                                else:
+                                    new_students.append(Student(**student_serializer.validated_data))
+                                    enrolled_students.add((first_name, last_name, gender))
+                            else:
+                                error_in_file = True
+                                response.append(create_file_upload_serializer_error(index, student_serializer.errors))
+
+                    # Each chunk is written in bulk before the next one is read
+                    Student.objects.bulk_create(new_students)
+                    if not connection.features.can_return_ids_from_bulk_insert:
+                        new_students = Student.objects.filter(key__in=[student.key for student in new_students])
+                    updated_student_ids = set(updated_students) - set(ClassroomAcademicYear.objects.filter(
+                        student__in=updated_students, classroom=classroom, academic_year=academic_year
+                    ).values_list('student_id', flat=True))
+                    ClassroomAcademicYear.objects.bulk_create([
+                        ClassroomAcademicYear(student=student, classroom=classroom, academic_year=academic_year)
+                        for student in list(new_students) + [updated_students[student_id]
+                                                             for student_id in updated_student_ids]])
 
                 if error_in_file:
                     raise DatabaseError
@@ -268,27 +269,21 @@ class ClassroomViewSet(ViewSet):
 
         academic_year_key = request.GET.get('academic_year')
         try:
-            academic_year = AcademicYear.objects.get(key=academic_year_key)
+            academic_year = get_reference_data(AcademicYear).get(key=academic_year_key)
         except AcademicYear.DoesNotExist as e:
             return Response(status=404, data=create_response_error(e))
 
-        students_in_classroom = ClassroomAcademicYear.objects.filter(classroom=classroom,
-                                                                     academic_year=academic_year,
-                                                                     student__is_active=True).all()
-        students = [student_in_classroom.student for student_in_classroom in students_in_classroom]
-        excel_data = write_to_excel(FileType.STUDENT, students)
-        base64_excel_data = base64.b64encode(excel_data)
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename=' + STUDENT_WORKSHEET_NAME + '.xlsx'
-        response.write(base64_excel_data)
-        return response
+        students = Student.objects.filter(classroomacademicyear__classroom=classroom,
+                                          classroomacademicyear__academic_year=academic_year,
+                                          is_active=True).order_by('classroomacademicyear__pk').iterator()
+        return create_excel_response(request, FileType.STUDENT, students, STUDENT_WORKSHEET_NAME + '.xlsx')
 
     @action(detail=True, methods=['GET'])
     def students(self, request, pk=None):
         academic_year_key = request.GET.get('academic_year')
         try:
             classroom = Classroom.objects.get(key=pk)
-            AcademicYear.objects.get(key=academic_year_key)
+            get_reference_data(AcademicYear).get(key=academic_year_key)
         except (Classroom.DoesNotExist, AcademicYear.DoesNotExist) as e:
             return Response(status=404, data=create_response_error(e))
 
@@ -0,0 +1,61 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Generated by Django 2.1.5 on 2026-10-18 13:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import jobs.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(default=jobs.models.generate_job_key, max_length=12, unique=True)),
+                ('job_type', models.CharField(choices=[('import_users', 'import_users'), ('export_users', 'export_users'), ('import_books', 'import_books'), ('import_books_to_inventory', 'import_books_to_inventory'), ('import_books_and_create_inventory', 'import_books_and_create_inventory'), ('export_books', 'export_books'), ('export_inventory', 'export_inventory'), ('import_schools', 'import_schools'), ('export_schools', 'export_schools'), ('import_students', 'import_students'), ('export_students', 'export_students'), ('generate_qr_code', 'generate_qr_code')], max_length=50)),
+                ('status', models.CharField(choices=[('pe', 'Pending'), ('ru', 'Running'), ('do', 'Done'), ('fa', 'Failed')], default='pe', max_length=2)),
+                ('object_key', models.CharField(blank=True, max_length=20, null=True)),
+                ('parameters', models.TextField(blank=True, default='{}')),
+                ('input_file', models.FileField(blank=True, null=True, upload_to='jobs/input/')),
+                ('result_file', models.FileField(blank=True, null=True, upload_to='jobs/results/')),
+                ('result_status', models.IntegerField(blank=True, null=True)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('processed_rows', models.IntegerField(default=0)),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'jobs',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together={('status', 'id')},
+        ),
+    ]
@@ -0,0 +1,72 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.db import models
+from django.utils.crypto import get_random_string
+
+from read.constants import PUBLIC_KEY_LENGTH_JOB
+
+
+def generate_job_key():
+    return get_random_string(PUBLIC_KEY_LENGTH_JOB)
+
+
+class Job(models.Model):
+    PENDING = 'pe'
+    RUNNING = 'ru'
+    DONE = 'do'
+    FAILED = 'fa'
+    STATUSES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+    # Method and url name of the endpoint the worker calls for each job type
+    OPERATIONS = {
+        'import_users': ('post', 'ngos-import-users'),
+        'export_users': ('get', 'ngos-export-users'),
+        'import_books': ('post', 'ngos-import-books'),
+        'import_books_to_inventory': ('post', 'ngos-import-books-to-inventory'),
+        'import_books_and_create_inventory': ('post', 'ngos-import-books-and-create-inventory'),
+        'export_books': ('get', 'ngos-export-books'),
+        'export_inventory': ('get', 'ngos-export-inventory'),
+        'import_schools': ('post', 'ngos-import-schools'),
+        'export_schools': ('get', 'ngos-export-schools'),
+        'import_students': ('post', 'classrooms-import-students'),
+        'export_students': ('get', 'classrooms-export-students'),
+        'generate_qr_code': ('post', 'books-generate-qr-code'),
+    }
+    TYPES = tuple((job_type, job_type) for job_type in OPERATIONS)
+
+    key = models.CharField(max_length=PUBLIC_KEY_LENGTH_JOB, default=generate_job_key, unique=True)
+    job_type = models.CharField(max_length=50, choices=TYPES, null=False, blank=False)
+    status = models.CharField(max_length=2, choices=STATUSES, default=PENDING, null=False, blank=False)
+    user = models.ForeignKey('users.User', null=False, blank=False, on_delete=models.PROTECT)
+    object_key = models.CharField(max_length=20, null=True, blank=True)
+    parameters = models.TextField(default='{}', blank=True)
+    input_file = models.FileField(upload_to='jobs/input/', null=True, blank=True)
+    result_file = models.FileField(upload_to='jobs/results/', null=True, blank=True)
+    result_status = models.IntegerField(null=True, blank=True)
+    result = models.TextField(null=True, blank=True)
+    processed_rows = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    start_time = models.DateTimeField(null=True, blank=True)
+    end_time = models.DateTimeField(null=True, blank=True)
+    creation_time = models.DateTimeField(auto_now=False, auto_now_add=True)
+    last_modification_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'jobs'
+        index_together = (('status', 'id'),)
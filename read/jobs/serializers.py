@@ -0,0 +1,37 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from rest_framework.fields import SerializerMethodField
+from rest_framework.serializers import ModelSerializer
+from rest_framework.utils import json
+
+from jobs.models import Job
+
+
+class JobSerializer(ModelSerializer):
+    lookup_field = 'key'
+    pk_field = 'key'
+    result = SerializerMethodField()
+    has_result_file = SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('key', 'job_type', 'status', 'object_key', 'processed_rows', 'result_status', 'result',
+                  'has_result_file', 'start_time', 'end_time', 'creation_time')
+
+    def get_result(self, obj):
+        return json.loads(obj.result) if obj.result else None
+
+    def get_has_result_file(self, obj):
+        return bool(obj.result_file)
@@ -0,0 +1,122 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from jobs.utils import JOB_MAX_ATTEMPTS, JOB_STALE_TIMEOUT
+from ngos.models import NGO
+from read.constants import USERS_EXCEL_FIELDS, USER_WORKSHEET_NAME, GroupType
+from read.utils import get_ngo_specific_group_name
+from users.models import User
+
+
+class JobTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        self.ngo = NGO.objects.create(name='NGO', address='Pune')
+        for group_type in GroupType:
+            Group.objects.create(name=get_ngo_specific_group_name(group_type, self.ngo.key))
+        self.admin = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                                   first_name='Admin', last_name='User', ngo=self.ngo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def submit(self, job_type, **data):
+        response = self.client.post('/jobs/', dict(data, job_type=job_type, key=self.ngo.key), format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], Job.PENDING)
+        return response.data['key']
+
+    def run_jobs(self, job_key):
+        call_command('run_jobs', '--once')
+        response = self.client.get('/jobs/%s/' % job_key)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_import_job_records_progress_and_result(self):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.title = USER_WORKSHEET_NAME
+        worksheet.append(USERS_EXCEL_FIELDS)
+        worksheet.append([None, 'fairy', 'Book', None, 'Fairy', None, 'Book Fairy'])
+        worksheet.append([None, 'supervisor', 'Super', None, 'Visor', 'supervisor@read.org', 'Supervisor'])
+        output = BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        output.name = 'users.xlsx'
+
+        job = self.run_jobs(self.submit('import_users', file=output))
+        self.assertEqual(job['status'], Job.DONE)
+        self.assertEqual(job['processed_rows'], 2)
+        self.assertEqual(job['result'], {'message': []})
+        self.assertFalse(job['has_result_file'])
+        self.assertTrue(User.objects.filter(username='supervisor', ngo=self.ngo).exists())
+
+    def test_export_job_result_is_downloaded_by_its_user_only(self):
+        job_key = self.submit('export_users')
+        self.assertEqual(self.client.get('/jobs/%s/download/' % job_key).status_code, 404)
+
+        job = self.run_jobs(job_key)
+        self.assertEqual(job['status'], Job.DONE)
+        self.assertTrue(job['has_result_file'])
+        response = self.client.get('/jobs/%s/download/' % job_key)
+        self.assertEqual(response.status_code, 200)
+        worksheet = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)[USER_WORKSHEET_NAME]
+        self.assertIn('admin', [row[1] for row in worksheet.iter_rows(min_row=2, values_only=True)])
+
+        other = User.objects.create_user(username='other', password='other', first_name='Other', last_name='User',
+                                         ngo=self.ngo)
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get('/jobs/%s/' % job_key).status_code, 404)
+        self.assertEqual(self.client.get('/jobs/%s/download/' % job_key).status_code, 404)
+
+    def test_jobs_of_a_stopped_worker_are_requeued(self):
+        job_key = self.submit('export_users')
+        gave_up_key = self.submit('export_users')
+        stale_time = timezone.now() - JOB_STALE_TIMEOUT - timedelta(minutes=1)
+        Job.objects.filter(key=job_key).update(status=Job.RUNNING, start_time=stale_time, attempts=1,
+                                               last_modification_time=stale_time)
+        Job.objects.filter(key=gave_up_key).update(status=Job.RUNNING, start_time=stale_time,
+                                                   attempts=JOB_MAX_ATTEMPTS, last_modification_time=stale_time)
+        running_key = self.submit('export_users')
+        Job.objects.filter(key=running_key).update(status=Job.RUNNING, start_time=stale_time, attempts=1)
+
+        job = self.run_jobs(job_key)
+        self.assertEqual(job['status'], Job.DONE)
+        self.assertEqual(Job.objects.get(key=job_key).attempts, 2)
+        self.assertEqual(Job.objects.get(key=gave_up_key).status, Job.FAILED)
+        self.assertEqual(Job.objects.get(key=running_key).status, Job.RUNNING)
+
+    def test_submit_checks_job_type_and_file(self):
+        self.assertEqual(self.client.post('/jobs/', {'job_type': 'drop_tables'}).status_code, 400)
+        self.assertEqual(self.client.post('/jobs/', {'job_type': 'import_users', 'key': self.ngo.key}).status_code,
+                         400)
+        self.assertEqual(Job.objects.count(), 0)
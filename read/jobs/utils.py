@@ -0,0 +1,128 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import connection
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.utils import json
+from rest_framework.utils.encoders import JSONEncoder
+
+from jobs.models import Job
+from read.constants import EXPORT_MODE_STREAM
+from read.excel_import import ImportProgress, track_import_progress
+from read.utils import create_response_data
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 2
+# A running job that has not reported progress for this long lost its worker
+JOB_STALE_TIMEOUT = timedelta(minutes=5)
+JOB_MAX_ATTEMPTS = 3
+
+
+def claim_next_job():
+    # Locked rows are skipped so several workers can share the queue on PostgreSQL
+    job = Job.objects.select_for_update(skip_locked=True).filter(status=Job.PENDING).order_by('id').first()
+    if job:
+        job.status = Job.RUNNING
+        job.start_time = timezone.now()
+        job.attempts += 1
+        job.save()
+    return job
+
+
+def requeue_stale_jobs():
+    # Imports run in a transaction that died with the worker, so the job can start over, unless it keeps
+    # taking its worker down with it
+    stale_jobs = Job.objects.filter(status=Job.RUNNING,
+                                    last_modification_time__lt=timezone.now() - JOB_STALE_TIMEOUT)
+    failed = stale_jobs.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, end_time=timezone.now(), last_modification_time=timezone.now())
+    requeued = stale_jobs.update(status=Job.PENDING, start_time=None, processed_rows=0,
+                                 last_modification_time=timezone.now())
+    return requeued, failed
+
+
+def call_job_operation(job):
+    # The job replays the request its endpoint would have received, as the user who submitted it
+    method, url_name = Job.OPERATIONS[job.job_type]
+    path = reverse(url_name, args=[job.object_key] if job.object_key else [])
+    data = json.loads(job.parameters)
+    if method == 'get':
+        data['mode'] = EXPORT_MODE_STREAM
+        request = APIRequestFactory().get(path, data)
+    else:
+        if job.input_file:
+            data['file'] = job.input_file.open('rb')
+        request = APIRequestFactory().post(path, data, format='multipart')
+        if job.input_file:
+            job.input_file.close()
+    force_authenticate(request, user=job.user)
+    match = resolve(path)
+    return match.func(request, *match.args, **match.kwargs)
+
+
+def _run_job_operation(job, progress, outcome):
+    try:
+        with track_import_progress(progress):
+            outcome['response'] = call_job_operation(job)
+    except Exception:
+        logger.exception("Job %s failed", job.key)
+    finally:
+        connection.close()
+
+
+def save_job_response(job, response):
+    job.result_status = response.status_code
+    if response.streaming:
+        file_name = re.search(r'filename=(.+)$', response.get('Content-Disposition', 'filename=result')).group(1)
+        with tempfile.TemporaryFile() as output:
+            for chunk in response.streaming_content:
+                output.write(chunk)
+            output.seek(0)
+            job.result_file.save(file_name, File(output), save=False)
+    elif hasattr(response, 'data'):
+        job.result = json.dumps(response.data, cls=JSONEncoder)
+    else:
+        job.result = json.dumps(create_response_data(response.content.decode()))
+
+
+def run_job(job):
+    progress = ImportProgress()
+    outcome = {}
+    thread = threading.Thread(target=_run_job_operation, args=(job, progress, outcome))
+    thread.start()
+    # Imports run inside a transaction, so progress is saved from here over a connection of its own
+    while thread.is_alive():
+        thread.join(PROGRESS_INTERVAL)
+        Job.objects.filter(id=job.id).update(processed_rows=progress.rows, last_modification_time=timezone.now())
+
+    job.processed_rows = progress.rows
+    response = outcome.get('response')
+    if response is None:
+        job.status = Job.FAILED
+    else:
+        save_job_response(job, response)
+        job.status = Job.DONE if response.status_code < 400 else Job.FAILED
+    job.end_time = timezone.now()
+    job.save()
+    return job
@@ -0,0 +1,68 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import mimetypes
+import os
+
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse, NoReverseMatch
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.utils import json
+from rest_framework.viewsets import ViewSet
+
+from jobs.models import Job
+from jobs.serializers import JobSerializer
+from read.utils import create_response_data
+
+
+class JobViewSet(ViewSet):
+
+    def create(self, request):
+        job_type = request.data.get('job_type')
+        if job_type not in Job.OPERATIONS:
+            return Response(status=400, data=create_response_data(
+                "Job type must be one of " + ', '.join(Job.OPERATIONS)))
+
+        method, url_name = Job.OPERATIONS[job_type]
+        object_key = request.data.get('key')
+        try:
+            reverse(url_name, args=[object_key] if object_key else [])
+        except NoReverseMatch:
+            return Response(status=400, data=create_response_data("Invalid key"))
+
+        if method == 'post' and not request.FILES.get('file'):
+            return Response(status=400, data=create_response_data("Empty data"))
+
+        parameters = {name: value for name, value in request.data.items() if name not in ('job_type', 'key', 'file')}
+        job = Job.objects.create(job_type=job_type, user=request.user, object_key=object_key,
+                                 parameters=json.dumps(parameters), input_file=request.FILES.get('file'))
+        return Response(status=202, data=JobSerializer(job).data)
+
+    def retrieve(self, request, pk=None):
+        job = get_object_or_404(Job.objects.filter(user=request.user), key=pk)
+        return Response(JobSerializer(job).data)
+
+    @action(methods=['GET'], detail=True)
+    def download(self, request, pk=None):
+        job = get_object_or_404(Job.objects.filter(user=request.user), key=pk)
+        if not job.result_file:
+            return Response(status=404, data=create_response_data("Job has no result file"))
+
+        file_name = os.path.basename(job.result_file.name)
+        response = FileResponse(job.result_file.open('rb'),
+                                content_type=mimetypes.guess_type(file_name)[0] or 'application/octet-stream')
+        response['Content-Disposition'] = 'attachment; filename=' + file_name
+        return response
@@ -16,6 +16,7 @@ from django.db import models
 from django.utils.crypto import get_random_string
 
 from read.constants import PUBLIC_KEY_LENGTH_NGO, PUBLIC_KEY_LENGTH_LEVEL
+from read.reference_data import register_reference_data
 
 
 def generate_ngo_key():
@@ -58,3 +59,5 @@ class Level(models.Model):
     def __str__(self):
         return self.en_in
 
+
+register_reference_data(Level, ('key',))
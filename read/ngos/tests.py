@@ -12,6 +12,325 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import base64
+import json
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.models import Group
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from rest_framework.test import APIClient
+
+from books.models import Book, BookLevel, Inventory
+from classrooms.models import Classroom
+from ngos.models import NGO
+from read.constants import USERS_EXCEL_FIELDS, USER_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, BOOK_WORKSHEET_NAME, \
+    INVENTORY_BOOKS_EXCEL_FIELDS, INVENTORY_BOOK_WORKSHEET_NAME, SCHOOLS_EXCEL_FIELDS, SCHOOL_WORKSHEET_NAME, GroupType, \
+    EXPORT_MODE_STREAM
+from read.sync import SYNC_MARGIN
+from read.utils import get_ngo_specific_group_name
+from schools.models import School, SchoolCategory, SchoolType, SchoolMedium, Standard
+from users.models import User
+
+
+class NGOImportTestCase(TestCase):
+
+    def setUp(self):
+        self.ngo = NGO.objects.create(name='NGO', address='Pune')
+        for group_type in GroupType:
+            Group.objects.create(name=get_ngo_specific_group_name(group_type, self.ngo.key))
+        SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED')
+        SchoolType.objects.create(name='SCHOOL_TYPE_PMC')
+        SchoolMedium.objects.create(name='SCHOOL_MEDIUM_MARATHI')
+        BookLevel.objects.create(name='BOOK_LEVEL_1')
+        admin = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                              first_name='Admin', last_name='User', ngo=self.ngo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=admin)
+
+    def import_file(self, action, worksheet_name, header, rows, **data):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.title = worksheet_name
+        worksheet.append(header)
+        for row in rows:
+            worksheet.append(row)
+        output = BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        output.name = 'import.xlsx'
+        data['file'] = output
+        response = self.client.post('/ngos/%s/%s/' % (self.ngo.key, action), data, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response.data['message']
+
+    def school_rows(self, count, offset=0):
+        return [[None, 'School %d' % index, 'Pune', 411001, None, None, 'Co-Ed', 'PMC', 'Marathi', None, '2019']
+                for index in range(offset, offset + count)]
+
+    def test_import_users_creates_updates_and_checks_usernames(self):
+        errors = self.import_file('import_users', USER_WORKSHEET_NAME, USERS_EXCEL_FIELDS, [
+            [None, 'fairy', 'Book', None, 'Fairy', None, 'Book Fairy'],
+            [None, 'supervisor', 'Super', None, 'Visor', 'supervisor@read.org', 'Supervisor']])
+        self.assertEqual(errors, [])
+        fairy = User.objects.get(username='fairy')
+        self.assertTrue(fairy.check_password('admin'))
+        self.assertEqual(list(fairy.groups.values_list('name', flat=True)),
+                         [get_ngo_specific_group_name(GroupType.BOOK_FAIRY, self.ngo.key)])
+
+        errors = self.import_file('import_users', USER_WORKSHEET_NAME, USERS_EXCEL_FIELDS, [
+            [fairy.key, 'fairy', 'Asha', None, 'Fairy', 'fairy@read.org', 'Supervisor'],
+            [None, 'admin', 'Other', None, 'Admin', None, 'Book Fairy']])
+        self.assertEqual(errors, [{'2': {'username': ['A user with that username already exists.']}}])
+        self.assertEqual(User.objects.get(pk=fairy.pk).first_name, 'Book')
+
+        errors = self.import_file('import_users', USER_WORKSHEET_NAME, USERS_EXCEL_FIELDS, [
+            [fairy.key, 'fairy', 'Asha', None, 'Fairy', 'fairy@read.org', 'Supervisor']])
+        self.assertEqual(errors, [])
+        fairy.refresh_from_db()
+        self.assertEqual((fairy.first_name, fairy.email), ('Asha', 'fairy@read.org'))
+        self.assertEqual(list(fairy.groups.values_list('name', flat=True)),
+                         [get_ngo_specific_group_name(GroupType.SUPERVISOR, self.ngo.key)])
+
+    def test_import_books_and_inventory(self):
+        errors = self.import_file('import_books', BOOK_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, [
+            [None, 'Book', 'Level 1', 'Author', None, 10], [None, 'Book', None, None, None, None]])
+        self.assertEqual(errors, [{'2': {'name': ['Book with same name already exists']}}])
+        self.assertFalse(Book.objects.exists())
+
+        self.import_file('import_books', BOOK_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, [
+            [None, 'Book', 'Level 1', 'Author', None, 10]])
+        book = Book.objects.get()
+        self.assertEqual((book.author, book.level.name), ('Author', 'BOOK_LEVEL_1'))
+        self.import_file('import_books', BOOK_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, [
+            [book.key, 'Book', None, 'Writer', None, 10]])
+        book.refresh_from_db()
+        self.assertEqual(book.author, 'Writer')
+
+        errors = self.import_file('import_books_to_inventory', INVENTORY_BOOK_WORKSHEET_NAME,
+                                  INVENTORY_BOOKS_EXCEL_FIELDS, [[None, 'S1', 'Good', None], [None, 'S2', 'Good', None]],
+                                  book=book.key)
+        self.assertEqual(errors, [])
+        first, second = Inventory.objects.order_by('serial_number')
+        errors = self.import_file('import_books_to_inventory', INVENTORY_BOOK_WORKSHEET_NAME,
+                                  INVENTORY_BOOKS_EXCEL_FIELDS, [[first.key, 'S2', 'Lost', None]], book=book.key)
+        self.assertEqual(list(errors[0]['1']), ['non_field_errors'])
+        self.import_file('import_books_to_inventory', INVENTORY_BOOK_WORKSHEET_NAME, INVENTORY_BOOKS_EXCEL_FIELDS,
+                         [[first.key, 'S3', 'Lost', None], [second.key, 'S1', 'Damaged', None]], book=book.key)
+        self.assertEqual(sorted(Inventory.objects.values_list('serial_number', 'status')),
+                         [('S1', Inventory.DAMAGED), ('S3', Inventory.LOST)])
+
+    def test_import_books_sees_names_changed_earlier_in_the_file(self):
+        self.import_file('import_books', BOOK_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, [[None, 'X', None, None, None, None]])
+        book = Book.objects.get()
+        errors = self.import_file('import_books', BOOK_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, [
+            [book.key, 'Y', None, None, None, None], [None, 'Y', None, None, None, None]])
+        self.assertEqual(errors, [{'2': {'name': ['Book with same name already exists']}}])
+        self.assertEqual(list(Book.objects.values_list('name', flat=True)), ['X'])
+
+        errors = self.import_file('import_books', BOOK_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, [
+            [book.key, 'Y', None, None, None, None], [None, 'X', None, None, None, None]])
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(Book.objects.values_list('name', flat=True)), ['X', 'Y'])
+
+    def test_import_schools_sees_names_changed_earlier_in_the_file(self):
+        self.import_file('import_schools', SCHOOL_WORKSHEET_NAME, SCHOOLS_EXCEL_FIELDS, self.school_rows(1))
+        school = School.objects.get()
+        renamed = [school.key, 'Renamed', 'Pune', 411001, None, None, 'Co-Ed', 'PMC', 'Marathi', None, None]
+        errors = self.import_file('import_schools', SCHOOL_WORKSHEET_NAME, SCHOOLS_EXCEL_FIELDS,
+                                  [renamed, [None, 'Renamed'] + self.school_rows(1)[0][2:]])
+        self.assertEqual(errors, [{'2': {'name': ['School with same name already exists']}}])
+
+        errors = self.import_file('import_schools', SCHOOL_WORKSHEET_NAME, SCHOOLS_EXCEL_FIELDS,
+                                  [renamed] + self.school_rows(1))
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(School.objects.values_list('name', flat=True)), ['Renamed', 'School 0'])
+
+    def test_import_schools_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few_rows:
+            self.assertEqual(self.import_file('import_schools', SCHOOL_WORKSHEET_NAME, SCHOOLS_EXCEL_FIELDS,
+                                              self.school_rows(5)), [])
+        schools = list(School.objects.order_by('name'))
+        rows = self.school_rows(50, offset=5)
+        rows += [[school.key, school.name + ' renamed', 'Mumbai', 400001, None, None, 'Co-Ed', 'PMC', 'Marathi',
+                  None, None] for school in schools]
+        with CaptureQueriesContext(connection) as many_rows:
+            self.assertEqual(self.import_file('import_schools', SCHOOL_WORKSHEET_NAME, SCHOOLS_EXCEL_FIELDS, rows), [])
+        self.assertEqual(School.objects.count(), 55)
+        self.assertEqual(School.objects.filter(name__endswith='renamed', address='Mumbai',
+                                               year_of_intervention=None).count(), 5)
+        self.assertLessEqual(len(many_rows), len(few_rows) + 1)
+
+    def create_users(self, count, group_type, offset=0):
+        users = User.objects.bulk_create([
+            User(username='user%d' % index, first_name='User', last_name=str(index), ngo=self.ngo)
+            for index in range(offset, offset + count)])
+        if not users[0].pk:
+            users = User.objects.filter(username__in=[user.username for user in users])
+        group = Group.objects.get(name=get_ngo_specific_group_name(group_type, self.ngo.key))
+        User.groups.through.objects.bulk_create([User.groups.through(user=user, group=group) for user in users])
+
+    def export_users(self):
+        response = self.client.get('/ngos/%s/export_users/' % self.ngo.key, {'mode': EXPORT_MODE_STREAM})
+        self.assertEqual(response.status_code, 200)
+        worksheet = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)[USER_WORKSHEET_NAME]
+        return [row for row in worksheet.iter_rows(min_row=2, values_only=True) if row[0]]
+
+    def test_export_users_queries_do_not_grow_with_users(self):
+        self.create_users(5, GroupType.BOOK_FAIRY)
+        with CaptureQueriesContext(connection) as few_users:
+            rows = self.export_users()
+        self.assertEqual(rows[-1][6], GroupType.BOOK_FAIRY.value)
+
+        self.create_users(5000, GroupType.SUPERVISOR, offset=5)
+        with CaptureQueriesContext(connection) as many_users:
+            rows = self.export_users()
+        self.assertEqual(len(rows), 5006)
+        self.assertEqual(rows[-1][6], GroupType.SUPERVISOR.value)
+        self.assertEqual(len(few_users), len(many_users))
+
+
+class NGODeactivateTestCase(TestCase):
+
+    def setUp(self):
+        self.ngos = [NGO.objects.create(name='NGO %d' % index, address='Pune') for index in range(3)]
+        category = SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED')
+        school_type = SchoolType.objects.create(name='SCHOOL_TYPE_PMC')
+        medium = SchoolMedium.objects.create(name='SCHOOL_MEDIUM_MARATHI')
+        standard = Standard.objects.create(name='STANDARD_I')
+        for ngo in self.ngos:
+            for index in range(4):
+                school = School.objects.create(name='School %d' % index, address='Pune', pin_code=411001, ngo=ngo,
+                                               school_category=category, school_type=school_type, medium=medium)
+                Classroom.objects.create(school=school, standard=standard, division='A')
+                Book.objects.create(name='Book %d' % index, ngo=ngo)
+        admin = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                              first_name='Admin', last_name='User')
+        self.client = APIClient()
+        self.client.force_authenticate(user=admin)
+
+    def test_deactivate_ngos_cascades_set_wise(self):
+        keys = json.dumps([ngo.key for ngo in self.ngos[:2]])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/ngos/deactivate_ngos/', {'keys': keys})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'ngos': 2, 'schools': 8, 'classrooms': 8, 'books': 8})
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 4)
+        self.assertEqual(School.objects.filter(is_active=True).count(), 4)
+        self.assertEqual(Classroom.objects.filter(is_active=True).count(), 4)
+        self.assertEqual(Book.objects.filter(is_active=True, ngo=self.ngos[2]).count(), 4)
+
+        response = self.client.post('/ngos/activate_ngos/', {'keys': keys})
+        self.assertEqual(response.data, {'ngos': 2})
+        self.assertEqual(NGO.objects.filter(is_active=True).count(), 3)
+
+
+class MobileSyncTestCase(TestCase):
+
+    def setUp(self):
+        self.ngo = NGO.objects.create(name='NGO', address='Pune')
+        self.books = [Book.objects.create(name='Book %d' % index, ngo=self.ngo) for index in range(5)]
+        Book.objects.update(last_modification_time=timezone.now() - timedelta(days=1))
+        user = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                             first_name='Admin', last_name='User', ngo=self.ngo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+        self.url = '/ngos/%s/mobile_books/' % self.ngo.key
+
+    def test_unchanged_books_return_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Book.objects.create(name='New book', ngo=self.ngo)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_since_returns_changes_and_tombstones(self):
+        since = self.client.get(self.url)['X-Sync-Time']
+        self.client.post('/books/deactivate_book/', {'keys': json.dumps([self.books[0].key])})
+        book = self.books[1]
+        book.name = 'Renamed'
+        book.save()
+
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.data['results']], ['Renamed'])
+        self.assertEqual(response.data['removed'], [self.books[0].key])
+
+        # Recent changes are sent again until they are older than the sync margin
+        response = self.client.get(self.url, {'since': response['X-Sync-Time']})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Renamed'])
+        self.assertEqual(response.data['removed'], [self.books[0].key])
+        Book.objects.update(last_modification_time=timezone.now() - SYNC_MARGIN - timedelta(minutes=1))
+        response = self.client.get(self.url, {'since': response['X-Sync-Time']})
+        self.assertEqual(response.data, {'results': [], 'removed': []})
+
+        response = self.client.get(self.url, {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_since_includes_rows_committed_after_the_sync(self):
+        since = self.client.get(self.url)['X-Sync-Time']
+        # Saved before that sync ran, but committed after it
+        Book.objects.filter(pk=self.books[2].pk).update(name='Late',
+                                                        last_modification_time=timezone.now() - timedelta(minutes=1))
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Late'])
+
+
+class CursorPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.ngo = NGO.objects.create(name='NGO', address='Pune')
+        for index in range(23):
+            Book.objects.create(name='Book %d' % index, ngo=self.ngo, author=[None, 'A', 'B'][index % 3])
+        user = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                             first_name='Admin', last_name='User', ngo=self.ngo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+
+    def read_pages(self, url, params):
+        response = self.client.get(url, params)
+        pages = [response.data]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+        return pages
+
+    def test_cursor_pages_follow_sort_with_nulls_last(self):
+        for sort, authors in (('author', ['A', 'B', None]), ('-author', ['B', 'A', None])):
+            pages = self.read_pages('/ngos/%s/books/' % self.ngo.key, {'sort': sort, 'pagination': 'cursor'})
+            self.assertEqual([len(page['results']) for page in pages], [10, 10, 3])
+            self.assertNotIn('count', pages[0])
+            rows = [row for page in pages for row in page['results']]
+            self.assertEqual(len({row['key'] for row in rows}), 23)
+            self.assertEqual([row['author'] for row in rows],
+                             sorted([row['author'] for row in rows], key=authors.index))
+
+    def test_deep_pages_cost_the_same(self):
+        url = '/ngos/%s/books/' % self.ngo.key
+        params = {'sort': 'name', 'pagination': 'cursor'}
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(url, params)
+        with CaptureQueriesContext(connection) as second_page:
+            self.client.get(response.data['next'])
+        self.assertEqual(len(first_page), len(second_page))
+        self.assertFalse([query for query in second_page if 'COUNT(' in query['sql'] or 'OFFSET' in query['sql']])
 
-# Create your tests here.
+        response = self.client.get(url, dict(params, count='approximate'))
+        self.assertIn('count', response.data)
+        response = self.client.get(url, dict(params, cursor='invalid'))
+        self.assertEqual(response.status_code, 404)
+        null_cursor = base64.urlsafe_b64encode(json.dumps([None, None]).encode()).decode()
+        response = self.client.get(url, dict(params, cursor=null_cursor))
+        self.assertEqual(response.status_code, 404)
@@ -12,20 +12,22 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from django.db.models import Q
-from rest_framework import pagination
+from django.db.models import OuterRef, Subquery
 
 from books.models import Book
 from books.serializers import BookSerializer
 from classrooms.models import ClassroomAcademicYear
 from classrooms.serializers import ClassroomAcademicYearSerializer
 from read.constants import GroupType
-from read_sessions.models import ReadSessionClassroom, ReadSession
-from read_sessions.serializers import ReadSessionClassroomSerializer, ReadSessionSerializer
+from read.pagination import get_paginator
+from read.search import search, search_order_by
+from read_sessions.models import ReadSessionClassroom, ReadSession, ReadSessionBookFairy
+from read_sessions.serializers import ReadSessionClassroomSerializer
+from read_sessions.utils import paginate_read_sessions
 from schools.models import School
 from schools.serializers import SchoolSerializer
-from students.models import Student
 from users.models import User
+from users.permissions import invalidate_user_permissions
 from users.serializers import UserSerializer
 
 
@@ -43,9 +45,10 @@ def switch(model):
 def search_school(filters, ngo, request):
     name = filters.get('name', None)
     sort = filters.get('sort', None)
-    schools = School.objects.filter(name__icontains=name, ngo__key=ngo, is_active=True, ngo__is_active=True).order_by(
-        sort)
-    paginator = pagination.PageNumberPagination()
+    prefix = filters.get('prefix', False)
+    schools = School.objects.filter(ngo__key=ngo, is_active=True, ngo__is_active=True)
+    schools = search(schools, ['name'], name, prefix).order_by(*search_order_by(sort))
+    paginator = get_paginator(request)
     result = paginator.paginate_queryset(schools, request)
     serializer = SchoolSerializer(result, many=True)
     return paginator.get_paginated_response(serializer.data)
@@ -54,9 +57,10 @@ def search_school(filters, ngo, request):
 def search_book(filters, ngo, request):
     name = filters.get('name', None)
     sort = filters.get('sort', None)
-    books = Book.objects.filter((Q(name__icontains=name) | Q(publisher__icontains=name)), ngo__key=ngo, is_active=True,
-                                ngo__is_active=True).order_by(sort)
-    paginator = pagination.PageNumberPagination()
+    prefix = filters.get('prefix', False)
+    books = Book.objects.filter(ngo__key=ngo, is_active=True, ngo__is_active=True)
+    books = search(books, ['name', 'publisher'], name, prefix).order_by(*search_order_by(sort))
+    paginator = get_paginator(request)
     result = paginator.paginate_queryset(books, request)
     serializer = BookSerializer(result, many=True)
     return paginator.get_paginated_response(serializer.data)
@@ -68,83 +72,35 @@ def search_student(filters, ngo, request):
     academic_year = filters.get('academicYear', None)
     order = filters.get('order', None)
     sort = filters.get('sort', None)
-    order_by = student_sort_by_value(sort, order)
-    print(filters)
-    common_filters = {
-        'classroom__is_active': True,
-        'classroom__school__is_active': True,
-        'classroom__school__ngo__key': ngo,
-        'classroom__school__ngo__is_active': True
-    }
-    paginator = pagination.PageNumberPagination()
-
-    if name and school and academic_year:
-        students = Student.objects.filter(Q(first_name__icontains=name) | Q(last_name__icontains=name), is_active=True)
-        classroom_academic_year = ClassroomAcademicYear.objects.filter(student__in=students,
-                                                                       classroom__school__key=school,
-                                                                       academic_year__key=academic_year,
-                                                                       **common_filters).order_by(order_by)
-        result = paginator.paginate_queryset(classroom_academic_year, request)
-        serializer = ClassroomAcademicYearSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-    elif name and academic_year:
-        students = Student.objects.filter(Q(first_name__icontains=name) | Q(last_name__icontains=name), is_active=True)
-        classroom_academic_year = ClassroomAcademicYear.objects.filter(student__in=students,
-                                                                       academic_year__key=academic_year,
-                                                                       **common_filters).order_by(order_by)
-        result = paginator.paginate_queryset(classroom_academic_year, request)
-        serializer = ClassroomAcademicYearSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-    elif school and academic_year:
-        classroom_academic_year = ClassroomAcademicYear.objects.filter(classroom__school__key=school,
-                                                                       student__is_active=True,
-                                                                       academic_year__key=academic_year,
-                                                                       **common_filters
-                                                                       ).order_by(order_by)
-        result = paginator.paginate_queryset(classroom_academic_year, request)
-        serializer = ClassroomAcademicYearSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-        return serializer.data
-    elif name:
-        students = Student.objects.filter(Q(first_name__icontains=name) | Q(last_name__icontains=name), is_active=True)
-        classroom_academic_year = ClassroomAcademicYear.objects.filter(student__in=students,
-                                                                       **common_filters).order_by(order_by)
-        result = paginator.paginate_queryset(classroom_academic_year, request)
-        serializer = ClassroomAcademicYearSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-    elif school:
-        classroom_academic_year = ClassroomAcademicYear.objects.filter(classroom__school__key=school,
-                                                                       student__is_active=True,
-                                                                       **common_filters
-                                                                       ).order_by(order_by)
-        result = paginator.paginate_queryset(classroom_academic_year, request)
-        serializer = ClassroomAcademicYearSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-    elif academic_year:
-        classroom_academic_year = ClassroomAcademicYear.objects.filter(student__is_active=True,
-                                                                       academic_year__key=academic_year,
-                                                                       **common_filters,
-                                                                       ).order_by(order_by)
-        result = paginator.paginate_queryset(classroom_academic_year, request)
-        serializer = ClassroomAcademicYearSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-    else:
-        classroom_academic_year = ClassroomAcademicYear.objects.filter(**common_filters, student__is_active=True) \
-            .order_by(order_by)
-        result = paginator.paginate_queryset(classroom_academic_year, request)
-        serializer = ClassroomAcademicYearSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+    prefix = filters.get('prefix', False)
+    order_by = student_sort_by_value(sort, order) if sort else None
+    paginator = get_paginator(request)
+
+    classroom_academic_year = ClassroomAcademicYear.objects.filter(classroom__is_active=True,
+                                                                   classroom__school__is_active=True,
+                                                                   classroom__school__ngo__key=ngo,
+                                                                   classroom__school__ngo__is_active=True,
+                                                                   student__is_active=True)
+    if school:
+        classroom_academic_year = classroom_academic_year.filter(classroom__school__key=school)
+    if academic_year:
+        classroom_academic_year = classroom_academic_year.filter(academic_year__key=academic_year)
+    classroom_academic_year = search(classroom_academic_year, ['student__first_name', 'student__last_name'], name,
+                                     prefix).order_by(*search_order_by(order_by))
+
+    result = paginator.paginate_queryset(classroom_academic_year, request)
+    serializer = ClassroomAcademicYearSerializer(result, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 def search_user(filters, ngo, request):
     name = filters.get('name', None)
     sort = filters.get('sort', None)
+    prefix = filters.get('prefix', False)
     sort_by = user_sort_by_value(sort)
-    paginator = pagination.PageNumberPagination()
-    users = User.objects.filter((Q(first_name__icontains=name) | Q(last_name__icontains=name)),
-                                ngo__key=ngo,
-                                ngo__is_active=True,
-                                is_active=True).order_by(sort_by)
+    paginator = get_paginator(request)
+    users = User.objects.filter(ngo__key=ngo, ngo__is_active=True, is_active=True)
+    users = search(users, ['first_name', 'last_name'], name, prefix).order_by(*search_order_by(sort_by))
     results = paginator.paginate_queryset(users, request)
     serializer = UserSerializer(results, many=True)
     return paginator.get_paginated_response(serializer.data)
@@ -159,135 +115,54 @@ def search_session(filters, ngo, request):
     end_date = filters.get('end')
 
     order = filters.get('order', None)
-    sort = filters.get('sort', None)
-    order_by = session_sort_by_value(sort, order)
-    paginator = pagination.PageNumberPagination()
-    school_filters = {
-        'readsessionclassroom__classroom__school__key': school,
-        'readsessionclassroom__classroom__school__is_active': True,
-        'readsessionclassroom__classroom__is_active': True,
-        'readsessionclassroom__classroom__school__ngo__key': ngo,
-        'readsessionclassroom__classroom__school__ngo__is_active': True,
-    }
-    book_fairy_filters = {'readsessionbookfairy__book_fairy__key': book_fairy,
-                          'readsessionbookfairy__book_fairy__is_active': True}
-    academic_year_filters = {'academic_year__key': academic_year}
-
-    classroom_filter = {
-        "readsessionclassroom__classroom__key": classroom
-    }
-
-    start_date_filters = {
-        'start_date_time__gte': start_date
-    }
-
-    end_date_filters = {
-        'end_date_time__lte': end_date
-    }
-
-    dates_in_between = {
-        'start_date_time__range': (start_date, end_date)
-    }
-
-    if school and book_fairy and academic_year:
-        if classroom:
-            school_filters.update(classroom_filter)
-        read_session = ReadSession.objects.filter(**school_filters,
-                                                  **book_fairy_filters,
-                                                  **academic_year_filters).distinct().order_by(order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if school and book_fairy:
-        if classroom:
-            school_filters.update(classroom_filter)
-        read_session = ReadSession.objects.filter(**school_filters, **book_fairy_filters).distinct().order_by(
-            order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if school and academic_year:
-        if classroom:
-            school_filters.update(classroom_filter)
-        read_session = ReadSession.objects.filter(**school_filters, **academic_year_filters).distinct().order_by(
-            order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if book_fairy and academic_year:
-        read_session = ReadSession.objects.filter(**book_fairy_filters, **academic_year_filters).distinct().order_by(
-            order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if book_fairy and start_date and end_date:
-        read_session = ReadSession.objects.filter(**book_fairy_filters, **dates_in_between).distinct().order_by(
-            order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if book_fairy and start_date:
-        read_session = ReadSession.objects.filter(**book_fairy_filters, **start_date_filters).distinct().order_by(
-            order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if book_fairy and end_date:
-        read_session = ReadSession.objects.filter(**book_fairy_filters, **end_date_filters).distinct().order_by(
-            order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if start_date and end_date:
-        read_session = ReadSession.objects.filter(**dates_in_between).distinct().order_by(order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if start_date:
-        read_session = ReadSession.objects.filter(**start_date_filters).distinct().order_by(order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    if end_date:
-        read_session = ReadSession.objects.filter(**end_date_filters).distinct().order_by(order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+    sort = filters.get('sort') or 'dateTime'
+    view = filters.get('view', request.GET.get('view'))
 
+    session_classrooms = ReadSessionClassroom.objects.filter(classroom__school__ngo__key=ngo,
+                                                             classroom__school__ngo__is_active=True)
     if school:
-        if classroom:
-            school_filters.update(classroom_filter)
-        read_session_school = ReadSession.objects.filter(**school_filters).distinct().order_by(order_by)
-        result = paginator.paginate_queryset(read_session_school, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        session_classrooms = session_classrooms.filter(classroom__school__key=school,
+                                                       classroom__school__is_active=True,
+                                                       classroom__is_active=True)
+    if classroom:
+        session_classrooms = session_classrooms.filter(classroom__key=classroom)
 
-    if book_fairy:
-        read_session = ReadSession.objects.filter(**book_fairy_filters).distinct().order_by(order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+    # Semi-joins on the session id instead of joining the relations in, so no DISTINCT is needed
+    read_sessions = ReadSession.objects.filter(pk__in=session_classrooms.values('read_session'))
 
+    if book_fairy:
+        session_book_fairies = ReadSessionBookFairy.objects.filter(book_fairy__key=book_fairy,
+                                                                   book_fairy__is_active=True)
+        read_sessions = read_sessions.filter(pk__in=session_book_fairies.values('read_session'))
     if academic_year:
-        read_session = ReadSession.objects.filter(**academic_year_filters).distinct().order_by(order_by)
-        result = paginator.paginate_queryset(read_session, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    read_sessions = ReadSession.objects.filter(readsessionclassroom__classroom__school__ngo__key=ngo).order_by(
-        order_by).distinct()
-    result = paginator.paginate_queryset(read_sessions, request)
-    serializer = ReadSessionSerializer(result, many=True)
-    return paginator.get_paginated_response(serializer.data)
+        read_sessions = read_sessions.filter(academic_year__key=academic_year)
+    if start_date and end_date:
+        read_sessions = read_sessions.filter(start_date_time__range=(start_date, end_date))
+    elif start_date:
+        read_sessions = read_sessions.filter(start_date_time__gte=start_date)
+    elif end_date:
+        read_sessions = read_sessions.filter(end_date_time__lte=end_date)
+
+    read_sessions = order_read_sessions(read_sessions, session_sort_by_value(sort, order))
+    return paginate_read_sessions(read_sessions, request, view)
+
+
+# Ordering on a classroom or book fairy field would join those tables back in and duplicate sessions,
+# so sort on the first related value instead
+def order_read_sessions(read_sessions, order_by):
+    field = order_by.lstrip('-')
+    relation, _, related_field = field.partition('__')
+    related_models = {
+        'readsessionclassroom': ReadSessionClassroom,
+        'readsessionbookfairy': ReadSessionBookFairy,
+    }
+    if relation not in related_models:
+        return read_sessions.order_by(order_by, 'pk')
+
+    first_value = related_models[relation].objects.filter(read_session=OuterRef('pk')) \
+        .order_by(related_field).values(related_field)[:1]
+    read_sessions = read_sessions.annotate(sort_value=Subquery(first_value))
+    return read_sessions.order_by(order_by.replace(field, 'sort_value'), 'pk')
 
 
 def invalid(filters=None, ngo=None):
@@ -359,3 +234,11 @@ def user_sort_by_value(sort_by):
         return '-groups__name'
 
     return sort_by
+
+
+def set_user_groups(users, groups_by_user_key):
+    user_groups = User.groups.through
+    user_groups.objects.filter(user__in=users).delete()
+    user_groups.objects.bulk_create([user_groups(user_id=user.pk, group_id=groups_by_user_key[user.key].pk)
+                                     for user in users])
+    invalidate_user_permissions([user.pk for user in users])
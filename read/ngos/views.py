@@ -12,19 +12,14 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import base64
 # import the logging library
 import logging
 
 from datetime import datetime, timezone, timedelta
 from django.contrib.auth.models import Group, Permission
-from django.db import transaction, DatabaseError
+from django.db import transaction, DatabaseError, connection
 from django.db.models import Q, F, CharField, Value
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from io import BytesIO
-from openpyxl import load_workbook
-from rest_framework import pagination
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.utils import json
@@ -42,22 +37,29 @@ from classrooms.validators import validate_add_classroom_request
 from ngos.models import NGO, Level
 from ngos.schemas import NGOSchema
 from ngos.serializers import NGOSerializer, LevelSerializer
-from ngos.utils import switch, student_sort_by_value, session_sort_by_value, user_sort_by_value
+from ngos.utils import switch, student_sort_by_value, session_sort_by_value, user_sort_by_value, set_user_groups
 from ngos.validators import validate_change_ngo_request
 from read.constants import GROUPS, GroupType, ERROR_403_JSON, FileType, USER_WORKSHEET_NAME, \
     BOOK_WORKSHEET_NAME, INVENTORY_BOOK_WORKSHEET_NAME, READ_SESSION_PENDING, READ_SESSION_EVALUATED_NOT_VERIFIED, \
     READ_SESSION_UPCOMING, SCHOOL_WORKSHEET_NAME, BOOK_LENDING, REGULAR, EVALUATION
 from read.constants import SESSION_EVALUATED, SESSION_NON_EVALUATED
-from read.utils import get_ngo_specific_group_name, write_to_excel, get_group_type_from_name, create_file_upload_error, \
-    get_inventory_status, create_file_upload_serializer_error, get_group_type_from_request_user, \
+from read.activation import set_ngos_active
+from read.pagination import get_paginator
+from read.sync import create_sync_response
+from read.bulk_import import BulkImport, ObjectLookup, UniqueValues, get_import_serializer, set_validated_data
+from read.excel_export import create_excel_response
+from read.reference_data import get_reference_data
+from read.excel_import import load_import_workbook, read_import_rows, chunk_import_rows
+from read.utils import get_ngo_specific_group_name, get_group_type_from_name, create_file_upload_error, \
+    annotate_user_group, get_inventory_status, create_file_upload_serializer_error, get_group_type_from_request_user, \
     create_serializer_error, create_response_error, request_user_belongs_to_ngo, create_response_data, get_school_type, \
     get_school_medium, get_school_category, get_valid_school_categories, get_valid_school_types, \
     get_valid_school_mediums, get_book_level, get_valid_book_levels, get_valid_user_types, get_valid_inventory_statuses, \
     create_inventory
 from read.validators import validate_deactivate_ngo_admin_request, validate_user_type
-from read_sessions.models import ReadSession
-from read_sessions.serializers import ReadSessionSerializer, ReadSessionClassroomSerializer, \
-    ReadSessionBookFairySerializer, ReadSessionBookFairyReportSerializer
+from read_sessions.models import ReadSession, ReadSessionClassroom, ReadSessionBookFairy
+from read_sessions.serializers import ReadSessionSerializer, ReadSessionDateSerializer
+from read_sessions.utils import paginate_read_sessions, find_scheduling_conflicts, get_student_session_report
 from read_sessions.validators import validate_add_session_request
 from schools.models import SchoolCategory, SchoolType, SchoolMedium, School, Standard
 from schools.serializers import SchoolSerializer
@@ -245,8 +247,7 @@ class NGOViewSet(ViewSet):
 
         if get_group_type_from_request_user(request.user) == GroupType.READ_ADMIN:
             return Response(status=403, data=ERROR_403_JSON())
-        ngo.is_active = False
-        ngo.save()
+        set_ngos_active([ngo.key], False)
         return Response(status=204)
 
     @action(detail=True, methods=['POST'], schema=NGOSchema.deactivate_ngo_admin(), permission_classes=[CanChangeNGO])
@@ -282,7 +283,7 @@ class NGOViewSet(ViewSet):
             ngo = NGO.objects.get(key=pk)
         except NGO.DoesNotExist:
             return Response(status=404)
-        paginator = pagination.PageNumberPagination()
+        paginator = get_paginator(request)
         ngo_admin_group_name = get_ngo_specific_group_name(GroupType.NGO_ADMIN, ngo.key)
         admins = User.objects.filter(ngo__key=pk, groups__name=ngo_admin_group_name, is_active=True).order_by(sort)
         result = paginator.paginate_queryset(admins, request)
@@ -296,7 +297,10 @@ class NGOViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
         book_level_name = request.data.get('level')
-        book_level = BookLevel.objects.filter(name=book_level_name).first()
+        try:
+            book_level = get_reference_data(BookLevel).get(name=book_level_name)
+        except BookLevel.DoesNotExist:
+            book_level = None
         try:
             ngo = NGO.objects.get(key=pk)
         except NGO.DoesNotExist:
@@ -336,9 +340,9 @@ class NGOViewSet(ViewSet):
                     request.user) != GroupType.NGO_ADMIN):
                 return Response(status=403, data=ERROR_403_JSON())
 
-            school_category = SchoolCategory.objects.get(name=school_category_key)
-            school_type = SchoolType.objects.get(name=school_type_key)
-            medium = SchoolMedium.objects.get(name=medium_key)
+            school_category = get_reference_data(SchoolCategory).get(name=school_category_key)
+            school_type = get_reference_data(SchoolType).get(name=school_type_key)
+            medium = get_reference_data(SchoolMedium).get(name=medium_key)
         except (NGO.DoesNotExist, SchoolCategory.DoesNotExist, SchoolType.DoesNotExist, SchoolMedium.DoesNotExist) as e:
             return Response(status=404, data=create_response_error(e))
 
@@ -406,7 +410,7 @@ class NGOViewSet(ViewSet):
     def schools(self, request, pk=None):
         sort = request.GET.get('sort')
         schools = School.objects.filter(ngo__key=pk, is_active=True).order_by(sort)
-        paginator = pagination.PageNumberPagination()
+        paginator = get_paginator(request)
         result = paginator.paginate_queryset(schools, request)
         serializer = SchoolSerializer(result, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -421,23 +425,23 @@ class NGOViewSet(ViewSet):
     def books(self, request, pk=None):
         sort = request.GET.get('sort')
         books = Book.objects.filter(ngo__key=pk, is_active=True).order_by(sort)
-        paginator = pagination.PageNumberPagination()
+        paginator = get_paginator(request)
         result = paginator.paginate_queryset(books, request)
         serializer = BookSerializer(result, many=True)
         return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['GET'])
     def mobile_books(self, request, pk=None):
-        books = Book.objects.filter(ngo__key=pk, is_active=True)
-        serializer = BookSerializer(books, many=True)
-        return Response(serializer.data)
+        ngo_books = Book.objects.filter(ngo__key=pk)
+        books = ngo_books.filter(is_active=True)
+        return create_sync_response(request, ngo_books, books, BookSerializer)
 
     @action(detail=True, methods=['GET'])
     def users(self, request, pk=None):
         sort_by = request.GET.get('sort')
         sort = user_sort_by_value(sort_by)
         users = User.objects.filter(ngo__key=pk, is_active=True).order_by(sort)
-        paginator = pagination.PageNumberPagination()
+        paginator = get_paginator(request)
         result = paginator.paginate_queryset(users, request)
         serializer = UserSerializer(result, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -455,7 +459,7 @@ class NGOViewSet(ViewSet):
             if not request_user_belongs_to_ngo(request, ngo):
                 return Response(status=403, data=ERROR_403_JSON())
 
-            standard = Standard.objects.get(name=standard_name)
+            standard = get_reference_data(Standard).get(name=standard_name)
             school = School.objects.get(key=school_key, ngo__key=ngo.key)
         except (NGO.DoesNotExist, Standard.DoesNotExist, School.DoesNotExist):
             return Response(status=404)
@@ -498,7 +502,7 @@ class NGOViewSet(ViewSet):
             'classroom__school__ngo__key': pk,
             'classroom__school__ngo__is_active': True
         }
-        paginator = pagination.PageNumberPagination()
+        paginator = get_paginator(request)
         classroom_academic_year = ClassroomAcademicYear.objects.filter(**common_filters, student__is_active=True) \
             .order_by(sort_by)
         result = paginator.paginate_queryset(classroom_academic_year, request)
@@ -525,7 +529,7 @@ class NGOViewSet(ViewSet):
         academic_year_key = request.data.get('academic_year')
         try:
             ngo = NGO.objects.get(key=pk)
-            academic_year = AcademicYear.objects.get(key=academic_year_key)
+            academic_year = get_reference_data(AcademicYear).get(key=academic_year_key)
         except (NGO.DoesNotExist, AcademicYear.DoesNotExist) as e:
             return Response(status=404, data=create_response_error(e))
 
@@ -534,79 +538,52 @@ class NGOViewSet(ViewSet):
 
         classroom_keys = json.loads(request.data.get('classrooms'))
         book_fairy_keys = json.loads(request.data.get('fairies'))
-        read_session_dates = json.loads(request.data.get('dates'))
+        dates_serializer = ReadSessionDateSerializer(data=json.loads(request.data.get('dates')), many=True,
+                                                     allow_empty=False)
+        if not dates_serializer.is_valid():
+            return Response(status=400, data=create_serializer_error(dates_serializer))
+        read_session_dates = dates_serializer.validated_data
+
+        # Fields shared by every session are validated once
         read_session_data = request.data.copy()
+        read_session_data["academic_year_id"] = academic_year.id
+        read_session_data["start_date_time"] = read_session_dates[0]['start_date_time']
+        read_session_data["end_date_time"] = read_session_dates[0]['end_date_time']
+        read_session_serializer = ReadSessionSerializer(data=read_session_data)
+        if not read_session_serializer.is_valid():
+            return Response(status=400, data=create_serializer_error(read_session_serializer))
+
+        classrooms = list(Classroom.objects.filter(key__in=classroom_keys, school__ngo=ngo))
+        book_fairies = list(User.objects.filter(key__in=book_fairy_keys, ngo=ngo))
+        invalid_keys = set(classroom_keys) - {classroom.key for classroom in classrooms}
+        invalid_keys |= set(book_fairy_keys) - {book_fairy.key for book_fairy in book_fairies}
+        if invalid_keys:
+            return Response(status=400, data=create_response_data({"invalid_keys": sorted(invalid_keys)}))
+
         try:
             with transaction.atomic():
-                for date in read_session_dates:
-                    read_session_data["academic_year_id"] = academic_year.id
-                    start_date_time = date.get('start_date_time')
-                    end_date_time = date.get('end_date_time')
-                    read_session_data["start_date_time"] = start_date_time
-                    read_session_data["end_date_time"] = end_date_time
-
-                    session_type = read_session_data.get('type')
-
-                    # Checking if session is already scheduled for given book fairies?
-                    is_session_scheduled = ReadSession.objects \
-                        .filter((Q(start_date_time__gt=start_date_time) & Q(start_date_time__lt=end_date_time))
-                                | (Q(end_date_time__gt=start_date_time) & Q(end_date_time__lt=end_date_time))
-                                | (Q(start_date_time__lt=start_date_time) & Q(end_date_time__gt=start_date_time))
-                                | (Q(start_date_time__lt=end_date_time) & Q(end_date_time__gt=end_date_time))
-                                | (Q(start_date_time=start_date_time) & Q(end_date_time=end_date_time)),
-                                is_cancelled=False,
-                                readsessionbookfairy__book_fairy__key__in=book_fairy_keys,
-                                academic_year__key=academic_year.key).distinct()
-
-                    if session_type != BOOK_LENDING and is_session_scheduled:
-                        error = []
-                        for sessions in is_session_scheduled:
-                            book_fairy = sessions.readsessionbookfairy_set.all().values_list("book_fairy__first_name",
-                                                                                             flat=True)
-                            book_fairies = [name for name in book_fairy]
-                            error.append({"book_fairy": book_fairies,
-                                          "start_date": sessions.start_date_time,
-                                          "end_date": sessions.end_date_time})
-                        # return Response(status=400, data=create_response_data(error))
-                        raise ScheduledBookFairyException(message=create_response_data(error))
-
-                    # Creating Read session
-                    read_session_serializer = ReadSessionSerializer(data=read_session_data)
-                    if read_session_serializer.is_valid():
-                        read_session_serializer.save()
-                        read_session_id = read_session_serializer.data.get('id')
-
-                        # Adding read session to multiple classrooms
-                        for classroom_key in classroom_keys:
-                            classroom = Classroom.objects.get(key=classroom_key)
-                            read_session_classroom_data = {"read_session_id": read_session_id,
-                                                           "classroom_id": classroom.id}
-                            read_session_classroom_serializer = ReadSessionClassroomSerializer(
-                                data=read_session_classroom_data)
-                            if read_session_classroom_serializer.is_valid():
-                                read_session_classroom_serializer.save()
-                            else:
-                                return Response(status=400,
-                                                data=create_serializer_error(read_session_classroom_serializer))
-
-                        # Adding read session to multiple book fairies
-                        for book_fairy_key in book_fairy_keys:
-                            book_fairy = User.objects.get(key=book_fairy_key)
-                            read_session_book_fairy_data = {"read_session_id": read_session_id,
-                                                            "user_id": book_fairy.id}
-                            read_session_book_fairy_serializer = ReadSessionBookFairySerializer(
-                                data=read_session_book_fairy_data)
-                            if read_session_book_fairy_serializer.is_valid():
-                                read_session_book_fairy_serializer.save()
-                            else:
-                                return Response(status=400,
-                                                data=create_serializer_error(read_session_book_fairy_serializer))
-                    else:
-                        return Response(status=400, data=create_serializer_error(read_session_serializer))
+                if read_session_serializer.validated_data.get('type') != BOOK_LENDING:
+                    conflicts = find_scheduling_conflicts(read_session_dates, book_fairies, academic_year)
+                    if conflicts:
+                        raise ScheduledBookFairyException(message=create_response_data(conflicts))
+
+                read_sessions = [ReadSession(**dict(read_session_serializer.validated_data, **date))
+                                 for date in read_session_dates]
+                ReadSession.objects.bulk_create(read_sessions)
+                if not connection.features.can_return_ids_from_bulk_insert:
+                    read_sessions = ReadSession.objects.filter(key__in=[read_session.key
+                                                                        for read_session in read_sessions])
+
+                ReadSessionClassroom.objects.bulk_create([
+                    ReadSessionClassroom(read_session=read_session, classroom=classroom)
+                    for read_session in read_sessions for classroom in classrooms])
+                ReadSessionBookFairy.objects.bulk_create([
+                    ReadSessionBookFairy(read_session=read_session, book_fairy=book_fairy)
+                    for read_session in read_sessions for book_fairy in book_fairies])
                 return Response(status=201)
         except ScheduledBookFairyException as e:
             return Response(status=400, data=e.message)
-        except (Classroom.DoesNotExist, User.DoesNotExist, Exception) as e:
+        except Exception as e:
             return Response(status=400, data=create_response_error(e))
 
     @action(methods=['POST'], detail=True)
@@ -633,10 +610,7 @@ class NGOViewSet(ViewSet):
 
         read_sessions = ReadSession.objects.filter(readsessionclassroom__classroom__school__ngo__key=pk).order_by(
             order_by).distinct()
-        paginator = pagination.PageNumberPagination()
-        result = paginator.paginate_queryset(read_sessions, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginate_read_sessions(read_sessions, request, request.GET.get('view'))
 
     @action(detail=True, methods=['GET'])
     def get_supervisor_sessions(self, request, pk=None):
@@ -687,10 +661,7 @@ class NGOViewSet(ViewSet):
                                                        **common_filters) \
                 .order_by(order_by).distinct()
 
-        paginator = pagination.PageNumberPagination()
-        result = paginator.paginate_queryset(read_sessions, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginate_read_sessions(read_sessions, request, request.GET.get('view'))
 
     @action(detail=True, methods=['GET'])
     def book_fairy_sessions(self, request, pk=None):
@@ -732,10 +703,7 @@ class NGOViewSet(ViewSet):
                                                        start_date_time__gte=now) \
                 .order_by(order_by).distinct()
 
-        paginator = pagination.PageNumberPagination()
-        result = paginator.paginate_queryset(read_sessions, request)
-        serializer = ReadSessionSerializer(result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginate_read_sessions(read_sessions, request, request.GET.get('view'))
 
     @action(detail=True, methods=['GET'])
     def mobile_book_fairy_sessions(self, request, pk=None):
@@ -780,19 +748,25 @@ class NGOViewSet(ViewSet):
             read_sessions = ReadSession.objects.filter(**common_filter) \
                 .order_by("start_date_time").distinct()
 
-        serializer = ReadSessionSerializer(read_sessions, many=True)
-        return Response(serializer.data)
+        # Sessions move between the pending and upcoming lists as time passes, without being modified
+        def changed(since):
+            return Q(start_date_time__gt=since, start_date_time__lte=now) | \
+                   Q(end_date_time__gt=since + timedelta(days=7), end_date_time__lte=now + timedelta(days=7))
+
+        return create_sync_response(request, ReadSession.objects.filter(**common_filter), read_sessions,
+                                    ReadSessionSerializer, changed=changed, sync_time=now)
 
     @action(detail=False, methods=['POST'], permission_classes=[CanDeleteNGO])
     def deactivate_ngos(self, request, pk=None):
-        # TODO activate ngos??
         keys = request.data.get('keys')
         ngo_keys = json.loads(keys)
-        ngos = NGO.objects.filter(key__in=ngo_keys)
-        for ngo in ngos:
-            ngo.is_active = False
-            ngo.save()
-        return Response(status=200)
+        return Response(set_ngos_active(ngo_keys, False))
+
+    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteNGO])
+    def activate_ngos(self, request, pk=None):
+        keys = request.data.get('keys')
+        ngo_keys = json.loads(keys)
+        return Response(set_ngos_active(ngo_keys, True))
 
     @action(methods=['POST'], detail=True, schema=UserSchema.file_import(), permission_classes=[CanImportUsers])
     def import_users(self, request, pk=None):
@@ -808,102 +782,109 @@ class NGOViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         try:
             worksheet = workbook[USER_WORKSHEET_NAME]
         except KeyError:
             return Response(status=400, data=create_response_data("Invalid excel file"))
 
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_user_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_user_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
+        users_by_key = {user.key: user for user in User.objects.filter(ngo=ngo)}
+        # Usernames and emails are unique across every NGO
+        usernames = UniqueValues(User.objects.all(), 'username')
+        emails = UniqueValues(User.objects.all(), 'email')
+        groups_by_name = {group.name: group for group in Group.objects.filter(
+            name__in=[get_ngo_specific_group_name(group_type, ngo.key) for group_type in GroupType])}
+        lookups = {'ngo_id': ObjectLookup(NGO, [ngo], 'id')}
         response = []
         try:
             with transaction.atomic():
                 error_in_file = False
-                for index, row in enumerate(rows):
-                    if index == 0:
-                        continue
-                    key = str(row[0].value).strip() if row[0].value else None
-                    username = str(row[1].value).strip() if row[1].value else None
-                    first_name = str(row[2].value).strip() if row[2].value else None
-                    middle_name = str(row[3].value).strip() if row[3].value else None
-                    last_name = str(row[4].value).strip() if row[4].value else None
-                    email = str(row[5].value).strip() if row[5].value else None
-                    role = str(row[6].value).strip() if row[6].value else None
-
-                    if username is None and first_name is None and last_name is None and email is None and role is None:
-                        continue
-
-                    if key:
-                        # Check if user with key exists
-                        existing_user = User.objects.filter(key=key, username=username, ngo=ngo).first()
-                        if existing_user:
-                            group_type = get_group_type_from_name(role)
-                            if group_type:
-                                user_data = {"first_name": first_name, "middle_name": middle_name,
-                                             "last_name": last_name, "ngo_id": ngo.id, "email": email,
-                                             "username": username, "is_active": existing_user.is_active}
-
-                                if email is None and group_type != GroupType.BOOK_FAIRY:
-                                    response.append(create_file_upload_error(index, "email", "Email is required"))
-                                    error_in_file = True
+                for chunk in chunk_import_rows(rows):
+                    groups_by_user_key = {}
+                    users = BulkImport(User, after_save=lambda created_users, updated_users: set_user_groups(
+                        created_users + updated_users, groups_by_user_key))
+                    for index, row in chunk:
+                        key = str(row[0].value).strip() if row[0].value else None
+                        username = str(row[1].value).strip() if row[1].value else None
+                        first_name = str(row[2].value).strip() if row[2].value else None
+                        middle_name = str(row[3].value).strip() if row[3].value else None
+                        last_name = str(row[4].value).strip() if row[4].value else None
+                        email = str(row[5].value).strip() if row[5].value else None
+                        role = str(row[6].value).strip() if row[6].value else None
+
+                        if username is None and first_name is None and last_name is None and email is None and role is None:
+                            continue
 
-                                serializer = UserSerializer(existing_user, data=user_data)
-                                if serializer.is_valid():
-                                    new_group_name = get_ngo_specific_group_name(group_type, ngo.key)
-                                    new_group = Group.objects.get(name=new_group_name)
-                                    user = serializer.save()
-                                    user.save()
-                                    user.groups.clear()
-                                    user.groups.add(new_group)
-                                    logger.debug("Saving existing user :" + str(index))
-                                else:
-                                    response.append(
-                                        create_file_upload_serializer_error(index, serializer.errors))
-                                    error_in_file = True
-                            else:
-                                logger.error("Incorrect user group provided role")
-                                response.append(
-                                    create_file_upload_error(index, 'group', 'Value must be one of ' + ', '.join(
-                                        get_valid_user_types())))
+                        group_type = get_group_type_from_name(role)
+                        group = groups_by_name.get(get_ngo_specific_group_name(group_type, ngo.key)) \
+                            if group_type else None
+                        if key:
+                            # Check if user with key exists
+                            existing_user = users_by_key.get(key)
+                            if not existing_user or existing_user.username != username:
+                                logger.error("User does not exist index: " + str(index))
+                                response.append(create_file_upload_error(index, 'key', 'User with key does not exist'))
                                 error_in_file = True
+                                continue
 
+                            user_data = {"first_name": first_name, "middle_name": middle_name,
+                                         "last_name": last_name, "ngo_id": ngo.id, "email": email,
+                                         "username": username, "is_active": existing_user.is_active}
                         else:
-                            logger.error("User does not exist index: " + str(index))
-                            response.append(create_file_upload_error(index, 'key', 'User with key does not exist'))
-                            error_in_file = True
-                    else:
-                        new_group_type = get_group_type_from_name(role)
-                        if new_group_type:
-                            new_user = {"username": username, "first_name": first_name, "middle_name": middle_name,
-                                        "last_name": last_name, "email": email, "ngo_id": ngo.id}
-                            if email is None and new_group_type != GroupType.BOOK_FAIRY:
-                                response.append(create_file_upload_error(index, "email", "Email is required"))
-                                error_in_file = True
+                            existing_user = None
+                            user_data = {"username": username, "first_name": first_name, "middle_name": middle_name,
+                                         "last_name": last_name, "email": email, "ngo_id": ngo.id}
 
-                            serializer = UserSerializer(data=new_user)
-                            if serializer.is_valid():
-                                user = serializer.save()
-                                user.set_password("admin")
-                                user.save()
-                                new_group_name = get_ngo_specific_group_name(new_group_type, ngo.key)
-                                new_group = Group.objects.get(name=new_group_name)
-                                user.groups.add(new_group)
-                            else:
-                                response.append(create_file_upload_serializer_error(index, serializer.errors))
-                                error_in_file = True
-
-                        else:
+                        if not group:
                             # Incorrect role /group name
-                            error_in_file = True
                             logger.error("Incorrect user group provided role: %s", role)
                             response.append(
                                 create_file_upload_error(index, 'group', 'Value must be one of ' + ', '.join(
                                     get_valid_user_types())))
+                            error_in_file = True
+                            continue
+
+                        if email is None and group_type != GroupType.BOOK_FAIRY:
+                            response.append(create_file_upload_error(index, "email", "Email is required"))
+                            error_in_file = True
+
+                        serializer = get_import_serializer(UserSerializer, lookups, existing_user, data=user_data)
+                        if not serializer.is_valid():
+                            response.append(create_file_upload_serializer_error(index, serializer.errors))
+                            error_in_file = True
+                            continue
+
+                        user = existing_user or User()
+                        if usernames.is_taken(username, user.key):
+                            response.append(create_file_upload_error(index, 'username',
+                                                                     'A user with that username already exists.'))
+                            error_in_file = True
+                            continue
+                        if emails.is_taken(email, user.key):
+                            response.append(create_file_upload_error(index, 'email',
+                                                                     'user with this email already exists.'))
+                            error_in_file = True
+                            continue
+
+                        if emails.is_released(email):
+                            users.save()
+                        set_validated_data(user, serializer.validated_data)
+                        usernames.add(username, user.key)
+                        emails.add(email, user.key)
+                        groups_by_user_key[user.key] = group
+                        if existing_user:
+                            users.update(user, serializer.validated_data)
+                        else:
+                            user.set_password("admin")
+                            users.create(user)
+
+                    users.save()
+
                 if error_in_file:
                     raise DatabaseError
         except DatabaseError as e:
@@ -923,13 +904,8 @@ class NGOViewSet(ViewSet):
         if not request_user_belongs_to_ngo(request, ngo):
             return Response(status=403, data=ERROR_403_JSON())
 
-        users = User.objects.filter(ngo=ngo, is_active=True)
-        excel_data = write_to_excel(FileType.USER, users)
-        base64_excel_data = base64.b64encode(excel_data)
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename=Users.xlsx'
-        response.write(base64_excel_data)
-        return response
+        users = annotate_user_group(User.objects.filter(ngo=ngo, is_active=True)).order_by('pk').iterator()
+        return create_excel_response(request, FileType.USER, users, 'Users.xlsx')
 
     @action(methods=['GET'], detail=True)
     def get_levels(self, request, pk=None):
@@ -967,77 +943,84 @@ class NGOViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         worksheet = workbook[BOOK_WORKSHEET_NAME]
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_book_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_book_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        book_levels = BookLevel.objects.all()
+        book_levels = get_reference_data(BookLevel)
+        books_by_key = Book.objects.filter(ngo=ngo).in_bulk(field_name='key')
+        book_names = UniqueValues(Book.objects.filter(ngo=ngo), 'name')
+        lookups = {'ngo_id': ObjectLookup(NGO, [ngo], 'id'),
+                   'book_level_id': book_levels}
         response = []
         try:
             with transaction.atomic():
                 error_in_file = False
-                for index, row in enumerate(rows):
-                    if index == 0:
-                        continue
-                    key = row[0].value.strip() if row[0].value else None
-                    name = row[1].value.strip() if row[1].value else None
-                    book_level_name = row[2].value.strip() if row[2].value else None
+                for chunk in chunk_import_rows(rows):
+                    books = BulkImport(Book)
+                    for index, row in chunk:
+                        key = row[0].value.strip() if row[0].value else None
+                        name = row[1].value.strip() if row[1].value else None
+                        book_level_name = row[2].value.strip() if row[2].value else None
+
+                        if name is None and key is None and book_level_name is None:
+                            continue
 
-                    if name is None and key is None and book_level_name is None:
-                        continue
+                        book_level = get_book_level(book_levels, book_level_name)
+                        if not book_level and book_level_name:
+                            response.append(create_file_upload_error(index, 'level', 'Value must be one of ' + str(
+                                get_valid_book_levels())))
+                            error_in_file = True
+                            continue
+                        author = row[3].value.strip() if row[3].value else None
+                        publisher = row[4].value.strip() if row[4].value else None
+                        price = str(row[5].value) if row[5].value else None
+                        if key:
+                            # Check if book with key exists
+                            existing_book = books_by_key.get(key)
+                            if existing_book:
+                                book_data = {"name": name, "publisher": publisher, "price": price, "ngo_id": ngo.id,
+                                             "author": author,
+                                             "is_active": existing_book.is_active}
+                                if book_level:
+                                    book_data['book_level_id'] = book_level.id
+                                serializer = get_import_serializer(BookSerializer, lookups, existing_book,
+                                                                   data=book_data)
+                                if serializer.is_valid():
+                                    books.update(set_validated_data(existing_book, serializer.validated_data),
+                                                 serializer.validated_data)
+                                    book_names.add(existing_book.name, existing_book.key)
+                                else:
+                                    response.append(create_file_upload_serializer_error(index, serializer.errors))
+                                    error_in_file = True
+                            else:
+                                logging.error("Book with specified key does not exist index:" + str(index))
+                                response.append(create_file_upload_error(index, "book",
+                                                                         "Book with specified key does not exist"))
+                                error_in_file = True
+                        else:
+                            if book_names.is_taken(name, None):
+                                response.append(create_file_upload_error(index, "name", "Book with same name already "
+                                                                                        "exists"))
+                                error_in_file = True
+                                continue
 
-                    book_level = get_book_level(book_levels, book_level_name)
-                    if not book_level and book_level_name:
-                        response.append(create_file_upload_error(index, 'level', 'Value must be one of ' + str(
-                            get_valid_book_levels())))
-                        error_in_file = True
-                        continue
-                    author = row[3].value.strip() if row[3].value else None
-                    publisher = row[4].value.strip() if row[4].value else None
-                    price = str(row[5].value) if row[5].value else None
-                    if key:
-                        # Check if book with key exists
-                        existing_book = Book.objects.filter(key=key, ngo=ngo).first()
-                        if existing_book:
-                            book_data = {"name": name, "publisher": publisher, "price": price, "ngo_id": ngo.id,
-                                         "author": author,
-                                         "is_active": existing_book.is_active}
+                            new_book_data = {"name": name, "publisher": publisher, "price": price, "ngo_id": ngo.id,
+                                             "author": author}
                             if book_level:
-                                book_data['book_level_id'] = book_level.id
-                            serializer = BookSerializer(existing_book, data=book_data)
+                                new_book_data['book_level_id'] = book_level.id
+                            serializer = get_import_serializer(BookSerializer, lookups, data=new_book_data)
                             if serializer.is_valid():
-                                serializer.save()
+                                book = books.create(Book(**serializer.validated_data))
+                                book_names.add(book.name, book.key)
+                                logging.debug("Creating new book index: " + str(index))
                             else:
                                 response.append(create_file_upload_serializer_error(index, serializer.errors))
                                 error_in_file = True
-                        else:
-                            logging.error("Book with specified key does not exist index:" + str(index))
-                            response.append(create_file_upload_error(index, "book",
-                                                                     "Book with specified key does not exist"))
-                            error_in_file = True
-                    else:
-                        existing_book = Book.objects.filter(name=name, ngo=ngo).first()
-                        if existing_book:
-                            response.append(create_file_upload_error(index, "name", "Book with same name already "
-                                                                                    "exists"))
-                            error_in_file = True
-                            continue
-
-                        new_book_data = {"name": name, "publisher": publisher, "price": price, "ngo_id": ngo.id,
-                                         "author": author}
-                        if book_level:
-                            new_book_data['book_level_id'] = book_level.id
-                        serializer = BookSerializer(data=new_book_data)
-                        if serializer.is_valid():
-                            serializer.save()
-                            logging.debug("Creating new book index: " + str(index))
-                        else:
-                            response.append(create_file_upload_serializer_error(index, serializer.errors))
-                            error_in_file = True
+                    books.save()
 
                 if error_in_file:
                     raise DatabaseError
@@ -1062,96 +1045,114 @@ class NGOViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         worksheet = workbook[INVENTORY_BOOK_WORKSHEET_NAME]
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_inventory_book_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_inventory_book_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
+        inventories_by_key = {inventory.key: inventory for inventory in Inventory.objects.filter(book=book)}
+        book_serial_numbers = UniqueValues(Inventory.objects.filter(book=book), 'serial_number')
+        ngo_serial_numbers = UniqueValues(Inventory.objects.filter(book__ngo=ngo), 'serial_number')
+        lookups = {'book_id': ObjectLookup(Book, [book], 'id')}
         response = []
         try:
             with transaction.atomic():
                 error_in_file = False
-                for index, row in enumerate(rows):
-                    if index == 0:
-                        continue
-                    key = str(row[0].value).strip() if row[0].value else None
-                    serial_number = str(row[1].value).strip() if row[1].value else None
-                    status_string = str(row[2].value).strip() if row[2].value else None
-                    status = get_inventory_status(status_string)
-                    year_of_purchase_string = row[3].value
-                    year_of_purchase = None
-                    if year_of_purchase_string:
-                        try:
-                            if type(year_of_purchase_string) is not datetime:
-                                year_of_purchase_string = str(row[3].value).strip() if row[3].value else None
-                                year_of_purchase = datetime.strptime(year_of_purchase_string, "%Y").date()
-                            else:
-                                year_of_purchase = year_of_purchase_string.date()
-                        except ValueError:
+                for chunk in chunk_import_rows(rows):
+                    inventories = BulkImport(Inventory)
+                    for index, row in chunk:
+                        key = str(row[0].value).strip() if row[0].value else None
+                        serial_number = str(row[1].value).strip() if row[1].value else None
+                        status_string = str(row[2].value).strip() if row[2].value else None
+                        status = get_inventory_status(status_string)
+                        year_of_purchase_string = row[3].value
+                        year_of_purchase = None
+                        if year_of_purchase_string:
+                            try:
+                                if type(year_of_purchase_string) is not datetime:
+                                    year_of_purchase_string = str(row[3].value).strip() if row[3].value else None
+                                    year_of_purchase = datetime.strptime(year_of_purchase_string, "%Y").date()
+                                else:
+                                    year_of_purchase = year_of_purchase_string.date()
+                            except ValueError:
+                                error_in_file = True
+                                response.append(
+                                    create_file_upload_error(index, 'year_of_intervention', 'Value must be yyyy'))
+                                continue
+
+                        if serial_number is None and status is None:
+                            continue
+
+                        if not status:
+                            logger.error("Inventory status is incorrect: index" + str(index))
+                            response.append(create_file_upload_error(index, 'status', 'Value must be one of ' + ', '.join(
+                                get_valid_inventory_statuses())))
                             error_in_file = True
-                            response.append(
-                                create_file_upload_error(index, 'year_of_intervention', 'Value must be yyyy'))
                             continue
 
-                    if serial_number is None and status is None:
-                        continue
+                        if not serial_number:
+                            logger.error("Inventory serial number is incorrect: index" + str(index))
+                            response.append(create_file_upload_error(index, 'serial number',
+                                                                     'Inventory serial number is incorrect'))
+                            error_in_file = True
+                            continue
 
-                    if not status:
-                        logger.error("Inventory status is incorrect: index" + str(index))
-                        response.append(create_file_upload_error(index, 'status', 'Value must be one of ' + ', '.join(
-                            get_valid_inventory_statuses())))
-                        error_in_file = True
-                        continue
+                        if key:
+                            # Check inventory with key exist?
+                            existing_inventory = inventories_by_key.get(key)
 
-                    if not serial_number:
-                        logger.error("Inventory serial number is incorrect: index" + str(index))
-                        response.append(create_file_upload_error(index, 'serial number',
-                                                                 'Inventory serial number is incorrect'))
-                        error_in_file = True
-                        continue
+                            if existing_inventory:
+                                inventory_data = {"status": status, "serial_number": serial_number, "book_id": book.id,
+                                                  "added_date_time": year_of_purchase,
+                                                  "is_active": existing_inventory.is_active}
 
-                    if key:
-                        # Check inventory with key exist?
-                        existing_inventory = Inventory.objects.filter(key=key, book=book).first()
+                                serializer = get_import_serializer(InventorySerializer, lookups, existing_inventory,
+                                                                   data=inventory_data)
+                                if not serializer.is_valid():
+                                    response.append(create_file_upload_serializer_error(index, serializer.errors))
+                                    error_in_file = True
+                                elif book_serial_numbers.is_taken(serial_number, existing_inventory.key):
+                                    response.append(create_file_upload_error(index, 'non_field_errors',
+                                                                             'The fields book, serial_number must '
+                                                                             'make a unique set.'))
+                                    error_in_file = True
+                                else:
+                                    if book_serial_numbers.is_released(serial_number):
+                                        inventories.save()
+                                    set_validated_data(existing_inventory, serializer.validated_data)
+                                    inventories.update(existing_inventory, serializer.validated_data)
+                                    book_serial_numbers.add(serial_number, existing_inventory.key)
+                                    ngo_serial_numbers.add(serial_number, existing_inventory.key)
 
-                        if existing_inventory:
-                            inventory_data = {"status": status, "serial_number": serial_number, "book_id": book.id,
-                                              "added_date_time": year_of_purchase,
-                                              "is_active": existing_inventory.is_active}
+                            else:
+                                logging.error("Inventory with specified key does not exist index:" + str(index))
+                                response.append(create_file_upload_error(index, "inventory",
+                                                                         "Inventory with specified key does not exist"))
+                                error_in_file = True
+                        else:
+                            inventory = Inventory()
+                            if ngo_serial_numbers.is_taken(serial_number, inventory.key):
+                                response.append(create_file_upload_error(index, 'serial_number',
+                                                                         "An inventory exists with the same serial_number :" + serial_number))
+                                error_in_file = True
+                                continue
 
-                            serializer = InventorySerializer(existing_inventory, data=inventory_data)
+                            new_inventory_data = {"status": status, "serial_number": serial_number, "book_id": book.id,
+                                                  "added_date_time": year_of_purchase}
+                            serializer = get_import_serializer(InventorySerializer, lookups, data=new_inventory_data)
                             if serializer.is_valid():
-                                serializer.save()
+                                if book_serial_numbers.is_released(serial_number):
+                                    inventories.save()
+                                inventories.create(set_validated_data(inventory, serializer.validated_data))
+                                book_serial_numbers.add(serial_number, inventory.key)
+                                ngo_serial_numbers.add(serial_number, inventory.key)
+                                logging.debug("Creating new inventory index: " + str(index))
                             else:
                                 response.append(create_file_upload_serializer_error(index, serializer.errors))
                                 error_in_file = True
-
-                        else:
-                            logging.error("Inventory with specified key does not exist index:" + str(index))
-                            response.append(create_file_upload_error(index, "inventory",
-                                                                     "Inventory with specified key does not exist"))
-                            error_in_file = True
-                    else:
-                        existing_inventory_with_same_serial_number = Inventory.objects.filter(book__ngo=ngo,
-                                                                                              serial_number=serial_number).exists()
-                        if existing_inventory_with_same_serial_number:
-                            response.append(create_file_upload_error(index, 'serial_number',
-                                                                     "An inventory exists with the same serial_number :" + serial_number))
-                            error_in_file = True
-                            continue
-
-                        new_inventory_data = {"status": status, "serial_number": serial_number, "book_id": book.id,
-                                              "added_date_time": year_of_purchase}
-                        serializer = InventorySerializer(data=new_inventory_data)
-                        if serializer.is_valid():
-                            serializer.save()
-                            logging.debug("Creating new inventory index: " + str(index))
-                        else:
-                            response.append(create_file_upload_serializer_error(index, serializer.errors))
-                            error_in_file = True
+                    inventories.save()
 
                 if error_in_file:
                     raise DatabaseError
@@ -1175,22 +1176,19 @@ class NGOViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         worksheet = workbook[BOOK_WORKSHEET_NAME]
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_book_and_inventory_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_book_and_inventory_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        book_levels = BookLevel.objects.all()
+        book_levels = get_reference_data(BookLevel)
         response = []
         try:
             with transaction.atomic():
                 error_in_file = False
-                for index, row in enumerate(rows):
-                    if index == 0:
-                        continue
+                for index, row in rows:
                     key = row[0].value.strip() if row[0].value else None
                     name = row[1].value.strip() if row[1].value else None
                     book_level_name = row[2].value.strip() if row[2].value else None
@@ -1302,13 +1300,8 @@ class NGOViewSet(ViewSet):
         if not request_user_belongs_to_ngo(request, ngo):
             return Response(status=403, data=ERROR_403_JSON())
 
-        books = Book.objects.filter(ngo=ngo, is_active=True)
-        excel_data = write_to_excel(FileType.BOOK, books)
-        base64_excel_data = base64.b64encode(excel_data)
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename=' + BOOK_WORKSHEET_NAME + '.xlsx'
-        response.write(base64_excel_data)
-        return response
+        books = Book.objects.filter(ngo=ngo, is_active=True).select_related('level').iterator()
+        return create_excel_response(request, FileType.BOOK, books, BOOK_WORKSHEET_NAME + '.xlsx')
 
     @action(methods=['GET'], detail=True, permission_classes=[CanExportBook])
     def export_inventory(self, request, pk=None):
@@ -1326,13 +1319,8 @@ class NGOViewSet(ViewSet):
         except Book.DoesNotExist as e:
             return Response(status=404, data=create_response_error(e))
 
-        inventory = Inventory.objects.filter(book__key=book_key, is_active=True)
-        excel_data = write_to_excel(FileType.INVENTORY, inventory)
-        base64_excel_data = base64.b64encode(excel_data)
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename=' + INVENTORY_BOOK_WORKSHEET_NAME + '.xlsx'
-        response.write(base64_excel_data)
-        return response
+        inventory = Inventory.objects.filter(book__key=book_key, is_active=True).iterator()
+        return create_excel_response(request, FileType.INVENTORY, inventory, INVENTORY_BOOK_WORKSHEET_NAME + '.xlsx')
 
     @action(methods=['POST'], detail=True, permission_classes=[CanImportSchool])
     def import_schools(self, request, pk=None):
@@ -1348,121 +1336,130 @@ class NGOViewSet(ViewSet):
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        file_in_memory = request.FILES['file'].read()
-        workbook = load_workbook(filename=BytesIO(file_in_memory))
+        workbook = load_import_workbook(request.FILES['file'])
         worksheet = workbook[SCHOOL_WORKSHEET_NAME]
-        rows = list(worksheet.rows)
-        is_valid, error_message = validate_school_file_excel_content(rows)
+        header_row, rows = read_import_rows(worksheet)
+        is_valid, error_message = validate_school_file_excel_content(header_row)
         if not is_valid:
             return Response(status=400, data=create_response_data(error_message))
 
-        school_categories = SchoolCategory.objects.all()
-        school_types = SchoolType.objects.all()
-        mediums = SchoolMedium.objects.all()
+        school_categories = get_reference_data(SchoolCategory)
+        school_types = get_reference_data(SchoolType)
+        mediums = get_reference_data(SchoolMedium)
+        schools_by_key = School.objects.filter(ngo=ngo).in_bulk(field_name='key')
+        school_names = UniqueValues(School.objects.filter(ngo=ngo), 'name')
+        lookups = {'ngo_key': ObjectLookup(NGO, [ngo], 'key'),
+                   'school_category_id': school_categories,
+                   'school_type_id': school_types,
+                   'medium_id': mediums}
         response = []
         try:
             with transaction.atomic():
                 error_in_file = False
-                for index, row in enumerate(rows):
-                    if index == 0:
-                        continue
-                    key = str(row[0].value).strip() if row[0].value else None
-                    name = str(row[1].value).strip() if row[1].value else None
-                    address = str(row[2].value).strip() if row[2].value else None
-                    pin_code = row[3].value
-                    ward_number = str(row[4].value).strip() if row[4].value else None
-                    school_number = str(row[5].value).strip() if row[5].value else None
-                    school_category_name = str(row[6].value).strip() if row[6].value else None
-                    school_type_name = str(row[7].value).strip() if row[7].value else None
-                    medium_name = str(row[8].value).strip() if row[8].value else None
-                    organization_name = str(row[9].value).strip() if row[9].value else None
-                    year_of_intervention_string = row[10].value
-                    year_of_intervention = None
-
-                    if name is None and address is None and pin_code is None and school_category_name is None and \
-                            school_type_name is None and medium_name is None:
-                        continue
+                for chunk in chunk_import_rows(rows):
+                    schools = BulkImport(School)
+                    for index, row in chunk:
+                        key = str(row[0].value).strip() if row[0].value else None
+                        name = str(row[1].value).strip() if row[1].value else None
+                        address = str(row[2].value).strip() if row[2].value else None
+                        pin_code = row[3].value
+                        ward_number = str(row[4].value).strip() if row[4].value else None
+                        school_number = str(row[5].value).strip() if row[5].value else None
+                        school_category_name = str(row[6].value).strip() if row[6].value else None
+                        school_type_name = str(row[7].value).strip() if row[7].value else None
+                        medium_name = str(row[8].value).strip() if row[8].value else None
+                        organization_name = str(row[9].value).strip() if row[9].value else None
+                        year_of_intervention_string = row[10].value
+                        year_of_intervention = None
+
+                        if name is None and address is None and pin_code is None and school_category_name is None and \
+                                school_type_name is None and medium_name is None:
+                            continue
 
-                    school_category = get_school_category(school_categories, school_category_name)
-                    if not school_category:
-                        error_in_file = True
-                        response.append(create_file_upload_error(index, 'school_category',
-                                                                 'Value must be one of ' + ', '.join(
-                                                                     get_valid_school_categories())))
-                        continue
+                        school_category = get_school_category(school_categories, school_category_name)
+                        if not school_category:
+                            error_in_file = True
+                            response.append(create_file_upload_error(index, 'school_category',
+                                                                     'Value must be one of ' + ', '.join(
+                                                                         get_valid_school_categories())))
+                            continue
 
-                    school_type = get_school_type(school_types, school_type_name)
-                    if not school_type:
-                        error_in_file = True
-                        response.append(create_file_upload_error(index, 'school_type',
-                                                                 'Value must be one of ' + ', '.join(
-                                                                     get_valid_school_types())))
-                        continue
+                        school_type = get_school_type(school_types, school_type_name)
+                        if not school_type:
+                            error_in_file = True
+                            response.append(create_file_upload_error(index, 'school_type',
+                                                                     'Value must be one of ' + ', '.join(
+                                                                         get_valid_school_types())))
+                            continue
 
-                    medium = get_school_medium(mediums, medium_name)
-                    if not medium:
-                        error_in_file = True
-                        response.append(create_file_upload_error(index, 'medium', 'Value must be one of ' + ', '.join(
-                            get_valid_school_mediums())))
-                        continue
-                    if year_of_intervention_string:
-                        try:
-                            if type(year_of_intervention_string) is not datetime:
-                                year_of_intervention_string = str(row[10].value).strip() if row[10].value else None
-                                year_of_intervention = datetime.strptime(year_of_intervention_string, "%Y").date()
-                            else:
-                                year_of_intervention = year_of_intervention_string.date()
-                        except ValueError:
+                        medium = get_school_medium(mediums, medium_name)
+                        if not medium:
                             error_in_file = True
-                            response.append(
-                                create_file_upload_error(index, 'year_of_intervention', 'Value must be yyyy'))
+                            response.append(create_file_upload_error(index, 'medium', 'Value must be one of ' + ', '.join(
+                                get_valid_school_mediums())))
                             continue
+                        if year_of_intervention_string:
+                            try:
+                                if type(year_of_intervention_string) is not datetime:
+                                    year_of_intervention_string = str(row[10].value).strip() if row[10].value else None
+                                    year_of_intervention = datetime.strptime(year_of_intervention_string, "%Y").date()
+                                else:
+                                    year_of_intervention = year_of_intervention_string.date()
+                            except ValueError:
+                                error_in_file = True
+                                response.append(
+                                    create_file_upload_error(index, 'year_of_intervention', 'Value must be yyyy'))
+                                continue
+
+                        if key:
+                            # Check if school with key exists
+                            existing_school = schools_by_key.get(key)
+                            if existing_school:
+                                school_data = {"name": name, "address": address, "pin_code": pin_code,
+                                               "ward_number": ward_number, "school_number": school_number,
+                                               "school_category": school_category, "school_type": school_type,
+                                               "medium": medium, "organization_name": organization_name,
+                                               "year_of_intervention": year_of_intervention, 'ngo_key': pk,
+                                               'school_category_id': school_category.id, 'school_type_id': school_type.id,
+                                               'medium_id': medium.id,
+                                               'is_active': existing_school.is_active}
+                                serializer = get_import_serializer(SchoolSerializer, lookups, existing_school,
+                                                                   data=school_data)
+                                if serializer.is_valid():
+                                    schools.update(set_validated_data(existing_school, serializer.validated_data),
+                                                   serializer.validated_data)
+                                    school_names.add(existing_school.name, existing_school.key)
+                                else:
+                                    response.append(create_file_upload_serializer_error(index, serializer.errors))
+                                    error_in_file = True
+                            else:
+                                logging.error("School with specified key does not exist index:" + str(index))
+                                response.append(create_file_upload_error(index, "school",
+                                                                         "School with specified key does not exist"))
+                                error_in_file = True
+                        else:
 
-                    if key:
-                        # Check if school with key exists
-                        existing_school = School.objects.filter(key=key, ngo=ngo).first()
-                        if existing_school:
-                            school_data = {"name": name, "address": address, "pin_code": pin_code,
-                                           "ward_number": ward_number, "school_number": school_number,
-                                           "school_category": school_category, "school_type": school_type,
-                                           "medium": medium, "organization_name": organization_name,
-                                           "year_of_intervention": year_of_intervention, 'ngo_key': pk,
-                                           'school_category_id': school_category.id, 'school_type_id': school_type.id,
-                                           'medium_id': medium.id,
-                                           'is_active': existing_school.is_active}
-                            serializer = SchoolSerializer(existing_school, data=school_data)
+                            if school_names.is_taken(name, None):
+                                response.append(create_file_upload_error(index, "name", "School with same name already "
+                                                                                        "exists"))
+                                error_in_file = True
+                                continue
+                            new_school = {"name": name, "address": address, "pin_code": pin_code,
+                                          "ward_number": ward_number, "school_number": school_number,
+                                          "school_category": school_category, "school_type": school_type, "medium": medium,
+                                          "organization_name": organization_name,
+                                          "year_of_intervention": year_of_intervention, 'ngo_key': pk,
+                                          'school_category_id': school_category.id, 'school_type_id': school_type.id,
+                                          'medium_id': medium.id}
+                            serializer = get_import_serializer(SchoolSerializer, lookups, data=new_school)
                             if serializer.is_valid():
-                                serializer.save()
+                                school = schools.create(School(**serializer.validated_data))
+                                school_names.add(school.name, school.key)
+                                logging.debug("Creating new school index: " + str(index))
                             else:
                                 response.append(create_file_upload_serializer_error(index, serializer.errors))
                                 error_in_file = True
-                        else:
-                            logging.error("School with specified key does not exist index:" + str(index))
-                            response.append(create_file_upload_error(index, "school",
-                                                                     "School with specified key does not exist"))
-                            error_in_file = True
-                    else:
-
-                        existing_school = School.objects.filter(name=name, ngo=ngo).first()
-                        if existing_school:
-                            response.append(create_file_upload_error(index, "name", "School with same name already "
-                                                                                    "exists"))
-                            error_in_file = True
-                            continue
-                        new_school = {"name": name, "address": address, "pin_code": pin_code,
-                                      "ward_number": ward_number, "school_number": school_number,
-                                      "school_category": school_category, "school_type": school_type, "medium": medium,
-                                      "organization_name": organization_name,
-                                      "year_of_intervention": year_of_intervention, 'ngo_key': pk,
-                                      'school_category_id': school_category.id, 'school_type_id': school_type.id,
-                                      'medium_id': medium.id}
-                        serializer = SchoolSerializer(data=new_school)
-                        if serializer.is_valid():
-                            serializer.save()
-                            logging.debug("Creating new school index: " + str(index))
-                        else:
-                            response.append(create_file_upload_serializer_error(index, serializer.errors))
-                            error_in_file = True
+                    schools.save()
 
                 if error_in_file:
                     raise DatabaseError
@@ -1481,13 +1478,9 @@ class NGOViewSet(ViewSet):
         if not request_user_belongs_to_ngo(request, ngo):
             return Response(status=403, data=ERROR_403_JSON())
 
-        schools = School.objects.filter(ngo=ngo, is_active=True)
-        excel_data = write_to_excel(FileType.SCHOOL, schools)
-        base64_excel_data = base64.b64encode(excel_data)
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename=' + SCHOOL_WORKSHEET_NAME + '.xlsx'
-        response.write(base64_excel_data)
-        return response
+        schools = School.objects.filter(ngo=ngo, is_active=True) \
+            .select_related('school_category', 'school_type', 'medium').iterator()
+        return create_excel_response(request, FileType.SCHOOL, schools, SCHOOL_WORKSHEET_NAME + '.xlsx')
 
     @action(detail=True, methods=['POST'], permission_classes=[CanAddLevel])
     def add_level(self, request, pk=None):
@@ -1599,7 +1592,7 @@ class NGOViewSet(ViewSet):
         try:
             ngo = NGO.objects.get(key=pk)
             book_fairy = User.objects.get(key=book_fairy_key)
-            academic_year = AcademicYear.objects.get(key=academic_year_key)
+            academic_year = get_reference_data(AcademicYear).get(key=academic_year_key)
             school = School.objects.get(ngo=ngo, key=school_key)
             classroom = Classroom.objects.get(school=school, key=classroom_key)
         except (NGO.DoesNotExist, User.DoesNotExist, AcademicYear.DoesNotExist, School.DoesNotExist,
@@ -1613,16 +1606,12 @@ class NGOViewSet(ViewSet):
             'academic_year': academic_year,
             'is_evaluated': True
         }
+        sessions = ReadSession.objects.exclude(type=BOOK_LENDING).filter(**filters).distinct()
         if session_type == REGULAR or session_type == EVALUATION:
-            sessions = ReadSession.objects.exclude(type=BOOK_LENDING) \
-                .filter(**filters, type=session_type).order_by("start_date_time")
-            serializer = ReadSessionBookFairyReportSerializer(sessions, many=True, attendance=attendance)
-        else:
-            sessions = ReadSession.objects.exclude(type=BOOK_LENDING) \
-                .filter(**filters).order_by("start_date_time")
-            serializer = ReadSessionBookFairyReportSerializer(sessions, many=True, attendance=attendance)
+            sessions = sessions.filter(type=session_type)
+        sessions = sessions.order_by("start_date_time")
 
-        return Response(status=200, data=serializer.data)
+        return Response(status=200, data=get_student_session_report(sessions, attendance))
 
 
 class LevelViewSet(ViewSet):
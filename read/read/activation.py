@@ -0,0 +1,47 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from django.db import transaction
+from django.utils import timezone
+
+from books.models import Book
+from classrooms.models import Classroom
+from ngos.models import NGO
+from read.tenancy import NGO_LOOKUPS
+from schools.models import School
+
+
+def set_active(queryset, is_active):
+    # Rows already in the requested state are left alone, so the count is what actually changed
+    return queryset.exclude(is_active=is_active).update(is_active=is_active, last_modification_time=timezone.now())
+
+
+def set_keys_active(model, keys, is_active, ngo=None):
+    queryset = model.objects.filter(key__in=set(keys))
+    if ngo is not None:
+        queryset = queryset.filter(**{NGO_LOOKUPS[model]: ngo})
+    return set_active(queryset, is_active)
+
+
+def set_ngos_active(ngo_keys, is_active):
+    ngos = NGO.objects.filter(key__in=set(ngo_keys))
+    with transaction.atomic():
+        counts = {'ngos': set_active(ngos, is_active)}
+        # Reactivating an NGO leaves its schools, classrooms and books as they are
+        if not is_active:
+            counts['schools'] = set_active(School.objects.filter(ngo__in=ngos), False)
+            counts['classrooms'] = set_active(Classroom.objects.filter(school__ngo__in=ngos), False)
+            counts['books'] = set_active(Book.objects.filter(ngo__in=ngos), False)
+    return counts
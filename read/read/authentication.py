@@ -12,12 +12,55 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime
-from django.utils.timezone import make_aware
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.utils import timezone
 
 from rest_framework import authentication
 
-from users.models import MobileAuthToken
+from read.common import is_cache_shared
+from users.models import MobileAuthToken, User
+
+# Revoking a token only clears the entry of the worker that handled it unless CACHES is shared, so the
+# other workers are left to keep it for a few seconds at most
+MOBILE_AUTH_TOKEN_CACHE_TTL = 300
+MOBILE_AUTH_TOKEN_LOCAL_CACHE_TTL = 5
+
+# Only the token is cached, the user is loaded on every request so a deactivated user is locked out at once
+CachedMobileAuthToken = namedtuple('CachedMobileAuthToken', ['id', 'user_id', 'expiry_date'])
+
+
+def _mobile_auth_token_cache_key(token):
+    return 'mobile_auth_token:' + token
+
+
+def get_mobile_auth_token_cache_ttl():
+    return MOBILE_AUTH_TOKEN_CACHE_TTL if is_cache_shared() else MOBILE_AUTH_TOKEN_LOCAL_CACHE_TTL
+
+
+def get_mobile_auth_token(token):
+    now = timezone.now()
+    cached_token = cache.get(_mobile_auth_token_cache_key(token))
+    if cached_token is None or cached_token.expiry_date <= now:
+        auth_token = MobileAuthToken.objects.select_related('user').filter(
+            token=token, expiry_date__gt=now, user__is_active=True).first()
+        if auth_token is None:
+            return None
+        timeout = min(get_mobile_auth_token_cache_ttl(), (auth_token.expiry_date - now).total_seconds())
+        cache.set(_mobile_auth_token_cache_key(token),
+                  CachedMobileAuthToken(auth_token.id, auth_token.user_id, auth_token.expiry_date), timeout)
+        return auth_token
+
+    user = User.objects.filter(id=cached_token.user_id, is_active=True).first()
+    if user is None:
+        return None
+    return MobileAuthToken(id=cached_token.id, token=token, user=user, expiry_date=cached_token.expiry_date)
+
+
+def expire_mobile_auth_token(auth_token):
+    MobileAuthToken.objects.filter(id=auth_token.id).update(expiry_date=timezone.now())
+    cache.delete(_mobile_auth_token_cache_key(auth_token.token))
 
 
 class MobileAuthentication(authentication.BaseAuthentication):
@@ -35,10 +78,10 @@ class MobileAuthentication(authentication.BaseAuthentication):
             return None, None
 
         if token:
-            auth_token = MobileAuthToken.objects.filter(token=token, expiry_date__gt=make_aware(datetime.now())).first()
+            auth_token = get_mobile_auth_token(token)
             if auth_token:
                 # print("Token exists")
-                return auth_token.user, None
+                return auth_token.user, auth_token
             # else:
                 # print("Auth Token not found")
         # else:
@@ -0,0 +1,139 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.db import connection
+from django.db.models import Case, When, Value
+from django.db.models.functions import Cast
+from rest_framework.validators import UniqueValidator, UniqueTogetherValidator
+
+from read.excel_import import IMPORT_CHUNK_SIZE
+
+
+class ObjectLookup(object):
+    # Stands in for the queryset of a SlugRelatedField so rows are resolved from objects fetched up front
+    def __init__(self, model, objects, field_name):
+        self.model = model
+        self.objects = {getattr(instance, field_name): instance for instance in objects}
+
+    def get(self, **kwargs):
+        (field_name, value), = kwargs.items()
+        try:
+            return self.objects[value]
+        except KeyError:
+            raise self.model.DoesNotExist("%s matching query does not exist." % self.model._meta.object_name)
+
+
+def get_import_serializer(serializer_class, lookups, *args, **kwargs):
+    serializer = serializer_class(*args, **kwargs)
+    for field_name, lookup in lookups.items():
+        serializer.fields[field_name].queryset = lookup
+
+    # Uniqueness is checked by the import against values fetched up front instead of a query per row
+    for field in serializer.fields.values():
+        field.validators = [validator for validator in field.validators if not isinstance(validator, UniqueValidator)]
+    serializer.validators = [validator for validator in serializer.validators
+                             if not isinstance(validator, UniqueTogetherValidator)]
+    return serializer
+
+
+def set_validated_data(instance, validated_data):
+    for field_name, value in validated_data.items():
+        setattr(instance, field_name, value)
+    return instance
+
+
+def bulk_update(instances, field_names, batch_size=IMPORT_CHUNK_SIZE):
+    if not instances:
+        return
+    model = type(instances[0])
+    fields = [model._meta.get_field(field_name) for field_name in field_names]
+    fields += [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)
+               and field not in fields]
+
+    for start in range(0, len(instances), batch_size):
+        batch = instances[start:start + batch_size]
+        updates = {}
+        for field in fields:
+            values = [When(pk=instance.pk, then=Value(field.pre_save(instance, False), output_field=field))
+                      for instance in batch]
+            update = Case(*values, output_field=field)
+            if connection.vendor == 'postgresql':
+                # Postgres cannot infer the column type of a CASE made of parameters only
+                update = Cast(update, output_field=field)
+            updates[field.attname] = update
+        model.objects.filter(pk__in=[instance.pk for instance in batch]).update(**updates)
+
+
+class BulkImport(object):
+
+    def __init__(self, model, after_save=None, batch_size=IMPORT_CHUNK_SIZE):
+        self.model = model
+        self.after_save = after_save
+        self.batch_size = batch_size
+        self.created = []
+        self.updated = {}
+        self.update_fields = set()
+
+    def create(self, instance):
+        self.created.append(instance)
+        return instance
+
+    def update(self, instance, field_names):
+        self.updated[instance.pk] = instance
+        self.update_fields.update(field_names)
+        return instance
+
+    def save(self):
+        created = self.created
+        self.model.objects.bulk_create(created, batch_size=self.batch_size)
+        if created and not connection.features.can_return_ids_from_bulk_insert:
+            pks = dict(self.model.objects.filter(key__in=[instance.key for instance in created])
+                       .values_list('key', 'pk'))
+            for instance in created:
+                instance.pk = pks[instance.key]
+
+        updated = list(self.updated.values())
+        bulk_update(updated, sorted(self.update_fields), self.batch_size)
+        if self.after_save:
+            self.after_save(created, updated)
+
+        self.created = []
+        self.updated = {}
+        self.update_fields = set()
+        return created, updated
+
+
+class UniqueValues(object):
+    # Values of a unique column mapped to the key of the row holding them, so rows can be checked without a query
+    def __init__(self, queryset, field_name):
+        self.owners = dict(queryset.exclude(**{field_name: None}).values_list(field_name, 'key'))
+        self.values = {owner: value for value, owner in self.owners.items()}
+        self.released = set()
+
+    def is_taken(self, value, owner):
+        return value is not None and self.owners.get(value, owner) != owner
+
+    def is_released(self, value):
+        # A value given up by a row that is not saved yet cannot be written in the same batch
+        return value in self.released
+
+    def add(self, value, owner):
+        previous_value = self.values.get(owner)
+        if previous_value is not None and previous_value != value:
+            del self.owners[previous_value]
+            self.released.add(previous_value)
+        if value is not None:
+            self.owners[value] = owner
+            self.released.discard(value)
+        self.values[owner] = value
@@ -12,11 +12,21 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
 from django.utils.translation import gettext
 
+PROCESS_LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                                'django.core.cache.backends.dummy.DummyCache')
+
 
 def convert_to_dropdown(options):
     dropdown = []
     for x, y in options:
         dropdown.append({'value': x, 'label': gettext(x)})
-    return dropdown
\ No newline at end of file
+    return dropdown
+
+
+def is_cache_shared(alias=DEFAULT_CACHE_ALIAS):
+    # Whether an entry one worker deletes from the cache is gone for the other workers too
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
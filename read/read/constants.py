@@ -25,7 +25,7 @@ PUBLIC_KEY_LENGTH_BOOK = 12
 PUBLIC_KEY_LENGTH_USER = 8
 PUBLIC_KEY_LENGTH_STUDENT = 6
 PUBLIC_KEY_LENGTH_SESSION = 12
-LENGTH_QR_CODE_SVG_FILENAME = 10
+PUBLIC_KEY_LENGTH_JOB = 12
 LENGTH_TOKEN = 20
 LENGTH_NOTE_FIELD = 500
 LENGTH_RESET_PASSWORD_TOKEN = 10
@@ -70,6 +70,8 @@ READ_SESSION_PENDING = "PENDING"
 READ_SESSION_EVALUATED_NOT_VERIFIED = "EVALUATED_NOT_VERIFIED"
 READ_SESSION_UPCOMING = "UPCOMING"
 
+READ_SESSION_VIEW_COMPACT = "compact"
+
 MEDIUMS = [SCHOOL_MEDIUM_ENGLISH, SCHOOL_MEDIUM_MARATHI, SCHOOL_MEDIUM_URDU, SCHOOL_MEDIUM_HINDI, SCHOOL_MEDIUM_KANNADA]
 
 SCHOOL_TYPE_PCMC = "SCHOOL_TYPE_PCMC"
@@ -148,6 +150,10 @@ STUDENT_WORKSHEET_NAME = 'Students'
 INVENTORY_BOOK_WORKSHEET_NAME = 'Inventory'
 SCHOOL_WORKSHEET_NAME = 'Schools'
 DEFAULT_WORKSHEET_NAME = 'Sheet1'
+EXPORT_MODE_STREAM = 'stream'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PAGINATION_CURSOR = 'cursor'
+COUNT_APPROXIMATE = 'approximate'
 
 
 class FileType(Enum):
@@ -22,3 +22,12 @@ def create_table_as(table_name, queryset, using=DEFAULT_DB_ALIAS):
     sql = "CREATE TABLE " + connection.ops.quote_name(table_name) + " AS " + sql
     with connection.cursor() as cursor:
         cursor.execute(sql, params)
+
+
+def insert_into(table_name, queryset, using=DEFAULT_DB_ALIAS):
+    compiler = queryset.query.get_compiler(using=using)
+    sql, params = compiler.as_sql()
+    connection = connections[using]
+    sql = "INSERT INTO " + connection.ops.quote_name(table_name) + " " + sql
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
@@ -0,0 +1,541 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import base64
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+
+from read.constants import USERS_EXCEL_FIELDS, FileType, USER_WORKSHEET_NAME, BOOK_WORKSHEET_NAME, \
+    STUDENT_WORKSHEET_NAME, BOOKS_EXCEL_FIELDS, STUDENTS_EXCEL_FIELDS, FEMALE, MALE, INVENTORY_BOOK_WORKSHEET_NAME, \
+    INVENTORY_BOOKS_EXCEL_FIELDS, PROTECTION_OPTIONS, SCHOOL_WORKSHEET_NAME, SCHOOLS_EXCEL_FIELDS, \
+    EXPORT_MODE_STREAM, XLSX_CONTENT_TYPE
+from read.utils import get_group_type_from_name, get_valid_user_types, get_book_level_display_name, \
+    get_valid_book_levels, get_inventory_status, get_valid_inventory_statuses, get_school_category_display_name, \
+    get_school_type_display_name, get_school_medium_display_name, get_valid_school_categories, \
+    get_valid_school_types, get_valid_school_mediums
+
+EXPORT_CHUNK_SIZE = 3 * 64 * 1024
+
+
+def process_user_worksheet(users, workbook, worksheet, header):
+    locked = workbook.add_format()
+    locked.set_locked(True)
+    unlocked = workbook.add_format()
+    unlocked.set_locked(False)
+    # Enable worksheet protection
+    worksheet.protect(options=PROTECTION_OPTIONS)
+
+    start_row = start_column = 0
+    row, column = start_row, start_column
+
+    length_key = 6
+    length_username = 10
+    length_first_name = 10
+    length_middle_name = 11
+    length_last_name = 10
+    length_email = 15
+    length_user_type = 10
+    max_length_username = 40
+    max_length_first_name = 40
+    max_length_middle_name = 40
+    max_length_last_name = 40
+    max_length_email = 40
+    max_length_user_type = 40
+    group_types = {}
+
+    for field in USERS_EXCEL_FIELDS:
+        worksheet.write(row, column, field, header)
+        column += 1
+
+    row += 1
+
+    for user in users:
+        column = 0
+        worksheet.write(row, column, user.key, locked)
+        column += 1
+        worksheet.write(row, column, user.username, unlocked)
+        column += 1
+        worksheet.write(row, column, user.first_name, unlocked)
+        column += 1
+        worksheet.write(row, column, user.middle_name, unlocked)
+        column += 1
+        worksheet.write(row, column, user.last_name, unlocked)
+        column += 1
+        worksheet.write(row, column, user.email, unlocked)
+        column += 1
+
+        if user.group_count == 1:
+            if user.group_name not in group_types:
+                group_types[user.group_name] = get_group_type_from_name(user.group_name)
+            group_type = group_types[user.group_name]
+            if group_type:
+                worksheet.write(row, column, group_type.value, locked)
+                if group_type.value and len(group_type.value) > length_user_type:
+                    length_user_type = len(group_type.value)
+
+        if user.username and len(user.username) > length_username:
+            length_username = len(user.username)
+
+        if user.first_name and len(user.first_name) > length_first_name:
+            length_first_name = len(user.first_name)
+
+        if user.middle_name and len(user.middle_name) > length_middle_name:
+            length_middle_name = len(user.middle_name)
+
+        if user.last_name and len(user.last_name) > length_last_name:
+            length_last_name = len(user.last_name)
+
+        if user.email and len(user.email) > length_email:
+            length_email = len(user.email)
+
+        row += 1
+
+    add_list_validation(worksheet, 6, row + 1000, get_valid_user_types())
+
+    worksheet.set_column('A:A', length_key)
+    worksheet.set_column('B:B', length_username if length_username < max_length_username else max_length_username,
+                         unlocked)
+    worksheet.set_column('C:C',
+                         length_first_name if length_first_name < max_length_first_name else max_length_first_name,
+                         unlocked)
+    worksheet.set_column('D:D',
+                         length_middle_name if length_middle_name < max_length_middle_name else max_length_middle_name,
+                         unlocked)
+    worksheet.set_column('E:E', length_last_name if length_last_name < max_length_last_name else max_length_last_name,
+                         unlocked)
+    worksheet.set_column('F:F', length_email if length_email < max_length_email else max_length_email, unlocked)
+    worksheet.set_column('G:G', length_user_type if length_user_type < max_length_user_type else max_length_user_type,
+                         unlocked)
+    workbook.close()
+
+
+def process_book_worksheet(books, workbook, worksheet, header):
+    locked = workbook.add_format()
+    locked.set_locked(True)
+    unlocked = workbook.add_format()
+    unlocked.set_locked(False)
+    # Enable worksheet protection
+    worksheet.protect(options=PROTECTION_OPTIONS)
+
+    start_row = start_column = 0
+    row, column = start_row, start_column
+
+    length_key = 6
+    length_name = 10
+    length_level = 10
+    length_author = 11
+    length_publisher = 11
+    length_price = 10
+    max_length_name = 40
+    max_length_author = 40
+    max_length_publisher = 40
+
+    for field in BOOKS_EXCEL_FIELDS:
+        worksheet.write(row, column, field, header)
+        column += 1
+
+    row += 1
+
+    for book in books:
+        column = 0
+        worksheet.write(row, column, book.key, locked)
+        column += 1
+        worksheet.write(row, column, book.name, unlocked)
+        column += 1
+        book_level = get_book_level_display_name(book)
+        worksheet.write(row, column, book_level, unlocked)
+        column += 1
+        worksheet.write(row, column, book.author, unlocked)
+        column += 1
+        worksheet.write(row, column, book.publisher, unlocked)
+        column += 1
+        worksheet.write(row, column, book.price, unlocked)
+        column += 1
+
+        if book.name and len(book.name) > length_name:
+            length_name = len(book.name)
+
+        if book.author and len(book.author) > length_author:
+            length_author = len(book.author)
+
+        if book.publisher and len(book.publisher) > length_publisher:
+            length_publisher = len(book.publisher)
+
+        row += 1
+
+    add_list_validation(worksheet, 2, row + 1000, get_valid_book_levels())
+
+    worksheet.set_column('A:A', length_key)
+    worksheet.set_column('B:B', length_name if length_name < max_length_name else max_length_name, unlocked)
+    worksheet.set_column('C:C', length_level, unlocked)
+    worksheet.set_column('D:D', length_author if length_author < max_length_author else max_length_author, unlocked)
+    worksheet.set_column('E:E',
+                         length_publisher if length_publisher < max_length_publisher else max_length_publisher,
+                         unlocked)
+    worksheet.set_column('F:F', length_price, unlocked)
+    workbook.close()
+
+
+def process_inventory_book_worksheet(inventory_books, workbook, worksheet, header):
+    locked = workbook.add_format()
+    locked.set_locked(True)
+    unlocked = workbook.add_format()
+    unlocked.set_locked(False)
+    # Enable worksheet protection
+    worksheet.protect(options=PROTECTION_OPTIONS)
+
+    start_row = start_column = 0
+    row, column = start_row, start_column
+
+    length_key = 6
+    length_serial_number = 20
+    max_length_serial_number = 40
+    length_status = 10
+    length_year = 14
+
+    for field in INVENTORY_BOOKS_EXCEL_FIELDS:
+        worksheet.write(row, column, field, header)
+        column += 1
+
+    row += 1
+
+    for inventory in inventory_books:
+        column = 0
+        worksheet.write(row, column, inventory.key, locked)
+        column += 1
+        worksheet.write(row, column, str(inventory.serial_number), unlocked)
+        length_serial_number = len(str(inventory.serial_number))
+        column += 1
+        worksheet.write(row, column, get_inventory_status(inventory.status), unlocked)
+        column += 1
+        year = ""
+        if inventory.added_date_time:
+            year = inventory.added_date_time.strftime("%Y")
+        worksheet.write(row, column, year, unlocked)
+        column += 1
+        row += 1
+
+    add_list_validation(worksheet, 2, row + 1000, get_valid_inventory_statuses())
+
+    worksheet.set_column('A:A', length_key)
+    worksheet.set_column('B:B',
+                         length_serial_number if length_serial_number < max_length_serial_number else max_length_serial_number,
+                         unlocked)
+    worksheet.set_column('C:C', length_status, unlocked)
+    worksheet.set_column('D:D', length_year, unlocked)
+    workbook.close()
+
+
+def process_school_worksheet(schools, workbook, worksheet, header):
+    locked = workbook.add_format()
+    locked.set_locked(True)
+    unlocked = workbook.add_format()
+    unlocked.set_locked(False)
+    # Enable worksheet protection
+    worksheet.protect(options=PROTECTION_OPTIONS)
+
+    start_row = start_column = 0
+    row, column = start_row, start_column
+
+    length_school_key = 6
+    length_school_name = 10
+    length_school_address = 10
+    length_school_pin_code = 10
+    length_school_ward_number = 15
+    length_school_school_number = 15
+    length_school_school_category = 8
+    length_school_school_type = 6
+    length_school_medium = 10
+    length_school_organization_name = 20
+    length_school_year_of_intervention = 20
+
+    max_length_school_key = length_school_key
+    max_length_school_name = 50
+    max_length_school_address = 50
+    max_length_school_pin_code = 10
+    max_length_school_ward_number = 15
+    max_length_school_school_number = 15
+    max_length_school_school_category = 8
+    max_length_school_school_type = 6
+    max_length_school_medium = 10
+    max_length_school_organization_name = 20
+    max_length_school_year_of_intervention = 20
+
+    for field in SCHOOLS_EXCEL_FIELDS:
+        worksheet.write(row, column, field, header)
+        column += 1
+
+    row += 1
+
+    for school in schools:
+        column = 0
+        worksheet.write(row, column, school.key, locked)
+        column += 1
+        worksheet.write(row, column, school.name, unlocked)
+        column += 1
+        worksheet.write(row, column, school.address, unlocked)
+        column += 1
+        worksheet.write(row, column, school.pin_code, unlocked)
+        column += 1
+        worksheet.write(row, column, school.ward_number, unlocked)
+        column += 1
+        worksheet.write(row, column, school.school_number, unlocked)
+        column += 1
+        category = get_school_category_display_name(school)
+        worksheet.write(row, column, category, unlocked)
+        column += 1
+        school_type = get_school_type_display_name(school)
+        worksheet.write(row, column, school_type, unlocked)
+        column += 1
+        medium = get_school_medium_display_name(school)
+        worksheet.write(row, column, medium, unlocked)
+        column += 1
+        worksheet.write(row, column, school.organization_name, unlocked)
+        column += 1
+        year = ""
+        if school.year_of_intervention:
+            year = school.year_of_intervention.strftime("%Y")
+        worksheet.write(row, column, year, unlocked)
+        column += 1
+        row += 1
+
+        if school.key and len(school.key) > length_school_key:
+            length_school_key = len(school.key)
+        if school.name and len(school.name) > length_school_name:
+            length_school_name = len(school.name)
+        if school.address and len(school.address) > length_school_address:
+            length_school_address = len(school.address)
+        if school.pin_code and len(str(school.pin_code)) > length_school_pin_code:
+            length_school_pin_code = len(str(school.pin_code))
+        if school.ward_number and len(school.ward_number) > length_school_ward_number:
+            length_school_ward_number = len(school.ward_number)
+        if school.school_number and len(school.school_number) > length_school_school_number:
+            length_school_school_number = len(school.school_number)
+        if category and len(category) > length_school_school_category:
+            length_school_school_category = len(category)
+        if school_type and len(school_type) > length_school_school_type:
+            length_school_school_type = len(school_type)
+        if medium and len(medium) > length_school_medium:
+            length_school_medium = len(medium)
+        if school.organization_name and len(school.organization_name) > length_school_organization_name:
+            length_school_organization_name = len(school.organization_name)
+
+    add_list_validation(worksheet, 6, row + 1000, get_valid_school_categories())
+    add_list_validation(worksheet, 7, row + 1000, get_valid_school_types())
+    add_list_validation(worksheet, 8, row + 1000, get_valid_school_mediums())
+
+    worksheet.set_column('A:A', length_school_key)
+    worksheet.set_column('B:B',
+                         length_school_name if length_school_name < max_length_school_name else max_length_school_name,
+                         unlocked)
+    worksheet.set_column('C:C',
+                         length_school_address if length_school_address < max_length_school_address else max_length_school_address,
+                         unlocked)
+    worksheet.set_column('D:D',
+                         length_school_pin_code if length_school_pin_code < max_length_school_pin_code else max_length_school_pin_code,
+                         unlocked)
+    worksheet.set_column('E:E',
+                         length_school_ward_number if length_school_ward_number < max_length_school_ward_number else max_length_school_ward_number,
+                         unlocked)
+    worksheet.set_column('F:F',
+                         length_school_school_number if length_school_school_number < max_length_school_school_number else max_length_school_school_number,
+                         unlocked)
+    worksheet.set_column('G:G',
+                         length_school_school_category if length_school_school_category < max_length_school_school_category else max_length_school_school_category,
+                         unlocked)
+    worksheet.set_column('H:H',
+                         length_school_school_type if length_school_school_type < max_length_school_school_type else max_length_school_school_type,
+                         unlocked)
+    worksheet.set_column('I:I',
+                         length_school_medium if length_school_medium < max_length_school_medium else max_length_school_medium,
+                         unlocked)
+    worksheet.set_column('J:J',
+                         length_school_organization_name if length_school_organization_name < max_length_school_organization_name else max_length_school_organization_name,
+                         unlocked)
+    worksheet.set_column('K:K',
+                         length_school_year_of_intervention if length_school_year_of_intervention < max_length_school_year_of_intervention else max_length_school_year_of_intervention,
+                         unlocked)
+    workbook.close()
+
+
+def process_student_worksheet(students, workbook, worksheet, header):
+    locked = workbook.add_format()
+    locked.set_locked(True)
+    unlocked = workbook.add_format()
+    unlocked.set_locked(False)
+    unlocked_dob = workbook.add_format()
+    unlocked_dob.set_locked(False)
+    unlocked_dob.set_num_format("yyyy-mm-dd")
+    # Enable worksheet protection
+    worksheet.protect(options=PROTECTION_OPTIONS)
+
+    start_row = start_column = 0
+    row, column = start_row, start_column
+
+    length_student_key = 6
+    length_student_first_name = 12
+    length_student_middle_name = 14
+    length_student_last_name = 12
+    length_student_address = 10
+    length_student_gender = 8
+    length_student_mother_tongue = 14
+    length_student_birth_date = 10
+    length_student_has_attended_preschool = 20
+    max_length_student_first_name = 20
+    max_length_student_middle_name = 20
+    max_length_student_last_name = 20
+    max_length_student_address = 20
+    max_length_student_gender = length_student_gender
+    max_length_student_mother_tongue = 20
+    max_length_student_birth_date = length_student_birth_date
+    max_length_student_has_attended_preschool = length_student_has_attended_preschool
+
+    for field in STUDENTS_EXCEL_FIELDS:
+        worksheet.write(row, column, field, header)
+        column += 1
+
+    row += 1
+
+    for student in students:
+        column = 0
+        worksheet.write(row, column, student.key, locked)
+        column += 1
+        worksheet.write(row, column, student.first_name, unlocked)
+        column += 1
+        worksheet.write(row, column, student.middle_name, unlocked)
+        column += 1
+        worksheet.write(row, column, student.last_name, unlocked)
+        column += 1
+        worksheet.write(row, column, student.address, unlocked)
+        column += 1
+        if student.gender == FEMALE:
+            gender = "Female"
+        elif student.gender == MALE:
+            gender = "Male"
+        else:
+            gender = "Unknown"
+        worksheet.write(row, column, gender, unlocked)
+        column += 1
+        worksheet.write(row, column, student.mother_tongue, unlocked)
+        column += 1
+        birth_date = ""
+        if student.birth_date:
+            birth_date = student.birth_date
+        worksheet.write_datetime(row, column, birth_date, unlocked_dob)
+        column += 1
+        has_attended_preschool = "No"
+        if student.has_attended_preschool:
+            has_attended_preschool = "Yes"
+        worksheet.write(row, column, has_attended_preschool, unlocked)
+        column += 1
+
+        if student.first_name and len(student.first_name) > length_student_first_name:
+            length_student_first_name = len(student.first_name)
+        if student.middle_name and len(student.middle_name) > length_student_middle_name:
+            length_student_middle_name = len(student.middle_name)
+        if student.last_name and len(student.last_name) > length_student_last_name:
+            length_student_last_name = len(student.last_name)
+        if student.address and len(student.address) > length_student_address:
+            length_student_address = len(student.address)
+        if student.gender and len(student.gender) > length_student_gender:
+            length_student_gender = len(student.gender)
+        if student.mother_tongue and len(student.mother_tongue) > length_student_mother_tongue:
+            length_student_mother_tongue = len(student.mother_tongue)
+
+        row += 1
+
+    add_list_validation(worksheet, 5, row + 100, ["Female", "Male"])
+    add_list_validation(worksheet, 8, row + 100, ["Yes", "No"])
+
+    worksheet.set_column('A:A', length_student_key)
+    worksheet.set_column('B:B',
+                         length_student_first_name if length_student_first_name < max_length_student_first_name else max_length_student_first_name,
+                         unlocked)
+    worksheet.set_column('C:C',
+                         length_student_middle_name if length_student_middle_name < max_length_student_middle_name else max_length_student_middle_name,
+                         unlocked)
+    worksheet.set_column('D:D',
+                         length_student_last_name if length_student_last_name < max_length_student_last_name else max_length_student_last_name,
+                         unlocked)
+    worksheet.set_column('E:E',
+                         length_student_address if length_student_address < max_length_student_address else max_length_student_address,
+                         unlocked)
+    worksheet.set_column('F:F',
+                         length_student_gender if length_student_gender < max_length_student_gender else max_length_student_gender,
+                         unlocked)
+    worksheet.set_column('G:G',
+                         length_student_mother_tongue if length_student_mother_tongue < max_length_student_mother_tongue else max_length_student_mother_tongue,
+                         unlocked)
+    worksheet.set_column('H:H',
+                         length_student_birth_date if length_student_birth_date < max_length_student_birth_date else max_length_student_birth_date,
+                         unlocked_dob)
+    worksheet.set_column('I:I',
+                         length_student_has_attended_preschool if length_student_has_attended_preschool < max_length_student_has_attended_preschool else max_length_student_has_attended_preschool,
+                         unlocked)
+    workbook.close()
+
+
+def write_to_excel(export_type, data, output):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header = workbook.add_format({
+        'bg_color': '#F7F7F7',
+        'color': 'black',
+        'align': 'center',
+        'valign': 'top',
+        'border': 1
+    })
+    if export_type == FileType.USER:
+        worksheet = workbook.add_worksheet(USER_WORKSHEET_NAME)
+        process_user_worksheet(data, workbook, worksheet, header)
+    elif export_type == FileType.BOOK:
+        worksheet = workbook.add_worksheet(BOOK_WORKSHEET_NAME)
+        process_book_worksheet(data, workbook, worksheet, header)
+    elif export_type == FileType.STUDENT:
+        worksheet = workbook.add_worksheet(STUDENT_WORKSHEET_NAME)
+        process_student_worksheet(data, workbook, worksheet, header)
+    elif export_type == FileType.INVENTORY:
+        worksheet = workbook.add_worksheet(INVENTORY_BOOK_WORKSHEET_NAME)
+        process_inventory_book_worksheet(data, workbook, worksheet, header)
+    elif export_type == FileType.SCHOOL:
+        worksheet = workbook.add_worksheet(SCHOOL_WORKSHEET_NAME)
+        process_school_worksheet(data, workbook, worksheet, header)
+
+
+def add_list_validation(worksheet, column, last_row, values):
+    # Empty rows below the data are editable through the column format, the list only guides what is typed in them
+    worksheet.data_validation(1, column, last_row, column, {'validate': 'list', 'source': values})
+
+
+def read_base64_chunks(output, chunk_size=EXPORT_CHUNK_SIZE):
+    # Chunks of a multiple of 3 bytes encode to the same text as the whole file at once
+    with output:
+        for chunk in iter(lambda: output.read(chunk_size), b''):
+            yield base64.b64encode(chunk)
+
+
+def create_excel_response(request, export_type, data, file_name):
+    # The workbook is written to a temporary file and streamed from there instead of being held in memory
+    output = tempfile.TemporaryFile()
+    write_to_excel(export_type, data, output)
+    output.seek(0)
+    if request.GET.get('mode') == EXPORT_MODE_STREAM:
+        response = FileResponse(output, content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(read_base64_chunks(output), content_type='application/vnd.ms-excel')
+    response['Content-Disposition'] = 'attachment; filename=' + file_name
+    return response
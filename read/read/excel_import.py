@@ -0,0 +1,75 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+IMPORT_CHUNK_SIZE = 500
+
+_import_progress = threading.local()
+
+
+class ImportProgress(object):
+    def __init__(self):
+        self.rows = 0
+
+
+@contextmanager
+def track_import_progress(progress):
+    # Rows read by imports running in this thread are counted on progress, which other threads can report
+    _import_progress.current = progress
+    try:
+        yield progress
+    finally:
+        _import_progress.current = None
+
+
+def _count_import_rows(rows, progress):
+    for row in rows:
+        progress.rows += 1
+        yield row
+
+
+def load_import_workbook(uploaded_file):
+    # openpyxl is imported here so that workers only load it once an import comes in
+    from openpyxl import load_workbook
+
+    # Read only workbooks parse rows lazily from the uploaded file instead of loading every cell
+    return load_workbook(filename=uploaded_file, read_only=True)
+
+
+def read_import_rows(worksheet):
+    from openpyxl.cell.read_only import EMPTY_CELL
+
+    # The dimension stored in the file is not always right, so rows are padded to the header instead
+    worksheet.reset_dimensions()
+    rows = worksheet.iter_rows()
+    header_row = next(rows, None)
+    if header_row is None:
+        return None, iter(())
+
+    width = len(header_row)
+    progress = getattr(_import_progress, 'current', None)
+    if progress is not None:
+        rows = _count_import_rows(rows, progress)
+    return header_row, ((index, row + (EMPTY_CELL,) * (width - len(row))) for index, row in enumerate(rows, 1))
+
+
+def chunk_import_rows(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
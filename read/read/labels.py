@@ -0,0 +1,186 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from functools import lru_cache
+from itertools import groupby
+
+from read.constants import DESIRED_QR_WIDTH_AND_HEIGHT
+
+LABELS_PER_PAGE = 63
+LABEL_PROCESSES = min(os.cpu_count() or 1, 4)
+QR_CODE_CACHE_SIZE = 20000
+LABEL_FONT = 'gargi-updated'
+LABEL_FONT_PATH = 'utils/gargi-updated.ttf'
+
+_qr_glyphs = OrderedDict()
+_qr_glyphs_lock = threading.Lock()
+_label_pool = None
+_label_pool_lock = threading.Lock()
+
+
+# reportlab is imported and the font parsed only once labels are actually drawn
+@lru_cache(maxsize=None)
+def register_label_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(TTFont(LABEL_FONT, LABEL_FONT_PATH))
+
+
+def write_to_pdf(my_canvas, qr_glyph, qr_label, i):
+    i = i % 63
+    columns = 7
+    x_offset = 10
+    y_offset = 30
+    height = 85
+    qr_x = ((i % columns) * height) + x_offset
+    qr_label_x = ((i % columns) * height) + x_offset
+    qr_y = ((int(i / columns)) * height) + y_offset
+    qr_label_y = ((int(i / columns)) * height) + DESIRED_QR_WIDTH_AND_HEIGHT + y_offset
+    draw_qr_code(my_canvas, qr_glyph, qr_x, qr_y)
+    my_canvas.setFont(LABEL_FONT, 6)
+
+    label_first_line_length = 20
+    label_second_line_length = 40
+    label_third_line_length = 60
+    # Logic for printing label
+    qr_label_length = len(qr_label)
+    if qr_label_length <= label_first_line_length:
+        my_canvas.drawString(qr_label_x, qr_label_y, qr_label[:qr_label_length])
+    elif qr_label_length <= label_second_line_length:
+        my_canvas.drawString(qr_label_x, qr_label_y, qr_label[:label_first_line_length])
+        my_canvas.drawString(qr_label_x, qr_label_y + 10, qr_label[label_first_line_length:qr_label_length])
+    elif qr_label_length <= label_third_line_length:
+        my_canvas.drawString(qr_label_x, qr_label_y, qr_label[:label_first_line_length])
+        my_canvas.drawString(qr_label_x, qr_label_y + 10,
+                             qr_label[label_first_line_length:label_second_line_length])
+        my_canvas.drawString(qr_label_x, qr_label_y + 20, qr_label[label_second_line_length:qr_label_length])
+    else:
+        my_canvas.drawString(qr_label_x, qr_label_y, qr_label[:label_first_line_length])
+        my_canvas.drawString(qr_label_x, qr_label_y + 10,
+                             qr_label[label_first_line_length:label_second_line_length])
+        my_canvas.drawString(qr_label_x, qr_label_y + 20, qr_label[label_second_line_length:label_third_line_length])
+
+
+def encode_qr_code(qr_code):
+    # Dark runs of the module matrix as (row, column, length) byte triples after the module count, which keeps
+    # cached codes small and cheap to send between processes
+    from reportlab.graphics.barcode.qrencoder import QRCode, QRErrorCorrectLevel
+
+    code = QRCode(None, QRErrorCorrectLevel.H)
+    code.addData(qr_code)
+    code.make()
+    glyph = bytearray([code.getModuleCount()])
+    for row_index, row in enumerate(code.modules):
+        column = 0
+        for is_dark, modules in groupby(row):
+            length = len(list(modules))
+            if is_dark:
+                glyph += bytes((row_index, column, length))
+            column += length
+    return bytes(glyph)
+
+
+def draw_qr_code(my_canvas, qr_glyph, x, y):
+    # Same error correction, size and orientation the labels had when drawn from pyqrcode's SVG, which is 4 modules
+    # of quiet zone around the code scaled to DESIRED_QR_WIDTH_AND_HEIGHT with rows going up the page
+    quiet_zone = 4
+    size = qr_glyph[0] + 2 * quiet_zone
+    module = DESIRED_QR_WIDTH_AND_HEIGHT / size
+    path = my_canvas.beginPath()
+    for index in range(1, len(qr_glyph), 3):
+        row_index, column, length = qr_glyph[index:index + 3]
+        path.rect(x + (quiet_zone + column) * module, y + (size - quiet_zone - row_index - 1) * module,
+                  length * module, module)
+    my_canvas.drawPath(path, stroke=0, fill=1)
+
+
+def encode_qr_codes(qr_codes):
+    return [encode_qr_code(qr_code) for qr_code in qr_codes]
+
+
+def get_label_pool():
+    # One pool per process, so sheets drawn at the same time queue for its workers instead of forking more
+    global _label_pool
+    with _label_pool_lock:
+        if _label_pool is None:
+            _label_pool = ProcessPoolExecutor(LABEL_PROCESSES)
+        return _label_pool
+
+
+def reset_label_pool(pool):
+    global _label_pool
+    with _label_pool_lock:
+        if _label_pool is pool:
+            _label_pool = None
+    pool.shutdown(wait=False)
+
+
+def get_qr_glyphs(qr_codes):
+    glyphs = {}
+    missing = []
+    with _qr_glyphs_lock:
+        for qr_code in qr_codes:
+            if qr_code in glyphs:
+                continue
+            if qr_code in _qr_glyphs:
+                _qr_glyphs.move_to_end(qr_code)
+                glyphs[qr_code] = _qr_glyphs[qr_code]
+            else:
+                glyphs[qr_code] = None
+                missing.append(qr_code)
+
+    # Encoding is what costs, a page of codes per task keeps the pool busy without pickling every code on its own
+    pages = [missing[start:start + LABELS_PER_PAGE] for start in range(0, len(missing), LABELS_PER_PAGE)]
+    encoded_pages = None
+    if len(pages) > 1 and LABEL_PROCESSES > 1:
+        pool = get_label_pool()
+        try:
+            encoded_pages = list(pool.map(encode_qr_codes, pages))
+        except BrokenProcessPool:
+            # A worker died, the next sheet starts a new pool and this one is encoded here
+            reset_label_pool(pool)
+    if encoded_pages is None:
+        encoded_pages = [encode_qr_codes(page) for page in pages]
+
+    with _qr_glyphs_lock:
+        for page, encoded_page in zip(pages, encoded_pages):
+            for qr_code, glyph in zip(page, encoded_page):
+                glyphs[qr_code] = _qr_glyphs[qr_code] = glyph
+        while len(_qr_glyphs) > QR_CODE_CACHE_SIZE:
+            _qr_glyphs.popitem(last=False)
+    return glyphs
+
+
+def write_label_sheet(output, title, labels):
+    from reportlab.pdfgen import canvas
+
+    glyphs = get_qr_glyphs([qr_code for qr_code, qr_label in labels])
+    register_label_font()
+    my_canvas = canvas.Canvas(output, bottomup=0)
+    my_canvas.setTitle(title)
+    my_canvas.setFontSize(6)
+    for count, (qr_code, qr_label) in enumerate(labels):
+        if count and count % LABELS_PER_PAGE == 0:
+            my_canvas.showPage()
+            my_canvas.setFontSize(6)
+        write_to_pdf(my_canvas, glyphs[qr_code], qr_label, count)
+    my_canvas.save()
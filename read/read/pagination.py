@@ -0,0 +1,165 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import base64
+import json
+import operator
+from collections import OrderedDict
+from datetime import date, datetime, time
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import F, Min, Q
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from read.constants import PAGINATION_CURSOR, COUNT_APPROXIMATE
+
+CURSOR_QUERY_PARAM = 'cursor'
+
+
+def get_paginator(request):
+    if request.query_params.get('pagination') == PAGINATION_CURSOR:
+        return KeysetPagination()
+    return pagination.PageNumberPagination()
+
+
+def is_multi_valued(model, path):
+    for name in path.split(LOOKUP_SEP):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        if field.many_to_many or field.one_to_many:
+            return True
+        if not field.is_relation:
+            return False
+        model = field.related_model
+    return False
+
+
+def approximate_count(queryset):
+    db_connection = connections[queryset.db]
+    if db_connection.vendor != 'postgresql':
+        return queryset.count()
+
+    with db_connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+        else:
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        row = cursor.fetchone()
+
+    if row is None:
+        return queryset.count()
+    if isinstance(row[0], (int, float)):
+        estimate = row[0]
+    else:
+        plan = json.loads(row[0]) if isinstance(row[0], str) else row[0]
+        estimate = plan[0]['Plan']['Plan Rows']
+    # Tables that were never analyzed report -1
+    return int(estimate) if estimate >= 0 else queryset.count()
+
+
+def encode_value(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(object):
+    # Pages by the values of the last row instead of an offset, so deep pages cost the same as the first and
+    # nothing is counted. pk breaks ties, many-valued relations sort on their smallest value and NULLs come last.
+    page_size = api_settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = [field for field in queryset.query.order_by or queryset.model._meta.ordering if field]
+        if not any(field.lstrip('-') in ('pk', queryset.model._meta.pk.name) for field in ordering):
+            ordering.append('pk')
+
+        self.count = approximate_count(queryset) \
+            if request.query_params.get('count') == COUNT_APPROXIMATE else None
+
+        self.aliases = []
+        annotations = {}
+        order_by = []
+        descending = []
+        for index, field in enumerate(ordering):
+            path = field.lstrip('-')
+            alias = 'cursor_%d' % index
+            annotations[alias] = Min(path) if is_multi_valued(queryset.model, path) else F(path)
+            is_descending = field.startswith('-')
+            order_by.append(F(alias).desc(nulls_last=True) if is_descending else F(alias).asc(nulls_last=True))
+            self.aliases.append(alias)
+            descending.append(is_descending)
+        queryset = queryset.annotate(**annotations).order_by(*order_by)
+
+        cursor = request.query_params.get(CURSOR_QUERY_PARAM)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor), descending))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def after(self, values, descending):
+        # Rows sorting after the cursor: equal on the leading fields and past it on the next one
+        conditions = []
+        equal = Q()
+        for alias, value, is_descending in zip(self.aliases, values, descending):
+            if value is None:
+                equal &= Q(**{alias + '__isnull': True})
+                continue
+            lookup = '__lt' if is_descending else '__gt'
+            conditions.append(equal & (Q(**{alias + lookup: value}) | Q(**{alias + '__isnull': True})))
+            equal &= Q(**{alias: value})
+        if not conditions:
+            # Only a cursor naming no row at all (pk included) leaves nothing to compare against
+            raise NotFound("Invalid cursor")
+        return reduce(operator.or_, conditions)
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.aliases):
+            raise NotFound("Invalid cursor")
+        return values
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, alias) for alias in self.aliases]
+        return base64.urlsafe_b64encode(json.dumps(values, default=encode_value).encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, CURSOR_QUERY_PARAM, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([('next', self.get_next_link()), ('results', data)])
+        if self.count is not None:
+            response['count'] = self.count
+            response.move_to_end('count', last=False)
+        return Response(response)
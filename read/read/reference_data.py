@@ -0,0 +1,148 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+
+# Rows changed by another process are picked up within this many seconds, or at once when a lookup misses
+REFERENCE_DATA_TTL = 10
+
+_reference_data = {}
+_uncommitted = threading.local()
+
+
+def _uncommitted_models():
+    # Models this thread wrote to in a transaction that has not been seen to end
+    if not hasattr(_uncommitted, 'models'):
+        _uncommitted.models = set()
+    return _uncommitted.models
+
+
+class ReferenceRows(object):
+    # The rows of a lookup table as loaded at one point, indexed by id and name or key. The rows are shared between
+    # requests, so they must not be modified.
+    def __init__(self, reference_data, objects, loaded_at):
+        self.reference_data = reference_data
+        self.model = reference_data.model
+        self.objects = objects
+        self.objects_by_field = {field: {getattr(instance, field): instance for instance in objects}
+                                 for field in reference_data.fields}
+        self.loaded_at = loaded_at
+
+    def all(self):
+        return list(self.objects)
+
+    def filter(self, **kwargs):
+        return [instance for instance in self.objects
+                if all(getattr(instance, field) == value for field, value in kwargs.items())]
+
+    def find(self, field_name, value):
+        instance = self.objects_by_field[field_name].get(value)
+        if instance is None:
+            # The row may have been added by another process since these rows were loaded
+            rows = self.reload()
+            instance = rows.objects_by_field[field_name].get(value)
+        return instance
+
+    def reload(self):
+        # Rows loaded after these, for a lookup these rows could not answer
+        return self.reference_data.reload(self)
+
+    def get(self, **kwargs):
+        # Also stands in for the queryset of a SlugRelatedField, so values are converted like the ORM would
+        (field_name, value), = kwargs.items()
+        try:
+            value = self.model._meta.get_field(field_name).to_python(value)
+            instance = self.find(field_name, value)
+        except (TypeError, ValidationError):
+            instance = None
+        if instance is None:
+            raise self.model.DoesNotExist("%s matching query does not exist." % self.model._meta.object_name)
+        return instance
+
+    def get_by_display_name(self, display_name):
+        if not display_name:
+            return None
+        name = self.reference_data.names_by_display_name.get(display_name.lower())
+        return self.find('name', name) if name else None
+
+
+class ReferenceData(object):
+    # A lookup table held in process, reloaded when it is saved here, when it is older than REFERENCE_DATA_TTL and
+    # when a lookup misses
+    def __init__(self, model, fields, choices=()):
+        self.model = model
+        self.fields = ('id',) + tuple(fields)
+        self.names_by_display_name = {display_name.lower(): name for name, display_name in choices}
+        self.rows = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        rows = self.rows
+        if rows is None or time.monotonic() - rows.loaded_at > REFERENCE_DATA_TTL or not self.can_cache():
+            rows = self.reload(rows)
+        return rows
+
+    def can_cache(self):
+        # Rows read inside a transaction that wrote to the table may be rolled back, so they are only used once
+        uncommitted_models = _uncommitted_models()
+        if self.model not in uncommitted_models:
+            return True
+        if connection.in_atomic_block:
+            return False
+        uncommitted_models.discard(self.model)
+        return True
+
+    def reload(self, stale_rows):
+        with self.lock:
+            if self.rows is not stale_rows and self.rows is not None and self.can_cache():
+                return self.rows
+            rows = ReferenceRows(self, tuple(self.model.objects.all()), time.monotonic())
+            if self.can_cache():
+                self.rows = rows
+            return rows
+
+    def invalidate(self):
+        self.rows = None
+
+
+def get_reference_data(model):
+    return _reference_data[model].load()
+
+
+def invalidate_reference_data(model):
+    _reference_data[model].invalidate()
+
+
+def reference_data_changed(sender, **kwargs):
+    reference_data = _reference_data[sender]
+    reference_data.invalidate()
+    if connection.in_atomic_block:
+        _uncommitted_models().add(sender)
+
+        # Other threads may have loaded the rows as they were before the commit
+        def committed():
+            _uncommitted_models().discard(sender)
+            reference_data.invalidate()
+        transaction.on_commit(committed)
+
+
+def register_reference_data(model, fields, choices=()):
+    _reference_data[model] = ReferenceData(model, fields, choices)
+    post_save.connect(reference_data_changed, sender=model)
+    post_delete.connect(reference_data_changed, sender=model)
@@ -0,0 +1,134 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, transaction, DatabaseError
+from django.db.migrations.operations.base import Operation
+from django.db.models import Q, Case, When, Value, FloatField
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RANK = 'search_rank'
+
+_trigram_available = {}
+
+
+def is_trigram_available(db_connection=connection):
+    if db_connection.vendor != 'postgresql':
+        return False
+    if db_connection.alias not in _trigram_available:
+        with db_connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[db_connection.alias] = cursor.fetchone() is not None
+    return _trigram_available[db_connection.alias]
+
+
+def search_rank(fields, term):
+    if is_trigram_available():
+        similarities = [TrigramSimilarity(field, term) for field in fields]
+        return similarities[0] if len(similarities) == 1 else Greatest(*similarities)
+
+    # Without pg_trgm, exact matches rank above prefix matches, which rank above the rest
+    exact = Q()
+    prefix = Q()
+    for field in fields:
+        exact |= Q(**{field + '__iexact': term})
+        prefix |= Q(**{field + '__istartswith': term})
+    return Case(When(exact, then=Value(1.0)), When(prefix, then=Value(0.5)), default=Value(0.1),
+                output_field=FloatField())
+
+
+def search(queryset, fields, term, prefix=False):
+    if not term:
+        return queryset.annotate(**{SEARCH_RANK: Value(0.0, output_field=FloatField())})
+
+    # UPPER(field) LIKE is what icontains/istartswith compile to, and what the trigram indexes cover
+    lookup = '__istartswith' if prefix else '__icontains'
+    match = Q()
+    for field in fields:
+        match |= Q(**{field + lookup: term})
+    return queryset.filter(match).annotate(**{SEARCH_RANK: search_rank(fields, term)})
+
+
+def search_order_by(sort):
+    if sort:
+        return [sort, '-' + SEARCH_RANK, 'pk']
+    return ['-' + SEARCH_RANK, 'pk']
+
+
+class CreateTrigramIndexes(Operation):
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        db_connection = schema_editor.connection
+        if db_connection.vendor != 'postgresql':
+            return
+
+        if not self.create_extension(schema_editor):
+            logger.warning("pg_trgm is not available, skipping trigram indexes on %s", self.table)
+            return
+
+        for column in self.columns:
+            schema_editor.execute("CREATE INDEX IF NOT EXISTS %s ON %s USING gin (UPPER(%s) gin_trgm_ops)" % (
+                schema_editor.quote_name(self.index_name(column)), schema_editor.quote_name(self.table),
+                schema_editor.quote_name(column)))
+
+    def get_extension(self, db_connection):
+        # Whether pg_trgm can be installed, and whether it already is
+        with db_connection.cursor() as cursor:
+            cursor.execute("SELECT installed_version FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            row = cursor.fetchone()
+        return row is not None, row is not None and row[0] is not None
+
+    def create_extension(self, schema_editor):
+        db_connection = schema_editor.connection
+        available, installed = self.get_extension(db_connection)
+        if installed or not available:
+            return installed
+
+        # Creating an extension usually needs a superuser, and a failed statement would abort the migration
+        try:
+            with transaction.atomic(using=db_connection.alias):
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError:
+            return False
+        finally:
+            _trigram_available.pop(db_connection.alias, None)
+        return True
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for column in self.columns:
+            schema_editor.execute("DROP INDEX IF EXISTS %s" % schema_editor.quote_name(self.index_name(column)))
+
+    def index_name(self, column):
+        return '%s_%s_trgm' % (self.table, column)
+
+    def describe(self):
+        return "Create trigram indexes on %s (%s)" % (self.table, ", ".join(self.columns))
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'table': self.table, 'columns': self.columns}
@@ -58,6 +58,7 @@ INSTALLED_APPS = [
     'read_sessions',
     'students',
     'users',
+    'jobs',
 
 ]
 MIDDLEWARE = [
@@ -165,6 +166,7 @@ LOCALE_PATHS = ['locale']
 
 # STATIC_ROOT= os.path.join(BASE_DIR, "static")
 STATIC_URL = '/static/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
@@ -0,0 +1,78 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag, parse_etags
+from rest_framework.response import Response
+
+from read.utils import create_response_error
+
+SYNC_TIME_HEADER = 'X-Sync-Time'
+# Rows saved by transactions that commit up to this long after their timestamp still reach the next sync. The
+# changes of the last few minutes are sent again, which clients apply as updates.
+SYNC_MARGIN = timedelta(minutes=10)
+
+
+def parse_since(value):
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since, timezone.utc)
+    return since
+
+
+def get_list_etag(queryset):
+    state = queryset.order_by().aggregate(last_modified=Max('last_modification_time'),
+                                          count=Count('pk', distinct=True))
+    value = '%s:%s' % (state['last_modified'].isoformat() if state['last_modified'] else '', state['count'])
+    return quote_etag(hashlib.md5(value.encode()).hexdigest())
+
+
+def create_sync_response(request, scope, queryset, serializer_class, changed=None, sync_time=None):
+    # Rows in scope that changed but are no longer listed (deactivated, verified, ...) are sent as tombstones.
+    # changed(since) covers rows that enter or leave the list without being modified.
+    sync_time = sync_time or timezone.now()
+    since = request.GET.get('since')
+    if since is not None:
+        since = parse_since(since)
+        if since is None:
+            return Response(status=400, data=create_response_error("Invalid since timestamp"))
+
+    etag = get_list_etag(queryset)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = Response(status=304)
+    elif since is None:
+        response = Response(serializer_class(queryset, many=True).data)
+    else:
+        changed_since = Q(last_modification_time__gt=since)
+        if changed:
+            changed_since |= changed(since)
+        listed = queryset.order_by().values('pk')
+        removed = scope.filter(changed_since).exclude(pk__in=listed).order_by() \
+            .values_list('key', flat=True).distinct()
+        response = Response({
+            'results': serializer_class(queryset.filter(changed_since), many=True).data,
+            'removed': list(removed),
+        })
+    response['ETag'] = etag
+    response[SYNC_TIME_HEADER] = (sync_time - SYNC_MARGIN).isoformat()
+    return response
@@ -0,0 +1,97 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from functools import wraps
+
+from django.db.models import Count
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.utils import json
+
+from books.models import Book, Inventory
+from classrooms.models import Classroom
+from read.constants import ERROR_403_JSON, GroupType
+from read.utils import get_group_type_from_request_user
+from read_sessions.models import ReadSession
+from schools.models import School
+from students.models import Student
+from users.models import User
+
+# Path from each model to the NGO it belongs to
+NGO_LOOKUPS = {
+    Book: 'ngo',
+    Classroom: 'school__ngo',
+    Inventory: 'book__ngo',
+    ReadSession: 'readsessionclassroom__classroom__school__ngo',
+    School: 'ngo',
+    Student: 'classroomacademicyear__classroom__school__ngo',
+    User: 'ngo',
+}
+
+
+def keys_belong_to_ngo(model, keys, ngo):
+    keys = set(keys)
+    if not keys:
+        return True
+    # Students and sessions can match through several rows, so keys are counted once each
+    count = model.objects.filter(key__in=keys, **{NGO_LOOKUPS[model]: ngo}).aggregate(count=Count('key', distinct=True))
+    return count['count'] == len(keys)
+
+
+def request_user_belongs_to_keys_ngo(request, model, keys, allow_read_admin=False):
+    user = request.user
+    if not user or not user.is_authenticated:
+        return False
+    if user.ngo:
+        return keys_belong_to_ngo(model, keys, user.ngo)
+    if allow_read_admin:
+        return get_group_type_from_request_user(user) == GroupType.READ_ADMIN
+    return False
+
+
+def get_request_keys(request, keys_field):
+    keys = request.data.get(keys_field)
+    return json.loads(keys) if isinstance(keys, str) else keys or []
+
+
+class BelongsToNGO(permissions.BasePermission):
+    model = None
+    keys_field = 'keys'
+    allow_read_admin = False
+
+    @property
+    def message(self):
+        return ERROR_403_JSON()
+
+    def has_permission(self, request, view):
+        return request_user_belongs_to_keys_ngo(request, self.model, get_request_keys(request, self.keys_field),
+                                                self.allow_read_admin)
+
+
+def belongs_to_ngo(model, keys_field='keys', allow_read_admin=False):
+    return type(model.__name__ + 'BelongsToNGO', (BelongsToNGO,),
+                {'model': model, 'keys_field': keys_field, 'allow_read_admin': allow_read_admin})
+
+
+def keys_belong_to_request_user_ngo(model, keys_field='keys', allow_read_admin=False):
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            keys = get_request_keys(request, keys_field)
+            if not request_user_belongs_to_keys_ngo(request, model, keys, allow_read_admin):
+                return Response(status=403, data=ERROR_403_JSON())
+            return view_method(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,107 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import gzip
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from users.models import User
+
+TRANSLATION_LOCALES = [language for language, name in User.LANGUAGES]
+TRANSLATIONS_DIR = os.path.join(settings.BASE_DIR, 'static')
+# Written by the locale_json command: every locale in one file, and the hashes it was built from
+TRANSLATION_BUNDLE_PATH = os.path.join(TRANSLATIONS_DIR, 'locale_bundle.json')
+TRANSLATION_MANIFEST_PATH = os.path.join(TRANSLATIONS_DIR, 'locale_manifest.json')
+
+TranslationFile = namedtuple('TranslationFile', ['mtime', 'content', 'hash'])
+TranslationBundle = namedtuple('TranslationBundle', ['version', 'content', 'gzip_content', 'etag'])
+
+# Files are read once per process and again only when their mtime changes
+_translation_files = {}
+_translation_bundles = {}
+
+
+def get_translation_file_path(locale):
+    return os.path.join(TRANSLATIONS_DIR, 'locale_' + locale + '.json')
+
+
+def get_translation_hash(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+def join_translations(locales, contents):
+    # The files are already JSON objects, so they are spliced in rather than parsed and dumped again
+    return b'{' + b','.join(json.dumps(locale).encode() + b':' + content
+                           for locale, content in zip(locales, contents)) + b'}'
+
+
+def load_translation_file(path):
+    mtime = os.stat(path).st_mtime_ns
+    translation_file = _translation_files.get(path)
+    if translation_file is None or translation_file.mtime != mtime:
+        with open(path, 'rb') as data_file:
+            content = data_file.read()
+        json.loads(content.decode('utf-8'))
+        translation_file = TranslationFile(mtime, content, get_translation_hash(content))
+        _translation_files[path] = translation_file
+    return translation_file
+
+
+def get_translation_bundle(locales):
+    if locales == TRANSLATION_LOCALES and os.path.exists(TRANSLATION_BUNDLE_PATH):
+        paths = [TRANSLATION_BUNDLE_PATH]
+    else:
+        paths = [get_translation_file_path(locale) for locale in locales]
+    translation_files = [load_translation_file(path) for path in paths]
+    version = tuple(translation_file.mtime for translation_file in translation_files)
+    bundle = _translation_bundles.get(tuple(paths))
+    if bundle is None or bundle.version != version:
+        if paths == [TRANSLATION_BUNDLE_PATH]:
+            # Served as it is, and its hash is the version recorded in the manifest
+            content = translation_files[0].content
+            etag = translation_files[0].hash
+        else:
+            content = join_translations(locales, [translation_file.content for translation_file in translation_files])
+            etag = get_translation_hash(''.join(translation_file.hash for translation_file in translation_files)
+                                        .encode())
+        bundle = TranslationBundle(version, content, gzip.compress(content), 'W/"%s"' % etag)
+        _translation_bundles[tuple(paths)] = bundle
+    return bundle
+
+
+def create_translations_response(request):
+    # Clients that send one of our locale codes get that language only, everyone else gets all of them
+    language = request.META.get('HTTP_ACCEPT_LANGUAGE')
+    locales = [language] if language in TRANSLATION_LOCALES else TRANSLATION_LOCALES
+    bundle = get_translation_bundle(locales)
+
+    if bundle.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(bundle.gzip_content, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(bundle.content, content_type='application/json')
+    response['ETag'] = bundle.etag
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Accept-Language', 'Accept-Encoding'))
+    return response
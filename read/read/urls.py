@@ -36,6 +36,7 @@ from rest_framework.documentation import include_docs_urls
 from academic_years import views as academic_year_views
 from books import views as book_views
 from classrooms import views as classroom_views
+from jobs import views as job_views
 from ngos import views as ngo_views
 from read.schemas import CoreAPISchemaGenerator
 from read_sessions import views as read_session_views
@@ -57,6 +58,7 @@ router.register(r'students', student_views.StudentViewSet, base_name='students')
 router.register(r'users', user_views.UserViewSet, base_name='users')
 router.register(r'standards', school_views.StandardViewSet, base_name='standards')
 router.register(r'academic_years', academic_year_views.AcademicYearViewSet, base_name="academic_years")
+router.register(r'jobs', job_views.JobViewSet, base_name='jobs')
 
 urlpatterns = [
     url(r'^', include(router.urls)),
@@ -0,0 +1,47 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Generated by Django 2.1.5 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('read_sessions', '0007_auto_20191204_1723'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='readsession',
+            index=models.Index(fields=['start_date_time'], name='read_sessions_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readsessionbookfairy',
+            index=models.Index(fields=['read_session', 'book_fairy'], name='rs_book_fairies_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readsessionbookfairy',
+            index=models.Index(fields=['book_fairy', 'read_session'], name='rs_book_fairies_fairy_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readsessionclassroom',
+            index=models.Index(fields=['read_session', 'classroom'], name='rs_classrooms_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readsessionclassroom',
+            index=models.Index(fields=['classroom', 'read_session'], name='rs_classrooms_classroom_idx'),
+        ),
+    ]
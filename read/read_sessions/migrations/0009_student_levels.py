@@ -0,0 +1,45 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Generated by Django 2.1.5 on 2026-10-18 13:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0002_auto_20190515_1132'),
+        ('students', '0003_student_name_trigram_indexes'),
+        ('read_sessions', '0008_session_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentLevel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date_time', models.DateTimeField()),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ngos.Level')),
+                ('read_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='read_sessions.ReadSession')),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='current_level', to='students.Student')),
+            ],
+            options={
+                'db_table': 'student_levels',
+            },
+        ),
+    ]
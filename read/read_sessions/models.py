@@ -49,6 +49,9 @@ class ReadSession(models.Model):
 
     class Meta:
         db_table = 'read_sessions'
+        indexes = [
+            models.Index(fields=['start_date_time'], name='read_sessions_start_idx'),
+        ]
 
 
 class ReadSessionBookFairy(models.Model):
@@ -59,6 +62,10 @@ class ReadSessionBookFairy(models.Model):
 
     class Meta:
         db_table = 'read_session_book_fairies'
+        indexes = [
+            models.Index(fields=['read_session', 'book_fairy'], name='rs_book_fairies_session_idx'),
+            models.Index(fields=['book_fairy', 'read_session'], name='rs_book_fairies_fairy_idx'),
+        ]
 
 
 class ReadSessionClassroom(models.Model):
@@ -69,6 +76,10 @@ class ReadSessionClassroom(models.Model):
 
     class Meta:
         db_table = 'read_session_classrooms'
+        indexes = [
+            models.Index(fields=['read_session', 'classroom'], name='rs_classrooms_session_idx'),
+            models.Index(fields=['classroom', 'read_session'], name='rs_classrooms_classroom_idx'),
+        ]
 
 
 class StudentFeedback(models.Model):
@@ -127,3 +138,16 @@ class StudentEvaluations(models.Model):
 
     class Meta:
         db_table = 'student_evaluations'
+
+
+class StudentLevel(models.Model):
+    student = models.OneToOneField('students.Student', null=False, blank=False, on_delete=models.CASCADE,
+                                   related_name='current_level')
+    read_session = models.ForeignKey('read_sessions.ReadSession', null=False, blank=False, on_delete=models.CASCADE)
+    level = models.ForeignKey('ngos.Level', null=True, blank=True, on_delete=models.SET_NULL)
+    start_date_time = models.DateTimeField(null=False, blank=False)
+    creation_time = models.DateTimeField(auto_now=False, auto_now_add=True)
+    last_modification_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'student_levels'
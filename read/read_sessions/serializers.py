@@ -12,15 +12,14 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from rest_framework.fields import SerializerMethodField
+from rest_framework.fields import SerializerMethodField, DateTimeField
 from rest_framework.relations import SlugRelatedField
-from rest_framework.serializers import ModelSerializer
-from django.db.models import Q
+from rest_framework.serializers import ModelSerializer, Serializer, ValidationError
+from django.db.models import Prefetch
 from academic_years.models import AcademicYear
 from books.models import Book, Inventory
 from classrooms.models import Classroom
 from ngos.models import Level
-from read.constants import REGULAR, EVALUATION, SESSION_ATTENDED, SESSION_NOT_ATTENDED
 from read_sessions.models import ReadSession, ReadSessionBookFairy, ReadSessionClassroom, StudentFeedback, \
     ReadSessionFeedbackBook, StudentEvaluations, ReadSessionHomeLendingBook
 from students.models import Student
@@ -49,6 +48,58 @@ class ReadSessionSerializer(ModelSerializer):
             return expanded_fields
 
 
+class ReadSessionCompactSerializer(ModelSerializer):
+    academic_year = SlugRelatedField(slug_field='key', read_only=True)
+    academic_year_name = SerializerMethodField(read_only=True)
+    submitted_by_book_fairy = SlugRelatedField(slug_field='key', read_only=True)
+    verified_by_supervisor = SlugRelatedField(slug_field='key', read_only=True)
+    classrooms = SerializerMethodField(read_only=True)
+    book_fairies = SerializerMethodField(read_only=True)
+
+    # Loads everything the serializer touches in a fixed number of queries, whatever the page size
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('academic_year', 'submitted_by_book_fairy', 'verified_by_supervisor') \
+            .prefetch_related(
+            Prefetch('readsessionclassroom_set',
+                     queryset=ReadSessionClassroom.objects.select_related('classroom__school', 'classroom__standard')),
+            Prefetch('readsessionbookfairy_set',
+                     queryset=ReadSessionBookFairy.objects.select_related('book_fairy')))
+
+    def get_academic_year_name(self, obj):
+        return obj.academic_year.name
+
+    def get_classrooms(self, obj):
+        return [{"key": session_classroom.classroom.key,
+                 "division": session_classroom.classroom.division,
+                 "standard": session_classroom.classroom.standard.name,
+                 "school_key": session_classroom.classroom.school.key,
+                 "school_name": session_classroom.classroom.school.name}
+                for session_classroom in obj.readsessionclassroom_set.all()]
+
+    def get_book_fairies(self, obj):
+        return [{"key": session_book_fairy.book_fairy.key,
+                 "first_name": session_book_fairy.book_fairy.first_name,
+                 "last_name": session_book_fairy.book_fairy.last_name}
+                for session_book_fairy in obj.readsessionbookfairy_set.all()]
+
+    class Meta:
+        model = ReadSession
+        fields = ('key', 'academic_year', 'academic_year_name', 'start_date_time', 'end_date_time', 'start_time',
+                  'end_time', 'type', 'is_evaluated', 'is_verified', 'is_cancelled', 'notes',
+                  'submitted_by_book_fairy', 'verified_by_supervisor', 'classrooms', 'book_fairies')
+
+
+class ReadSessionDateSerializer(Serializer):
+    start_date_time = DateTimeField()
+    end_date_time = DateTimeField()
+
+    def validate(self, data):
+        if data['start_date_time'] >= data['end_date_time']:
+            raise ValidationError("End date time must be after start date time")
+        return data
+
+
 class ReadSessionBookFairySerializer(ModelSerializer):
     read_session_id = SlugRelatedField(source="read_session", slug_field="id", queryset=ReadSession.objects.all())
     user_id = SlugRelatedField(source="book_fairy", slug_field="id", queryset=User.objects.all())
@@ -66,7 +117,8 @@ class ReadSessionClassroomSerializer(ModelSerializer):
 
     def get_students(self, obj):
         query_set = Student.objects.filter(classroomacademicyear__classroom__readsessionclassroom__id=obj.id,
-                                           classroomacademicyear__academic_year__key=obj.read_session.academic_year.key)
+                                           classroomacademicyear__academic_year__key=obj.read_session.academic_year.key) \
+            .select_related('current_level__level')
         serializer = StudentLevelSerializer(query_set, many=True)
         return serializer.data
 
@@ -164,69 +216,3 @@ class StudentHomeLendingBookSerializer(ModelSerializer):
         model = ReadSessionHomeLendingBook
         depth = 2
         exclude = ('id', 'read_session', 'book', 'inventory')
-
-
-class ReadSessionBookFairyReportSerializer(ModelSerializer):
-    def __init__(self, *args, **kwargs):
-        self.attendance = kwargs.pop('attendance', None)
-        super(ReadSessionBookFairyReportSerializer, self).__init__(*args, **kwargs)
-
-    students = SerializerMethodField(read_only=True)
-
-    def get_students(self, obj):
-
-        if self.attendance == SESSION_ATTENDED:
-            queryset = Student.objects.filter(
-                Q(
-                    classroomacademicyear__classroom__readsessionclassroom__read_session__studentfeedback__attendance=True)
-                |
-                Q(
-                    classroomacademicyear__classroom__readsessionclassroom__read_session__studentevaluations__attendance=True),
-                classroomacademicyear__classroom__readsessionclassroom__read_session__key=obj.key)
-        elif self.attendance == SESSION_NOT_ATTENDED:
-            queryset = Student.objects.filter(
-                Q(
-                    classroomacademicyear__classroom__readsessionclassroom__read_session__studentfeedback__attendance=False)
-                |
-                Q(
-                    classroomacademicyear__classroom__readsessionclassroom__read_session__studentfeedback__attendance=False),
-                classroomacademicyear__classroom__readsessionclassroom__read_session__key=obj.key)
-        else:
-            queryset = Student.objects.filter(
-                classroomacademicyear__classroom__readsessionclassroom__read_session__key=obj.key)
-
-        student_response = []
-        for student in queryset:
-            if student.studentfeedback_set.filter(
-                    read_session=obj).first() is not None or student.studentevaluations_set.filter(read_session=obj).first() is not None:
-
-                books = ReadSessionFeedbackBook.objects.filter(student=student, read_session=obj)\
-                    .distinct('book__name').values_list('book__name', flat=True)
-
-                student_level = {"name": student.first_name + " " + student.last_name,
-                                 "datetime": obj.start_date_time.strftime(
-                                     "%a %d %b %H:%M") + " - " + obj.end_date_time.strftime("%H:%M"),
-                                 "books": books}
-
-                if obj.type == REGULAR:
-                    level = student.studentfeedback_set.filter(read_session=obj).first().level
-                    student_level["level"] = "NA" if level is None else student.studentfeedback_set.filter(
-                        read_session=obj).first().level.en_in
-                    student_level["comments"] = student.studentfeedback_set.filter(read_session=obj).first().comments
-                    student_level["attendance"] = student.studentfeedback_set.filter(
-                        read_session=obj).first().attendance
-
-                if obj.type == EVALUATION:
-                    level = student.studentfeedback_set.filter(read_session=obj).first().level
-                    student_level["level"] = "NA" if level is None else student.studentevaluations_set.filter(
-                        read_session=obj).first().level.en_in
-                    student_level["comments"] = student.studentevaluations_set.filter(read_session=obj).first().comments
-                    student_level["attendance"] = student.studentevaluations_set.filter(
-                        read_session=obj).first().attendance
-
-                student_response.append(student_level)
-        return student_response
-
-    class Meta:
-        model = ReadSession
-        fields = ('key', 'students', 'type')
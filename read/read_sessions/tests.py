@@ -12,6 +12,297 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from django.test import TestCase
+import json
+from datetime import datetime, timedelta, timezone
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from academic_years.models import AcademicYear
+from books.models import Book, BookLevel, Inventory
+from classrooms.models import Classroom, ClassroomAcademicYear
+from ngos.models import NGO, Level
+from read.constants import REGULAR, EVALUATION, READ_SESSION_VIEW_COMPACT, SESSION_ATTENDED, READ_SESSION_PENDING
+from read.reference_data import get_reference_data, invalidate_reference_data
+from read_sessions.models import ReadSession, ReadSessionClassroom, ReadSessionBookFairy, StudentFeedback, \
+    ReadSessionFeedbackBook, StudentEvaluations, StudentLevel
+from schools.models import School, SchoolCategory, SchoolType, SchoolMedium, Standard
+from students.models import Student
+from users.models import User
+
+
+class ReadSessionFixtures(object):
+
+    def setUp(self):
+        self.ngo = NGO.objects.create(name='NGO', address='Pune')
+        self.academic_year = AcademicYear.objects.create(name='AY 19-20')
+        self.school = School.objects.create(name='School', address='Pune', pin_code=411001, ngo=self.ngo,
+                                            school_category=SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED'),
+                                            school_type=SchoolType.objects.create(name='SCHOOL_TYPE_PMC'),
+                                            medium=SchoolMedium.objects.create(name='SCHOOL_MEDIUM_MARATHI'))
+        self.standard = Standard.objects.create(name='STANDARD_I')
+        self.admin = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                                   first_name='Admin', last_name='User', ngo=self.ngo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def create_sessions(self, count):
+        start = datetime.now(tz=timezone.utc)
+        offset = ReadSession.objects.count()
+        for index in range(offset, offset + count):
+            classroom = Classroom.objects.create(school=self.school, standard=self.standard, division=str(index))
+            book_fairy = User.objects.create(username='fairy%d' % index, first_name='Fairy', last_name=str(index),
+                                             ngo=self.ngo)
+            read_session = ReadSession.objects.create(academic_year=self.academic_year, type=REGULAR,
+                                                      start_date_time=start + timedelta(days=index),
+                                                      end_date_time=start + timedelta(days=index, hours=1),
+                                                      start_time=start.time(), end_time=start.time())
+            ReadSessionClassroom.objects.create(read_session=read_session, classroom=classroom)
+            ReadSessionBookFairy.objects.create(read_session=read_session, book_fairy=book_fairy)
+
+
+class ReadSessionViewTestCase(ReadSessionFixtures, TestCase):
+
+    def get_sessions_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/ngos/%s/sessions/' % self.ngo.key,
+                                       {'sort': 'dateTime', 'view': READ_SESSION_VIEW_COMPACT})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_compact_sessions_query_count_does_not_grow_with_page_size(self):
+        self.create_sessions(2)
+        small_page_queries, results = self.get_sessions_query_count()
+        self.assertEqual(len(results), 2)
+
+        self.create_sessions(8)
+        full_page_queries, results = self.get_sessions_query_count()
+        self.assertEqual(len(results), 10)
+        self.assertEqual(small_page_queries, full_page_queries)
+
+    def test_compact_sessions_are_flat(self):
+        self.create_sessions(1)
+        _, results = self.get_sessions_query_count()
+        session = results[0]
+        self.assertEqual(session['academic_year'], self.academic_year.key)
+        self.assertEqual(session['classrooms'][0]['school_key'], self.school.key)
+        self.assertEqual(session['classrooms'][0]['standard'], 'STANDARD_I')
+        self.assertEqual(session['book_fairies'][0]['first_name'], 'Fairy')
+
+    def test_search_combines_school_and_date_filters(self):
+        self.create_sessions(4)
+        other_school = School.objects.create(name='Other', address='Pune', pin_code=411001, ngo=self.ngo,
+                                             school_category=self.school.school_category,
+                                             school_type=self.school.school_type, medium=self.school.medium)
+        sessions = list(ReadSession.objects.order_by('start_date_time'))
+        ReadSessionClassroom.objects.filter(read_session=sessions[3]) \
+            .update(classroom=Classroom.objects.create(school=other_school, standard=self.standard))
+
+        search = {'school': self.school.key, 'start': sessions[1].start_date_time.isoformat(), 'sort': 'school',
+                  'view': READ_SESSION_VIEW_COMPACT}
+        response = self.client.post('/ngos/%s/search/' % self.ngo.key, {'model': 'session', 'search': json.dumps(search)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertTrue(all(session['classrooms'][0]['school_key'] == self.school.key
+                            for session in response.data['results']))
+
+    def add_sessions(self, classrooms, book_fairies, dates):
+        return self.client.post('/ngos/%s/add_session/' % self.ngo.key, {
+            'academic_year': self.academic_year.key,
+            'type': REGULAR,
+            'start_time': '10:00',
+            'end_time': '11:00',
+            'classrooms': json.dumps([classroom.key for classroom in classrooms]),
+            'fairies': json.dumps([book_fairy.key for book_fairy in book_fairies]),
+            'dates': json.dumps([{'start_date_time': start.isoformat(), 'end_date_time': end.isoformat()}
+                                 for start, end in dates]),
+        })
+
+    def test_add_session_creates_every_date(self):
+        classrooms = [Classroom.objects.create(school=self.school, standard=self.standard, division=division)
+                      for division in ('A', 'B')]
+        book_fairy = User.objects.create(username='fairy', first_name='Fairy', last_name='One', ngo=self.ngo)
+        start = datetime(2019, 7, 1, 10, tzinfo=timezone.utc)
+        dates = [(start + timedelta(days=day), start + timedelta(days=day, hours=1)) for day in range(5)]
+
+        response = self.add_sessions(classrooms, [book_fairy], dates)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ReadSession.objects.count(), 5)
+        self.assertEqual(ReadSessionClassroom.objects.count(), 10)
+        self.assertEqual(ReadSessionBookFairy.objects.filter(book_fairy=book_fairy).count(), 5)
+
+    def test_add_session_rejects_empty_dates(self):
+        classroom = Classroom.objects.create(school=self.school, standard=self.standard)
+        book_fairy = User.objects.create(username='fairy', first_name='Fairy', last_name='One', ngo=self.ngo)
+        response = self.add_sessions([classroom], [book_fairy], [])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ReadSession.objects.count(), 0)
+
+    def test_add_session_reports_all_conflicts(self):
+        classroom = Classroom.objects.create(school=self.school, standard=self.standard)
+        book_fairy = User.objects.create(username='fairy', first_name='Fairy', last_name='One', ngo=self.ngo)
+        start = datetime(2019, 7, 1, 10, tzinfo=timezone.utc)
+        self.assertEqual(self.add_sessions([classroom], [book_fairy],
+                                           [(start, start + timedelta(hours=1)),
+                                            (start + timedelta(days=1), start + timedelta(days=1, hours=1))])
+                         .status_code, 201)
+
+        response = self.add_sessions([classroom], [book_fairy], [
+            (start + timedelta(minutes=30), start + timedelta(hours=2)),
+            (start + timedelta(days=1), start + timedelta(days=1, hours=1)),
+            (start + timedelta(days=2), start + timedelta(days=2, hours=1)),
+            (start + timedelta(days=2, minutes=30), start + timedelta(days=2, hours=2)),
+            (start + timedelta(days=3, hours=1), start + timedelta(days=3, hours=2)),
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data['message']), 3)
+        self.assertEqual(ReadSession.objects.count(), 2)
+
+    def test_submit_evaluations_saves_in_batch_and_checks_completion(self):
+        self.create_sessions(1)
+        read_session = ReadSession.objects.get()
+        classroom = read_session.readsessionclassroom_set.get().classroom
+        students = [Student.objects.create(first_name='Student', last_name=str(index), address='Pune', gender='MALE',
+                                           mother_tongue='Marathi', birth_date='2012-01-01') for index in range(2)]
+        for student in students:
+            ClassroomAcademicYear.objects.create(academic_year=self.academic_year, classroom=classroom,
+                                                 student=student)
+        level = Level.objects.create(ngo=self.ngo, rank=1, mr_in='1', en_in='1', is_regular=True)
+        book = Book.objects.create(name='Book', ngo=self.ngo, level=BookLevel.objects.create(name='BOOK_LEVEL_1'))
+        inventory = Inventory.objects.create(book=book, serial_number=1)
+        present = {'student': students[0].key, 'level': level.key, 'attendance': True, 'comments': 'Good',
+                   'book': [{'book': book.key, 'inventory': inventory.key}]}
+        url = '/read_sessions/%s/submit_evaluations/' % read_session.key
+
+        response = self.client.post(url, {'body': [present]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ReadSession.objects.get().is_evaluated)
+
+        absent = {'student': students[1].key, 'attendance': False}
+        response = self.client.post(url, {'body': [present, absent]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(ReadSession.objects.get().is_evaluated)
+        self.assertEqual(StudentFeedback.objects.filter(read_session=read_session).count(), 2)
+        self.assertEqual(ReadSessionFeedbackBook.objects.filter(read_session=read_session).count(), 1)
+
+    def test_student_session_report_reads_evaluation_levels(self):
+        self.create_sessions(2)
+        regular_session, evaluation_session = ReadSession.objects.order_by('start_date_time')
+        ReadSession.objects.filter(pk=evaluation_session.pk).update(type=EVALUATION)
+        ReadSession.objects.update(is_evaluated=True)
+        book_fairy = User.objects.get(username='fairy0')
+        classroom = regular_session.readsessionclassroom_set.get().classroom
+        ReadSessionBookFairy.objects.create(read_session=evaluation_session, book_fairy=book_fairy)
+        ReadSessionClassroom.objects.create(read_session=evaluation_session, classroom=classroom)
+
+        student = Student.objects.create(first_name='Asha', last_name='Patil', address='Pune', gender='FEMALE',
+                                         mother_tongue='Marathi', birth_date='2012-01-01')
+        regular_level = Level.objects.create(ngo=self.ngo, rank=1, mr_in='1', en_in='Regular', is_regular=True)
+        evaluation_level = Level.objects.create(ngo=self.ngo, rank=2, mr_in='2', en_in='Evaluated',
+                                                is_evaluation=True)
+        StudentFeedback.objects.create(student=student, read_session=regular_session, level=regular_level,
+                                       attendance=True)
+        StudentEvaluations.objects.create(student=student, read_session=evaluation_session, level=evaluation_level,
+                                          attendance=True)
+        book = Book.objects.create(name='Book', ngo=self.ngo)
+        for serial_number in (1, 2):
+            ReadSessionFeedbackBook.objects.create(read_session=regular_session, student=student, book=book,
+                                                   inventory=Inventory.objects.create(book=book,
+                                                                                      serial_number=serial_number))
+
+        response = self.client.post('/ngos/%s/get_student_session_report/' % self.ngo.key, {
+            'book_fairy': book_fairy.key, 'academic_year': self.academic_year.key, 'school': self.school.key,
+            'classroom': classroom.key, 'attendance': SESSION_ATTENDED})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([session['type'] for session in response.data], [REGULAR, EVALUATION])
+        regular_row, = response.data[0]['students']
+        evaluation_row, = response.data[1]['students']
+        self.assertEqual(regular_row['name'], 'Asha Patil')
+        self.assertEqual(regular_row['level'], 'Regular')
+        self.assertEqual(list(regular_row['books']), ['Book'])
+        self.assertEqual(evaluation_row['level'], 'Evaluated')
+        self.assertEqual(list(evaluation_row['books']), [])
+
+    def test_evaluations_keep_latest_student_level(self):
+        self.create_sessions(2)
+        older_session, newer_session = ReadSession.objects.order_by('start_date_time')
+        classroom = older_session.readsessionclassroom_set.get().classroom
+        ReadSessionClassroom.objects.create(read_session=newer_session, classroom=classroom)
+        student = Student.objects.create(first_name='Asha', last_name='Patil', address='Pune', gender='FEMALE',
+                                         mother_tongue='Marathi', birth_date='2012-01-01')
+        ClassroomAcademicYear.objects.create(academic_year=self.academic_year, classroom=classroom, student=student)
+        older_level = Level.objects.create(ngo=self.ngo, rank=1, mr_in='1', en_in='Older', is_regular=True)
+        newer_level = Level.objects.create(ngo=self.ngo, rank=2, mr_in='2', en_in='Newer', is_regular=True)
+
+        for read_session, level in ((newer_session, newer_level), (older_session, older_level)):
+            response = self.client.post('/read_sessions/%s/evaluate_students/' % read_session.key, {'body': [
+                {'student': student.key, 'level': level.key, 'attendance': True}]}, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(StudentLevel.objects.get(student=student).level, newer_level)
+
+        response = self.client.get('/read_sessions/%s/session_classrooms/' % older_session.key,
+                                   {'ngo': self.ngo.key})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['level'] for row in response.data[0]['students']], ['Newer'])
+
+    def test_mobile_sessions_since_returns_tombstones(self):
+        self.create_sessions(2)
+        ReadSession.objects.update(last_modification_time=datetime.now(tz=timezone.utc) - timedelta(days=1))
+        session = ReadSession.objects.order_by('start_date_time').first()
+        self.client.force_authenticate(user=User.objects.get(username='fairy0'))
+        url = '/ngos/%s/mobile_book_fairy_sessions/' % self.ngo.key
+
+        response = self.client.get(url, {'type': READ_SESSION_PENDING})
+        self.assertEqual([row['key'] for row in response.data], [session.key])
+        response = self.client.get(url, {'type': READ_SESSION_PENDING}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        ReadSession.objects.filter(pk=session.pk).update(is_verified=True, last_modification_time=datetime.now(
+            tz=timezone.utc))
+        response = self.client.get(url, {'type': READ_SESSION_PENDING, 'since': response['X-Sync-Time']})
+        self.assertEqual(response.data, {'results': [], 'removed': [session.key]})
+
+    def test_cursor_pages_sort_on_related_school(self):
+        self.create_sessions(12)
+        other_school = School.objects.create(name='A School', address='Pune', pin_code=411001, ngo=self.ngo,
+                                             school_category=self.school.school_category,
+                                             school_type=self.school.school_type, medium=self.school.medium)
+        ReadSessionClassroom.objects.filter(read_session__in=ReadSession.objects.order_by('pk')[:5]) \
+            .update(classroom=Classroom.objects.create(school=other_school, standard=self.standard))
+
+        response = self.client.get('/ngos/%s/sessions/' % self.ngo.key,
+                                   {'sort': 'school', 'view': READ_SESSION_VIEW_COMPACT, 'pagination': 'cursor'})
+        keys = [row['key'] for row in response.data['results']]
+        response = self.client.get(response.data['next'])
+        keys += [row['key'] for row in response.data['results']]
+        self.assertIsNone(response.data['next'])
+
+        expected = list(ReadSession.objects.order_by('readsessionclassroom__classroom__school__name', 'pk')
+                        .values_list('key', flat=True))
+        self.assertEqual(keys, expected)
+
+
+class EvaluationLevelTestCase(ReadSessionFixtures, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(invalidate_reference_data, Level)
+        self.create_sessions(1)
+        self.read_session = ReadSession.objects.get()
+        self.student = Student.objects.create(first_name='Student', last_name='0', address='Pune', gender='MALE',
+                                              mother_tongue='Marathi', birth_date='2012-01-01')
+        ClassroomAcademicYear.objects.create(academic_year=self.academic_year, student=self.student,
+                                             classroom=self.read_session.readsessionclassroom_set.get().classroom)
+
+    def test_levels_added_by_another_process(self):
+        get_reference_data(Level)
+        # bulk_create sends no signal here, like a level added by another worker
+        Level.objects.bulk_create([Level(ngo=self.ngo, rank=1, mr_in='1', en_in='1', is_regular=True)])
+        level = Level.objects.get(ngo=self.ngo, rank=1)
+
+        response = self.client.post('/read_sessions/%s/submit_evaluations/' % self.read_session.key, {'body': [
+            {'student': self.student.key, 'level': level.key, 'attendance': True, 'book': []}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StudentFeedback.objects.get().level, level)
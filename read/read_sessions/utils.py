@@ -0,0 +1,223 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connection
+from django.db.models import Q, Prefetch, OuterRef, Subquery
+
+from books.models import Book, Inventory
+from ngos.models import Level
+from read.constants import READ_SESSION_VIEW_COMPACT, REGULAR, EVALUATION, SESSION_ATTENDED, SESSION_NOT_ATTENDED
+from read.pagination import get_paginator
+from read.reference_data import get_reference_data
+from read_sessions.models import ReadSession, ReadSessionBookFairy, StudentFeedback, StudentEvaluations, \
+    ReadSessionFeedbackBook, StudentLevel
+from students.models import Student
+from read_sessions.serializers import ReadSessionSerializer, ReadSessionCompactSerializer
+
+
+def paginate_read_sessions(read_sessions, request, view=None):
+    paginator = get_paginator(request)
+    if view == READ_SESSION_VIEW_COMPACT:
+        # Page over the ids alone so the filters are planned without the eager loading joins
+        page = [read_session.pk for read_session in paginator.paginate_queryset(read_sessions.only('pk'), request)]
+        read_sessions_by_pk = ReadSessionCompactSerializer.setup_eager_loading(
+            ReadSession.objects.filter(pk__in=page)).in_bulk()
+        result = [read_sessions_by_pk[pk] for pk in page]
+        serializer = ReadSessionCompactSerializer(result, many=True)
+    else:
+        result = paginator.paginate_queryset(read_sessions, request)
+        serializer = ReadSessionSerializer(result, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def find_scheduling_conflicts(read_session_dates, book_fairies, academic_year):
+    overlaps = Q()
+    for date in read_session_dates:
+        overlaps |= Q(start_date_time__lt=date['end_date_time'], end_date_time__gt=date['start_date_time'])
+
+    scheduled_sessions = ReadSession.objects \
+        .filter(overlaps, is_cancelled=False, academic_year=academic_year,
+                pk__in=ReadSessionBookFairy.objects.filter(book_fairy__in=book_fairies).values('read_session')) \
+        .prefetch_related(Prefetch('readsessionbookfairy_set',
+                                   queryset=ReadSessionBookFairy.objects.select_related('book_fairy'))) \
+        .order_by('start_date_time')
+
+    conflicts = []
+    for read_session in scheduled_sessions:
+        conflicts.append({"book_fairy": [session_book_fairy.book_fairy.first_name
+                                         for session_book_fairy in read_session.readsessionbookfairy_set.all()],
+                          "start_date": read_session.start_date_time,
+                          "end_date": read_session.end_date_time})
+
+    # The requested dates must not overlap each other either
+    book_fairy_names = [book_fairy.first_name for book_fairy in book_fairies]
+    latest = None
+    for date in sorted(read_session_dates, key=lambda date: date['start_date_time']):
+        if latest is not None and date['start_date_time'] < latest['end_date_time']:
+            conflicts.append({"book_fairy": book_fairy_names,
+                              "start_date": date['start_date_time'],
+                              "end_date": date['end_date_time']})
+        if latest is None or date['end_date_time'] > latest['end_date_time']:
+            latest = date
+    return conflicts
+
+
+def get_objects_by_key(queryset, keys):
+    objects = queryset.in_bulk(set(keys), field_name='key')
+    if len(objects) != len(set(keys)):
+        raise queryset.model.DoesNotExist("%s matching query does not exist." % queryset.model._meta.object_name)
+    return objects
+
+
+def get_student_feedback_model(session_type):
+    if session_type == REGULAR:
+        return StudentFeedback
+    if session_type == EVALUATION:
+        return StudentEvaluations
+    return None
+
+
+def get_levels_by_key(level_rows, level_keys, **kwargs):
+    return {level.key: level for level in level_rows.filter(**kwargs) if level.key in level_keys}
+
+
+def save_student_evaluations(session, items, ngo):
+    feedback_model = get_student_feedback_model(session.type)
+    if feedback_model is None:
+        return
+
+    present_items = [item for item in items if item.get('attendance')]
+    book_items = [book for item in present_items for book in item.get('book') or []]
+    level_filter = {'is_regular': True} if session.type == REGULAR else {'is_evaluation': True}
+
+    students = get_objects_by_key(Student.objects.all(), [item.get('student') for item in items])
+    level_keys = set(item.get('level') for item in present_items)
+    level_rows = get_reference_data(Level)
+    levels = get_levels_by_key(level_rows, level_keys, ngo_id=ngo.id, **level_filter)
+    if len(levels) != len(level_keys):
+        # A level may have been added by another process since the levels were loaded
+        levels = get_levels_by_key(level_rows.reload(), level_keys, ngo_id=ngo.id, **level_filter)
+    if len(levels) != len(level_keys):
+        raise Level.DoesNotExist("Level matching query does not exist.")
+    books = get_objects_by_key(Book.objects.all(), [book.get('book') for book in book_items])
+    inventories = get_objects_by_key(Inventory.objects.all(), [book.get('inventory') for book in book_items])
+
+    feedbacks = []
+    feedback_books = []
+    for item in items:
+        student = students[item.get('student')]
+        attendance = bool(item.get('attendance'))
+        # An absent student has no level and no books
+        feedbacks.append(feedback_model(student=student, read_session=session, attendance=attendance,
+                                        level=levels[item.get('level')] if attendance else None,
+                                        comments=item.get('comments')))
+        if attendance:
+            for book in item.get('book') or []:
+                feedback_books.append(ReadSessionFeedbackBook(read_session=session, student=student,
+                                                              book=books[book.get('book')],
+                                                              inventory=inventories[book.get('inventory')]))
+
+    # Each submitted student replaces whatever was saved for them before
+    student_ids = [student.id for student in students.values()]
+    feedback_model.objects.filter(read_session=session, student_id__in=student_ids).delete()
+    ReadSessionFeedbackBook.objects.filter(read_session=session, student_id__in=student_ids).delete()
+    feedback_model.objects.bulk_create(feedbacks)
+    ReadSessionFeedbackBook.objects.bulk_create(feedback_books)
+    # bulk_create sends no signals, so the levels are refreshed here rather than by a receiver
+    update_student_levels(student_ids)
+
+
+def update_student_levels(student_ids):
+    # The current level is the one from the latest session with feedback or an evaluation for the student
+    student_levels = {}
+    for feedback_model in (StudentFeedback, StudentEvaluations):
+        for student_id, read_session_id, start_date_time, level_id in feedback_model.objects \
+                .filter(student_id__in=student_ids) \
+                .values_list('student_id', 'read_session_id', 'read_session__start_date_time', 'level_id'):
+            student_level = student_levels.get(student_id)
+            if student_level is None or start_date_time > student_level.start_date_time:
+                student_levels[student_id] = StudentLevel(student_id=student_id, read_session_id=read_session_id,
+                                                          level_id=level_id, start_date_time=start_date_time)
+
+    StudentLevel.objects.filter(student_id__in=student_ids).delete()
+    StudentLevel.objects.bulk_create(student_levels.values())
+
+
+def all_students_evaluated(session):
+    students = Student.objects.filter(classroomacademicyear__classroom__readsessionclassroom__read_session=session,
+                                      classroomacademicyear__academic_year=session.academic_year_id,
+                                      is_dropout=False)
+    feedback_model = get_student_feedback_model(session.type)
+    if feedback_model is not None:
+        students = students.exclude(
+            pk__in=feedback_model.objects.filter(read_session=session).values('student'))
+    return not students.exists()
+
+
+def get_feedback_book_names(feedbacks):
+    if connection.vendor == 'postgresql':
+        book_names = ReadSessionFeedbackBook.objects \
+            .filter(student=OuterRef('student'), read_session=OuterRef('read_session')) \
+            .values('read_session').annotate(names=ArrayAgg('book__name', distinct=True)).values('names')
+        return feedbacks.annotate(books=Subquery(book_names)), None
+
+    book_names = {}
+    for read_session_id, student_id, name in ReadSessionFeedbackBook.objects \
+            .filter(read_session__in=feedbacks.values('read_session')) \
+            .values_list('read_session_id', 'student_id', 'book__name').distinct().order_by('book__name'):
+        book_names.setdefault((read_session_id, student_id), []).append(name)
+    return feedbacks, book_names
+
+
+def get_student_session_report(read_sessions, attendance=None):
+    read_sessions = list(read_sessions.values('id', 'key', 'type', 'start_date_time', 'end_date_time'))
+    students_by_session = {read_session['id']: {} for read_session in read_sessions}
+
+    for session_type in (REGULAR, EVALUATION):
+        session_ids = [read_session['id'] for read_session in read_sessions if read_session['type'] == session_type]
+        if not session_ids:
+            continue
+
+        feedbacks = get_student_feedback_model(session_type).objects.filter(read_session_id__in=session_ids)
+        if attendance == SESSION_ATTENDED:
+            feedbacks = feedbacks.filter(attendance=True)
+        elif attendance == SESSION_NOT_ATTENDED:
+            feedbacks = feedbacks.filter(attendance=False)
+        feedbacks = feedbacks.values('id', 'read_session_id', 'student_id', 'student__first_name',
+                                     'student__last_name', 'level__en_in', 'comments', 'attendance') \
+            .order_by('student__first_name', 'student__last_name', 'id')
+        feedbacks, book_names = get_feedback_book_names(feedbacks)
+
+        # Keyed on the student so that only the latest feedback row of a student is reported
+        for feedback in feedbacks.iterator():
+            key = (feedback['read_session_id'], feedback['student_id'])
+            books = feedback['books'] if book_names is None else book_names.get(key)
+            students_by_session[feedback['read_session_id']][feedback['student_id']] = {
+                "name": feedback['student__first_name'] + " " + feedback['student__last_name'],
+                "books": books or [],
+                "level": feedback['level__en_in'] or "NA",
+                "comments": feedback['comments'],
+                "attendance": feedback['attendance'],
+            }
+
+    report = []
+    for read_session in read_sessions:
+        session_datetime = read_session['start_date_time'].strftime("%a %d %b %H:%M") + " - " + \
+                           read_session['end_date_time'].strftime("%H:%M")
+        students = list(students_by_session[read_session['id']].values())
+        for student in students:
+            student["datetime"] = session_datetime
+        report.append({"key": read_session['key'], "students": students, "type": read_session['type']})
+    return report
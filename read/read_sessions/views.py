@@ -24,16 +24,16 @@ from rest_framework.viewsets import ViewSet
 from books.models import Book, Inventory
 from ngos.models import NGO, Level
 from read.constants import REGULAR, EVALUATION, ERROR_403_JSON, BOOK_LENDING, ERROR_400_JSON
+from read.tenancy import keys_belong_to_request_user_ngo
 from read.utils import create_response_error, request_user_belongs_to_ngo, request_user_belongs_to_read_session_ngo, \
-    request_user_belongs_to_read_sessions_ngo, create_response_data
+    create_response_data
 from read_sessions.models import ReadSession, ReadSessionBookFairy, ReadSessionClassroom, StudentFeedback, \
     ReadSessionFeedbackBook, StudentEvaluations, ReadSessionHomeLendingBook
 from read_sessions.serializers import ReadSessionSerializer, ReadSessionBookFairySerializer, \
-    ReadSessionClassroomSerializer, StudentFeedbackSerializer, ReadSessionFeedbackBookSerializer, \
-    StudentEvaluationsSerializer, StudentEvaluationsFeedbackBookSerializer, StudentFeedbackAndFeedbackBookSerializer, \
+    ReadSessionClassroomSerializer, StudentEvaluationsFeedbackBookSerializer, StudentFeedbackAndFeedbackBookSerializer, \
     ReadSessionHomeLendingBookSerializer, StudentHomeLendingBookSerializer
+from read_sessions.utils import save_student_evaluations, all_students_evaluated
 from students.models import Student
-from students.serializers import StudentSubmitEvaluationAndBookSerializer
 from users.permissions import PERMISSION_CAN_VIEW_READ_SESSION, has_permission, CanViewReadSession, CanChangeReadSession
 
 logger = logging.getLogger(__name__)
@@ -95,13 +95,11 @@ class ReadSessionViewSet(ViewSet):
         return Response(serializer.data)
 
     @action(methods=['POST'], detail=False)
+    @keys_belong_to_request_user_ngo(ReadSession)
     def delete_sessions(self, request, pk=None):
         session_keys = request.data.get('keys')
         sessions = json.loads(session_keys)
 
-        if not request_user_belongs_to_read_sessions_ngo(request, sessions):
-            return Response(status=403, data=ERROR_403_JSON())
-
         sessions_list = ReadSession.objects.filter(key__in=sessions)
         try:
             with transaction.atomic():
@@ -171,103 +169,9 @@ class ReadSessionViewSet(ViewSet):
         data = request.data.get('body')
         try:
             with transaction.atomic():
-                for item in data:
-
-                    student_key = item.get('student')
-                    level_key = item.get('level')
-                    inventory_books = item.get('book')
-                    is_evaluated = item.get('isEvaluated')
-                    attendance = item.get('attendance')
-                    comments = item.get('comments')
-                    student = Student.objects.get(key=student_key)
-
-                    if session.type == REGULAR:
-                        if attendance:
-                            level = Level.objects.get(key=level_key, is_regular=True, ngo=request.user.ngo)
-                            if is_evaluated:
-                                # Delete old entries from tables and adding new
-                                student_feedbacks = StudentFeedback.objects.filter(student__key=student_key,
-                                                                                   read_session__key=pk)
-                                student_feedbacks.delete()
-
-                                feedback_books = ReadSessionFeedbackBook.objects.filter(student__key=student_key,
-                                                                                        read_session__key=pk)
-                                feedback_books.delete()
-
-                            feedback_data = {"student_id": student.id, "level_id": level.id,
-                                             "read_session_id": session.id,
-                                             "attendance": attendance, "comments": comments}
-
-                            student_feedback_serializer = StudentFeedbackSerializer(data=feedback_data)
-
-                            if student_feedback_serializer.is_valid():
-                                student_feedback_serializer.save()
-                                if inventory_books is not None:
-                                    for book_inventory_data in inventory_books:
-                                        inventory_key = book_inventory_data.get('inventory')
-                                        book_key = book_inventory_data.get('book')
-                                        book = Book.objects.get(key=book_key)
-                                        inventory = Inventory.objects.get(key=inventory_key)
-                                        feedback_data["book_id"] = book.id
-                                        feedback_data["inventory_id"] = inventory.id
-                                        feedback_book_serializer = ReadSessionFeedbackBookSerializer(data=feedback_data)
-                                        if feedback_book_serializer.is_valid():
-                                            feedback_book_serializer.save()
-                        else:
-                            # If student is absent mark level as None
-                            feedback_data = {"student_id": student.id, "level_id": None,
-                                             "read_session_id": session.id,
-                                             "attendance": attendance, "comments": comments}
-
-                            student_feedback_serializer = StudentFeedbackSerializer(data=feedback_data)
-                            if student_feedback_serializer.is_valid():
-                                student_feedback_serializer.save()
-
-                    elif session.type == EVALUATION:
-                        if attendance:
-                            level = Level.objects.get(key=level_key, is_evaluation=True, ngo=request.user.ngo)
-                            if is_evaluated:
-                                # Delete old entries from tables and adding new
-                                student_evaluations = StudentEvaluations.objects.filter(student__key=student_key,
-                                                                                        read_session__key=pk)
-                                student_evaluations.delete()
-
-                                feedback_books = ReadSessionFeedbackBook.objects.filter(student__key=student_key,
-                                                                                        read_session__key=pk)
-                                feedback_books.delete()
-
-                            evaluation_data = {"student_id": student.id, "level_id": level.id,
-                                               "read_session_id": session.id,
-                                               "attendance": attendance, "comments": comments}
-
-                            student_evaluation_serializer = StudentEvaluationsSerializer(data=evaluation_data)
-
-                            if student_evaluation_serializer.is_valid():
-                                student_evaluation_serializer.save()
-                                if inventory_books is not None:
-                                    for book_inventory_data in inventory_books:
-                                        inventory_key = book_inventory_data.get('inventory')
-                                        book_key = book_inventory_data.get('book')
-                                        book = Book.objects.get(key=book_key)
-                                        inventory = Inventory.objects.get(key=inventory_key)
-                                        evaluation_data["book_id"] = book.id
-                                        evaluation_data["inventory_id"] = inventory.id
-                                        feedback_book_serializer = ReadSessionFeedbackBookSerializer(
-                                            data=evaluation_data)
-                                        if feedback_book_serializer.is_valid():
-                                            feedback_book_serializer.save()
-                        else:
-                            # If student is absent mark level as None
-                            evaluation_data = {"student_id": student.id, "level_id": None,
-                                               "read_session_id": session.id,
-                                               "attendance": attendance, "comments": comments}
-                            student_evaluation_serializer = StudentEvaluationsSerializer(data=evaluation_data)
-
-                            if student_evaluation_serializer.is_valid():
-                                student_evaluation_serializer.save()
-
+                save_student_evaluations(session, data, request.user.ngo)
             return Response(status=200, data=create_response_data("Saved"))
-        except (Book.DoesNotExist, Student.DoesNotExist, Level.DoesNotExist) as e:
+        except (Book.DoesNotExist, Student.DoesNotExist, Level.DoesNotExist, Inventory.DoesNotExist) as e:
             return Response(status=400, data=create_response_error(e))
 
     @action(detail=True, methods=['POST'])
@@ -286,110 +190,10 @@ class ReadSessionViewSet(ViewSet):
         data = request.data.get('body')
         try:
             with transaction.atomic():
-                for item in data:
-
-                    student_key = item.get('student')
-                    level_key = item.get('level')
-                    inventory_books = item.get('book')
-                    is_evaluated = item.get('isEvaluated')
-                    attendance = item.get('attendance')
-                    comments = item.get('comments')
-                    student = Student.objects.get(key=student_key)
-                    if session.type == REGULAR:
-                        if attendance:
-                            level = Level.objects.get(key=level_key, is_regular=True, ngo=request.user.ngo)
-                            if is_evaluated:
-                                # Delete old entries from tables and adding new
-                                student_feedbacks = StudentFeedback.objects.filter(student__key=student_key,
-                                                                                   read_session__key=pk)
-                                student_feedbacks.delete()
-
-                                feedback_books = ReadSessionFeedbackBook.objects.filter(student__key=student_key,
-                                                                                        read_session__key=pk)
-                                feedback_books.delete()
-
-                            feedback_data = {"student_id": student.id, "level_id": level.id,
-                                             "read_session_id": session.id,
-                                             "attendance": attendance, "comments": comments}
-
-                            student_feedback_serializer = StudentFeedbackSerializer(data=feedback_data)
-
-                            if student_feedback_serializer.is_valid():
-                                student_feedback_serializer.save()
-                                if inventory_books is not None:
-                                    for book_inventory_data in inventory_books:
-                                        inventory_key = book_inventory_data.get('inventory')
-                                        book_key = book_inventory_data.get('book')
-                                        book = Book.objects.get(key=book_key)
-                                        inventory = Inventory.objects.get(key=inventory_key)
-                                        feedback_data["book_id"] = book.id
-                                        feedback_data["inventory_id"] = inventory.id
-                                        feedback_book_serializer = ReadSessionFeedbackBookSerializer(data=feedback_data)
-                                        if feedback_book_serializer.is_valid():
-                                            feedback_book_serializer.save()
-                        else:
-                            # If student is absent mark level as None
-                            feedback_data = {"student_id": student.id, "level_id": None,
-                                             "read_session_id": session.id,
-                                             "attendance": attendance, "comments": comments}
-                            student_feedback_serializer = StudentFeedbackSerializer(data=feedback_data)
-                            student_feedback_serializer.is_valid()
-                            if student_feedback_serializer.is_valid():
-                                student_feedback_serializer.save()
-
-                    elif session.type == EVALUATION:
-                        if attendance:
-                            level = Level.objects.get(key=level_key, is_evaluation=True, ngo=request.user.ngo)
-                            if is_evaluated:
-                                # Delete old entries from tables and adding new
-                                student_evaluations = StudentEvaluations.objects.filter(student__key=student_key,
-                                                                                        read_session__key=pk)
-                                student_evaluations.delete()
-
-                                feedback_books = ReadSessionFeedbackBook.objects.filter(student__key=student_key,
-                                                                                        read_session__key=pk)
-                                feedback_books.delete()
-
-                            evaluation_data = {"student_id": student.id, "level_id": level.id,
-                                               "read_session_id": session.id,
-                                               "attendance": attendance, "comments": comments}
-
-                            student_evaluation_serializer = StudentEvaluationsSerializer(data=evaluation_data)
-
-                            if student_evaluation_serializer.is_valid():
-                                student_evaluation_serializer.save()
-                                if inventory_books is not None:
-                                    for book_inventory_data in inventory_books:
-                                        inventory_key = book_inventory_data.get('inventory')
-                                        book_key = book_inventory_data.get('book')
-                                        book = Book.objects.get(key=book_key)
-                                        inventory = Inventory.objects.get(key=inventory_key)
-                                        evaluation_data["book_id"] = book.id
-                                        evaluation_data["inventory_id"] = inventory.id
-                                        feedback_book_serializer = ReadSessionFeedbackBookSerializer(
-                                            data=evaluation_data)
-                                        if feedback_book_serializer.is_valid():
-                                            feedback_book_serializer.save()
-                        else:
-                            # If student is absent mark level as None
-                            evaluation_data = {"student_id": student.id, "level_id": None,
-                                               "read_session_id": session.id,
-                                               "attendance": attendance, "comments": comments}
-                            student_evaluation_serializer = StudentEvaluationsSerializer(data=evaluation_data)
-                            if student_evaluation_serializer.is_valid():
-                                student_evaluation_serializer.save()
+                save_student_evaluations(session, data, request.user.ngo)
 
                 # check if every student has been evaluated.
-                students = Student.objects.filter(
-                    classroomacademicyear__classroom__readsessionclassroom__read_session=session, is_dropout=False,
-                    classroomacademicyear__academic_year__key=session.academic_year.key)
-                students_new = StudentSubmitEvaluationAndBookSerializer(students, many=True, session=session).data
-                all_students_evaluated = True
-                for student in students_new:
-                    if not student.get('is_evaluated'):
-                        all_students_evaluated = False
-                        break
-                if all_students_evaluated:
+                if all_students_evaluated(session):
                     session.is_evaluated = True
                     session.submitted_by_book_fairy = request.user
                     session.save()
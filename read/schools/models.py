@@ -20,6 +20,7 @@ from read.constants import PUBLIC_KEY_LENGTH_SCHOOL, SCHOOL_MEDIUM_ENGLISH, SCHO
     SCHOOL_TYPE_PCMC, SCHOOL_TYPE_PMC, SCHOOL_TYPE_ZP, SCHOOL_TYPE_PRIVATE, SCHOOL_CATEGORY_BOYS, SCHOOL_CATEGORY_GIRLS, \
     SCHOOL_CATEGORY_CO_ED, LENGTH_SCHOOL_NAME_FIELD, LENGTH_SCHOOL_ADDRESS_FIELD, SCHOOL_MEDIUM_HINDI, \
     SCHOOL_MEDIUM_KANNADA
+from read.reference_data import register_reference_data
 from users.permissions import PERMISSION_CAN_IMPORT_SCHOOLS, PERMISSION_CAN_EXPORT_SCHOOLS
 
 
@@ -150,3 +151,9 @@ class ClassroomFunders(models.Model):
 
     class Meta:
         db_table = 'classroom_funders'
+
+
+register_reference_data(SchoolCategory, ('name',), SchoolCategory.CATEGORIES)
+register_reference_data(SchoolType, ('name',), SchoolType.TYPES)
+register_reference_data(SchoolMedium, ('name',), SchoolMedium.MEDIUMS)
+register_reference_data(Standard, ('name',))
@@ -12,6 +12,187 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from django.test import TestCase
 
-# Create your tests here.
+import json
+from unittest import mock
+
+from django.db import connection, transaction, DatabaseError
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from ngos.models import NGO
+from read.reference_data import get_reference_data, invalidate_reference_data
+from read.search import search, search_order_by, is_trigram_available, CreateTrigramIndexes, SEARCH_RANK
+from read.tenancy import keys_belong_to_ngo
+from read.utils import get_school_category
+from schools.models import School, SchoolCategory, SchoolType, SchoolMedium
+from users.models import User
+
+
+class SchoolTenancyTestCase(TestCase):
+
+    def setUp(self):
+        self.ngo = NGO.objects.create(name='NGO', address='Pune')
+        self.other_ngo = NGO.objects.create(name='Other NGO', address='Mumbai')
+        self.category = SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED')
+        self.type = SchoolType.objects.create(name='SCHOOL_TYPE_PMC')
+        self.medium = SchoolMedium.objects.create(name='SCHOOL_MEDIUM_MARATHI')
+        self.schools = [self.create_school(self.ngo, index) for index in range(50)]
+        self.other_school = self.create_school(self.other_ngo, 50)
+        admin = User.objects.create_superuser(username='admin', email='admin@read.org', password='admin',
+                                              first_name='Admin', last_name='User', ngo=self.ngo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=admin)
+
+    def create_school(self, ngo, index):
+        return School.objects.create(name='School %d' % index, address='Pune', pin_code=411001, ngo=ngo,
+                                     school_category=self.category, school_type=self.type, medium=self.medium)
+
+    def test_keys_checked_in_one_query(self):
+        keys = [school.key for school in self.schools]
+        with self.assertNumQueries(1):
+            self.assertTrue(keys_belong_to_ngo(School, keys + keys[:5], self.ngo))
+        with self.assertNumQueries(1):
+            self.assertFalse(keys_belong_to_ngo(School, keys + [self.other_school.key], self.ngo))
+        with self.assertNumQueries(0):
+            self.assertTrue(keys_belong_to_ngo(School, [], self.ngo))
+
+    def test_deactivate_other_ngo_school(self):
+        keys = [self.schools[0].key, self.other_school.key]
+        response = self.client.post('/schools/deactivate_school/', {'keys': json.dumps(keys)})
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('message', response.data)
+        self.assertEqual(School.objects.filter(is_active=False).count(), 0)
+
+        response = self.client.post('/schools/deactivate_school/', {'keys': json.dumps([self.schools[0].key])})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(School.objects.get(pk=self.schools[0].pk).is_active)
+
+    def test_deactivate_and_activate_schools(self):
+        keys = json.dumps([school.key for school in self.schools])
+        with self.assertNumQueries(2):
+            response = self.client.post('/schools/deactivate_school/', {'keys': keys})
+        self.assertEqual(response.data, {'schools': 50})
+        self.assertEqual(School.objects.filter(ngo=self.ngo, is_active=True).count(), 0)
+        self.assertTrue(School.objects.get(pk=self.other_school.pk).is_active)
+
+        response = self.client.post('/schools/deactivate_school/', {'keys': keys})
+        self.assertEqual(response.data, {'schools': 0})
+
+        response = self.client.post('/schools/activate_school/', {'keys': keys})
+        self.assertEqual(response.data, {'schools': 50})
+        self.assertEqual(School.objects.filter(ngo=self.ngo, is_active=True).count(), 50)
+
+
+class ReferenceDataTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.addCleanup(invalidate_reference_data, SchoolCategory)
+        self.co_ed = SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED')
+        get_reference_data(SchoolCategory)
+
+    def test_lookups_do_not_query_once_loaded(self):
+        with self.assertNumQueries(0):
+            school_categories = get_reference_data(SchoolCategory)
+            self.assertEqual(school_categories.get(name='SCHOOL_CATEGORY_CO_ED'), self.co_ed)
+            self.assertEqual(school_categories.get(id=str(self.co_ed.id)), self.co_ed)
+            self.assertEqual(get_school_category(school_categories, 'co-ed'), self.co_ed)
+            self.assertIsNone(get_school_category(school_categories, 'Mixed'))
+            self.assertIsNone(get_school_category(school_categories, None))
+            with self.assertRaises(SchoolCategory.DoesNotExist):
+                school_categories.get(id='boys')
+
+        # A miss reloads in case another process added the row
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_school_category(school_categories, 'Boys'))
+
+    def test_saving_and_deleting_invalidate(self):
+        boys = SchoolCategory.objects.create(name='SCHOOL_CATEGORY_BOYS')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_school_category(get_reference_data(SchoolCategory), 'Boys'), boys)
+
+        boys.name = 'SCHOOL_CATEGORY_GIRLS'
+        boys.save()
+        self.assertEqual(get_reference_data(SchoolCategory).get(name='SCHOOL_CATEGORY_GIRLS').id, boys.id)
+
+        boys.delete()
+        with self.assertRaises(SchoolCategory.DoesNotExist):
+            get_reference_data(SchoolCategory).get(name='SCHOOL_CATEGORY_GIRLS')
+
+    def test_changes_made_by_another_process(self):
+        # Neither write sends a signal here, like a write made by another worker
+        SchoolCategory.objects.bulk_create([SchoolCategory(name='SCHOOL_CATEGORY_BOYS')])
+        self.assertEqual(get_school_category(get_reference_data(SchoolCategory), 'Boys').name,
+                         'SCHOOL_CATEGORY_BOYS')
+
+        SchoolCategory.objects.filter(pk=self.co_ed.pk).update(is_active=False)
+        self.assertTrue(get_reference_data(SchoolCategory).get(id=self.co_ed.id).is_active)
+        with mock.patch('read.reference_data.REFERENCE_DATA_TTL', -1):
+            self.assertFalse(get_reference_data(SchoolCategory).get(id=self.co_ed.id).is_active)
+
+    def test_rows_of_a_rolled_back_transaction_are_not_kept(self):
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                SchoolCategory.objects.create(name='SCHOOL_CATEGORY_BOYS')
+                self.assertIsNotNone(get_school_category(get_reference_data(SchoolCategory), 'Boys'))
+                raise DatabaseError('rolled back')
+
+        with self.assertRaises(SchoolCategory.DoesNotExist):
+            get_reference_data(SchoolCategory).get(name='SCHOOL_CATEGORY_BOYS')
+        with self.assertNumQueries(0):
+            get_reference_data(SchoolCategory).get(name='SCHOOL_CATEGORY_CO_ED')
+
+
+class SchoolSearchTestCase(TestCase):
+
+    def setUp(self):
+        ngo = NGO.objects.create(name='NGO', address='Pune')
+        category = SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED')
+        school_type = SchoolType.objects.create(name='SCHOOL_TYPE_PMC')
+        medium = SchoolMedium.objects.create(name='SCHOOL_MEDIUM_MARATHI')
+        for name in ['New Pune', 'Mumbai', 'Pune Central', 'Pune']:
+            School.objects.create(name=name, address='Pune', pin_code=411001, ngo=ngo, school_category=category,
+                                  school_type=school_type, medium=medium)
+
+    def search_names(self, term, prefix=False, sort=None):
+        schools = search(School.objects.all(), ['name'], term, prefix).order_by(*search_order_by(sort))
+        return list(schools.values_list('name', flat=True))
+
+    def test_fallback_ranks_exact_then_prefix_then_contains(self):
+        with mock.patch('read.search.is_trigram_available', return_value=False):
+            self.assertEqual(self.search_names('pune'), ['Pune', 'Pune Central', 'New Pune'])
+            self.assertEqual(self.search_names('PUNE', prefix=True), ['Pune', 'Pune Central'])
+            self.assertEqual(self.search_names('pune', sort='name'), ['New Pune', 'Pune', 'Pune Central'])
+
+    def test_trigram_similarity_ranks_closest_first(self):
+        if not is_trigram_available():
+            self.skipTest('pg_trgm is not installed')
+        self.assertEqual(self.search_names('pune')[0], 'Pune')
+        self.assertEqual(set(self.search_names('pune', prefix=True)), {'Pune', 'Pune Central'})
+
+    def test_empty_term_matches_everything_unranked(self):
+        schools = search(School.objects.all(), ['name'], None)
+        self.assertEqual(schools.count(), 4)
+        self.assertEqual(set(schools.values_list(SEARCH_RANK, flat=True)), {0.0})
+
+    def test_trigram_is_not_used_outside_postgres(self):
+        self.assertFalse(is_trigram_available(mock.Mock(vendor='sqlite')))
+
+    def test_trigram_indexes_skipped_when_extension_cannot_be_created(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('trigram indexes are only created on PostgreSQL')
+        operation = CreateTrigramIndexes('schools', ['name'])
+        with connection.schema_editor() as schema_editor:
+            execute = schema_editor.execute
+
+            def execute_without_privileges(sql, params=()):
+                # Fails like CREATE EXTENSION does for a role that is not allowed to create it
+                if sql.startswith('CREATE EXTENSION'):
+                    sql = 'CREATE EXTENSION read_missing_extension'
+                return execute(sql, params)
+
+            with mock.patch.object(operation, 'get_extension', return_value=(True, False)), \
+                    mock.patch.object(schema_editor, 'execute', side_effect=execute_without_privileges), \
+                    self.assertLogs('read.search', 'WARNING'):
+                operation.database_forwards('schools', schema_editor, None, None)
+        self.assertEqual(School.objects.count(), 4)
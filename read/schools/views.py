@@ -20,8 +20,11 @@ from rest_framework.viewsets import ViewSet
 
 from read.common import convert_to_dropdown
 from read.constants import ERROR_403_JSON
-from read.utils import request_user_ngo_belongs_to_schools_ngo, request_user_ngo_belongs_to_school_ngo, \
+from read.activation import set_keys_active
+from read.tenancy import belongs_to_ngo
+from read.utils import request_user_ngo_belongs_to_school_ngo, \
     create_serializer_error
+from read.reference_data import get_reference_data
 from schools.models import School, SchoolAcademicYear, SchoolCategory, SchoolType, SchoolMedium, Standard, \
     SchoolFunders, ClassroomFunders
 from schools.serializers import SchoolSerializer, SchoolAcademicYearSerializer, SchoolCategorySerializer, \
@@ -61,9 +64,9 @@ class SchoolViewSet(ViewSet):
             if not request_user_ngo_belongs_to_school_ngo(request, school):
                 return Response(status=403, data=ERROR_403_JSON())
 
-            school_category = SchoolCategory.objects.get(name=school_category_key)
-            school_type = SchoolType.objects.get(name=school_type_key)
-            medium = SchoolMedium.objects.get(name=medium_key)
+            school_category = get_reference_data(SchoolCategory).get(name=school_category_key)
+            school_type = get_reference_data(SchoolType).get(name=school_type_key)
+            medium = get_reference_data(SchoolMedium).get(name=medium_key)
         except (SchoolCategory.DoesNotExist, SchoolType.DoesNotExist, SchoolMedium.DoesNotExist) as e:
             return Response(status=404)
 
@@ -79,19 +82,21 @@ class SchoolViewSet(ViewSet):
             return Response(serializer.data)
         return Response(data=create_serializer_error(serializer), status=400)
 
-    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteSchool])
+    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteSchool, belongs_to_ngo(School)])
     def deactivate_school(self, request, pk=None):
         keys = request.data.get('keys')
         school_keys = json.loads(keys)
 
-        if not request_user_ngo_belongs_to_schools_ngo(request, school_keys):
-            return Response(status=403, data=ERROR_403_JSON())
+        count = set_keys_active(School, school_keys, False, ngo=request.user.ngo)
+        return Response({'schools': count})
 
-        schools = School.objects.filter(key__in=school_keys)
-        for school in schools:
-            school.is_active = False
-            school.save()
-        return Response(status=204)
+    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteSchool, belongs_to_ngo(School)])
+    def activate_school(self, request, pk=None):
+        keys = request.data.get('keys')
+        school_keys = json.loads(keys)
+
+        count = set_keys_active(School, school_keys, True, ngo=request.user.ngo)
+        return Response({'schools': count})
 
     @action(detail=False, methods=['GET'], permission_classes=[CanViewSchool])
     def get_school_mediums(self, request):
@@ -18,9 +18,8 @@ from rest_framework.serializers import ModelSerializer
 from books.models import Inventory
 from books.serializers import InventorySerializer, InventoryActionSerializer
 from read.constants import REGULAR, EVALUATION
-from read_sessions.models import StudentEvaluations, StudentFeedback, ReadSession
+from read_sessions.models import StudentEvaluations, StudentFeedback, StudentLevel
 from students.models import Student
-from django.db.models import Q
 
 
 class StudentSerializer(ModelSerializer):
@@ -108,18 +107,13 @@ class StudentLevelSerializer(ModelSerializer):
             return None
 
     def get_level(self, obj):
-        level = ReadSession.objects.filter(
-            Q(studentevaluations__student=obj) | Q(studentfeedback__student=obj)
-        ).values('studentevaluations__level__en_in', 'studentfeedback__level__en_in').order_by(
-            '-start_date_time').first()
-
-        if level:
-            if level['studentevaluations__level__en_in']:
-                return level['studentevaluations__level__en_in']
-            elif level['studentfeedback__level__en_in']:
-                return level['studentfeedback__level__en_in']
-            else:
-                return None
+        try:
+            student_level = obj.current_level
+        except StudentLevel.DoesNotExist:
+            return None
+
+        if student_level.level:
+            return student_level.level.en_in
         else:
             return None
 
@@ -24,8 +24,11 @@ from classrooms.models import Classroom, ClassroomAcademicYear
 from classrooms.serializers import ClassroomAcademicYearSerializer
 from classrooms.validators import validate_student_request
 from read.constants import ERROR_403_JSON
+from read.activation import set_keys_active
+from read.tenancy import belongs_to_ngo
 from read.utils import create_response_error, request_user_ngo_belongs_to_student_ngo, \
-    request_user_ngo_belongs_to_students_ngo, get_current_academic_year
+    get_current_academic_year
+from read.reference_data import get_reference_data
 from students.models import Student
 from students.serializers import StudentSerializer
 from users.permissions import PERMISSION_CAN_VIEW_STUDENT, has_permission, PERMISSION_CAN_CHANGE_STUDENT, \
@@ -67,7 +70,7 @@ class StudentViewSet(ViewSet):
                 return Response(status=403, data=ERROR_403_JSON())
 
             classroom = Classroom.objects.get(key=classroom_key)
-            academic_year = AcademicYear.objects.get(key=academic_year_key)
+            academic_year = get_reference_data(AcademicYear).get(key=academic_year_key)
             classroom_academic_year = ClassroomAcademicYear.objects.get(student=student)
         except Student.DoesNotExist:
             return Response(status=404)
@@ -94,8 +97,8 @@ class StudentViewSet(ViewSet):
         current_academic_year_name = get_current_academic_year()
         try:
             student = Student.objects.get(key=pk)
-            academic_year = AcademicYear.objects.get(key=academic_year_key)
-            current_academic_year = AcademicYear.objects.get(name=current_academic_year_name)
+            academic_year = get_reference_data(AcademicYear).get(key=academic_year_key)
+            current_academic_year = get_reference_data(AcademicYear).get(name=current_academic_year_name)
             classroom_academic_year = ClassroomAcademicYear.objects.get(student__key=student.key,
                                                                         academic_year__key=academic_year.key)
         except (Student.DoesNotExist, AcademicYear.DoesNotExist, ClassroomAcademicYear.DoesNotExist) as e:
@@ -114,16 +117,20 @@ class StudentViewSet(ViewSet):
         else:
             return Response(status=400, data=create_response_error("Cannot mark student as dropout for previous year"))
 
-    @action(detail=False, methods=['POST'], permission_classes=[CanDeleteStudent])
+    @action(detail=False, methods=['POST'],
+            permission_classes=[CanDeleteStudent, belongs_to_ngo(Student, keys_field='students')])
     def deactivate_students(self, request):
         students = request.data.get('students')
         student_keys = json.loads(students)
 
-        if not request_user_ngo_belongs_to_students_ngo(request, student_keys):
-            return Response(status=403, data=ERROR_403_JSON())
+        count = set_keys_active(Student, student_keys, False, ngo=request.user.ngo)
+        return Response({'students': count})
 
-        students_list = Student.objects.filter(key__in=student_keys, )
-        for student in students_list:
-            student.is_active = False
-            student.save()
-        return Response(status=204)
+    @action(detail=False, methods=['POST'],
+            permission_classes=[CanDeleteStudent, belongs_to_ngo(Student, keys_field='students')])
+    def activate_students(self, request):
+        students = request.data.get('students')
+        student_keys = json.loads(students)
+
+        count = set_keys_active(Student, student_keys, True, ngo=request.user.ngo)
+        return Response({'students': count})
@@ -12,49 +12,136 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+
 import json
+import os
 import re
 
 from django.core.management.base import BaseCommand
 
+from read.translations import get_translation_file_path, get_translation_hash, join_translations, \
+    TRANSLATION_BUNDLE_PATH, TRANSLATION_MANIFEST_PATH, TRANSLATION_LOCALES
+
+PO_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\'}
+
 
 def get_po_path(locale, domain, locale_dir):
     return locale_dir + "/" + locale + "/LC_MESSAGES/" + domain + ".po"
 
 
-# noinspection SpellCheckingInspection
-def extract_from_po_file(po_path):
-    with open(po_path, 'r', encoding='utf-8') as f:
-        tuples = re.findall(r"msgid \"(.+)\"\nmsgstr \"(.+)\"", f.read())
-    return tuples
+def unquote_po_string(value):
+    return re.sub(r'\\(.)', lambda match: PO_ESCAPES.get(match.group(1), match.group(1)), value.strip()[1:-1])
 
 
-def po_to_json(locales, domain, locale_dir):
-    # create PO-like json data for i18n
-    for locale in locales:
-        obj = {}
-        locale_file_path = 'static/locale_' + locale + '.json'
-        # obj[locale] = {}
-        tuples = extract_from_po_file(get_po_path(locale, domain, locale_dir))
-        for tuple in tuples:
-            obj[tuple[0]] = tuple[1]
-            # obj[locale][tuple[0]] = tuple[1]
+def read_po_entries(po_file):
+    # Streams entries as {keyword: text}, joining continuation lines; comments and obsolete (#~) entries are skipped
+    entry = {}
+    keyword = None
+    for line in po_file:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            keyword = None
+            continue
+        if line.startswith('"'):
+            if keyword:
+                entry[keyword] += unquote_po_string(line)
+            continue
+        keyword, _, value = line.partition(' ')
+        if keyword in ('msgctxt', 'msgid') and any(key.startswith('msgstr') for key in entry):
+            yield entry
+            entry = {}
+        entry[keyword] = unquote_po_string(value)
+    if entry:
+        yield entry
+
+
+def compile_po_file(po_path):
+    # Fuzzy entries are kept, as the frontend has always shown them
+    messages = {}
+    with open(po_path, 'r', encoding='utf-8') as po_file:
+        for entry in read_po_entries(po_file):
+            message_id = entry.get('msgid')
+            if not message_id:
+                continue
+            if 'msgctxt' in entry:
+                message_id = entry['msgctxt'] + '\x04' + message_id
+            if 'msgid_plural' in entry:
+                message = [entry[key] for key in sorted(entry) if key.startswith('msgstr[')]
+                if not any(message):
+                    continue
+            else:
+                message = entry.get('msgstr')
+                if not message:
+                    continue
+            messages[message_id] = message
+    return messages
+
 
-        with open(locale_file_path, 'w', encoding='utf-8') as f:
-            json.dump(obj, f, ensure_ascii=False)
+def get_file_hash(path):
+    with open(path, 'rb') as f:
+        return get_translation_hash(f.read())
+
+
+def write_if_changed(path, content):
+    if os.path.exists(path) and get_file_hash(path) == get_translation_hash(content):
+        return False
+    with open(path, 'wb') as f:
+        f.write(content)
+    return True
+
+
+def load_manifest():
+    try:
+        with open(TRANSLATION_MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'locales': {}}
+
+
+def po_to_json(locales, domain, locale_dir, force=False):
+    # create PO-like json data for i18n, recompiling only locales whose .po file changed
+    manifest = load_manifest()
+    locale_hashes = {}
+    contents = []
+    changed = []
+    for locale in locales:
+        po_path = get_po_path(locale, domain, locale_dir)
+        locale_file_path = get_translation_file_path(locale)
+        source_hash = get_file_hash(po_path)
+        previous = manifest['locales'].get(locale, {})
+        if not force and previous.get('source') == source_hash and os.path.exists(locale_file_path) \
+                and get_file_hash(locale_file_path) == previous.get('hash'):
+            with open(locale_file_path, 'rb') as f:
+                content = f.read()
+        else:
+            content = json.dumps(compile_po_file(po_path), ensure_ascii=False, sort_keys=True,
+                                 separators=(',', ':')).encode('utf-8')
+            if write_if_changed(locale_file_path, content):
+                changed.append(locale)
+        locale_hashes[locale] = {'source': source_hash, 'hash': get_translation_hash(content)}
+        contents.append(content)
 
-    return
+    # The bundle is what /translations serves to clients that take every language
+    bundle = join_translations(locales, contents)
+    write_if_changed(TRANSLATION_BUNDLE_PATH, bundle)
+    manifest = {'version': get_translation_hash(bundle), 'locales': locale_hashes}
+    write_if_changed(TRANSLATION_MANIFEST_PATH,
+                     json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8') + b'\n')
+    return manifest, changed
 
 
 class Command(BaseCommand):
     help = 'Create locale json files in static dir'
 
     def add_arguments(self, parser):
-        pass
+        parser.add_argument('--force', action='store_true', help='Recompile every locale')
 
     def handle(self, *args, **options):
-        locales = ["mr_IN", "en_IN"]
         domain = "django"
         localeDir = "locale"
-        po_to_json(locales, domain, localeDir)
+        manifest, changed = po_to_json(TRANSLATION_LOCALES, domain, localeDir, options['force'])
+        for locale in changed:
+            print("Updated", locale)
+        print("Version", manifest['version'])
+        print("Finished")
         return
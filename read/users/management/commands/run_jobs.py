@@ -0,0 +1,47 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from jobs.utils import claim_next_job, run_job, requeue_stale_jobs
+
+POLL_INTERVAL = 5
+
+
+class Command(BaseCommand):
+    help = 'Run queued import, export and QR code jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no job is pending')
+        parser.add_argument('--poll-interval', type=int, default=POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            requeued, failed = requeue_stale_jobs()
+            if requeued or failed:
+                print("Requeued %d and failed %d jobs whose worker stopped" % (requeued, failed))
+            with transaction.atomic():
+                job = claim_next_job()
+            if job:
+                job = run_job(job)
+                print("Job %s %s: %s" % (job.key, job.job_type, job.get_status_display()))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        print("Finished")
+        return
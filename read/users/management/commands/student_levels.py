@@ -0,0 +1,48 @@
+#  Copyright (c) 2020. Maverick Labs
+#    This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as,
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from read_sessions.models import StudentFeedback, StudentEvaluations, StudentLevel
+from read_sessions.utils import update_student_levels
+
+BATCH_SIZE = 500
+
+
+def _student_levels_backfill(batch_size):
+    student_ids = set(StudentFeedback.objects.values_list('student_id', flat=True).distinct())
+    student_ids |= set(StudentEvaluations.objects.values_list('student_id', flat=True).distinct())
+    student_ids = sorted(student_ids)
+
+    # Students without any feedback left keep no level
+    StudentLevel.objects.exclude(student__in=StudentFeedback.objects.values('student')) \
+        .exclude(student__in=StudentEvaluations.objects.values('student')).delete()
+    for start in range(0, len(student_ids), batch_size):
+        with transaction.atomic():
+            update_student_levels(student_ids[start:start + batch_size])
+    return len(student_ids)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the current reading level of every student'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = _student_levels_backfill(options['batch_size'])
+        print("Updated levels of %d students" % count)
+        print("Finished")
+        return
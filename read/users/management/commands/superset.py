@@ -12,102 +12,189 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
+from datetime import timedelta
+
 from django.core.management import BaseCommand
-from django.db import connection
+from django.db import connection, transaction
+from django.utils import timezone
 
 from ngos.models import NGO
-from read.create_table_as import create_table_as
+from read.create_table_as import create_table_as, insert_into
 from read_sessions.models import ReadSession
-from django.db.models import F, CharField
+from django.db.models import F, CharField, Q
 from django.db.models import Value
 from django.db.models.functions import Concat
 
+SUPERSET_TABLE_SUFFIX = '_sessions_feedback_master_details'
+SUPERSET_SHADOW_SUFFIX = '_shadow'
+SUPERSET_REFRESH_MARKS_TABLE = 'superset_refresh_marks'
+MAX_IDENTIFIER_LENGTH = 63
+# Sessions saved by transactions that commit up to this long after their timestamp are still picked up
+SUPERSET_REFRESH_MARGIN = timedelta(minutes=15)
+
+
+def superset_table_name(name):
+    identifier = re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_') or 'ngo'
+    if identifier[0].isdigit():
+        identifier = 'ngo_' + identifier
+    max_length = MAX_IDENTIFIER_LENGTH - len(SUPERSET_TABLE_SUFFIX) - len(SUPERSET_SHADOW_SUFFIX)
+    return identifier[:max_length] + SUPERSET_TABLE_SUFFIX
+
+
+def superset_table_names(ngos):
+    table_names = {}
+    # The oldest NGO keeps the plain name, so a table always holds the same NGO's rows from run to run
+    for ngo in sorted(ngos, key=lambda ngo: ngo.pk):
+        table_name = superset_table_name(ngo.name)
+        # NGO names that only differ in punctuation must not share a table
+        if table_name in table_names.values():
+            table_name = superset_table_name(ngo.name + '_' + ngo.key)
+        table_names[ngo] = table_name
+    return table_names
+
+
+def get_feedback_sessions(ngo):
+    ngo_filter = {
+        'readsessionclassroom__classroom__school__ngo': ngo,
+        'readsessionclassroom__classroom__school__ngo__is_active': True
+    }
+    return ReadSession.objects.filter(**ngo_filter).annotate(
+        session_id=F('id'),
+        session_type=F('type'),
+        session_academic_year=F('academic_year__name'),
+        session_start_date_time=F('start_date_time'),
+        session_end_date_time=F('end_date_time'),
+        session_is_evaluated=F('is_evaluated'),
+        session_is_verified=F('is_verified'),
+        session_is_cancelled=F('is_cancelled'),
+        session_level=F('studentfeedback__level__en_in'),
+        session_feedback_comments=F('studentfeedback__comments'),
+        school_name=F('readsessionclassroom__classroom__school__name'),
+        school_ngo=F('readsessionclassroom__classroom__school__ngo__name'),
+        school_category=F('readsessionclassroom__classroom__school__school_category__name'),
+        school_type=F('readsessionclassroom__classroom__school__school_type__name'),
+        school_medium=F('readsessionclassroom__classroom__school__medium__name'),
+        school_is_active=F('readsessionclassroom__classroom__school__is_active'),
+        classroom=Concat('readsessionclassroom__classroom__school__name',
+                         Value(' '),
+                         'readsessionclassroom__classroom__standard',
+                         Value(' '),
+                         'readsessionclassroom__classroom__division', output_field=CharField()),
+        student_name=Concat('readsessionclassroom__classroom__classroomacademicyear__student__first_name',
+                            Value(' '),
+                            'readsessionclassroom__classroom__classroomacademicyear__student__last_name'),
+        student_gender=F('readsessionclassroom__classroom__classroomacademicyear__student__gender'),
+        student_is_dropout=F('readsessionclassroom__classroom__classroomacademicyear__student__is_dropout'),
+        student_has_attended_preschool=F(
+            'readsessionclassroom__classroom__classroomacademicyear__student__has_attended_preschool'),
+        student_is_active=F('readsessionclassroom__classroom__classroomacademicyear__student__is_active'),
+        student_attendance=F('studentfeedback__attendance')
+    ).values_list(
+        'session_id',
+        'session_type',
+        'session_academic_year',
+        'session_start_date_time',
+        'session_end_date_time',
+        'session_is_evaluated',
+        'session_is_verified',
+        'session_is_cancelled',
+        'session_level',
+        'session_feedback_comments',
+        'school_name',
+        'school_ngo',
+        'school_category',
+        'school_type',
+        'school_medium',
+        'school_is_active',
+        'classroom',
+        'student_name',
+        'student_gender',
+        'student_is_dropout',
+        'student_has_attended_preschool',
+        'student_is_active',
+        'student_attendance'
+    )
+
+
+def table_exists(cursor, table_name):
+    return table_name in connection.introspection.table_names(cursor)
+
+
+def get_refresh_mark(cursor, table_name):
+    cursor.execute("CREATE TABLE IF NOT EXISTS %s (table_name varchar(%d) PRIMARY KEY, refreshed_at timestamp with "
+                   "time zone NOT NULL)" % (connection.ops.quote_name(SUPERSET_REFRESH_MARKS_TABLE),
+                                            MAX_IDENTIFIER_LENGTH))
+    cursor.execute("SELECT refreshed_at FROM %s WHERE table_name = %%s" %
+                   connection.ops.quote_name(SUPERSET_REFRESH_MARKS_TABLE), [table_name])
+    row = cursor.fetchone()
+    return row[0] if row else None
 
-def _superset_init():
+
+def set_refresh_mark(cursor, table_name, refreshed_at):
+    get_refresh_mark(cursor, table_name)
+    cursor.execute("DELETE FROM %s WHERE table_name = %%s" % connection.ops.quote_name(SUPERSET_REFRESH_MARKS_TABLE),
+                   [table_name])
+    cursor.execute("INSERT INTO %s (table_name, refreshed_at) VALUES (%%s, %%s)" %
+                   connection.ops.quote_name(SUPERSET_REFRESH_MARKS_TABLE), [table_name, refreshed_at])
+
+
+def _superset_rebuild(cursor, ngo, table_name, refreshed_at):
+    # Build the new table next to the live one so dashboards keep working until the swap
+    shadow_table_name = table_name + SUPERSET_SHADOW_SUFFIX
+    cursor.execute("DROP TABLE IF EXISTS %s" % connection.ops.quote_name(shadow_table_name))
+    create_table_as(shadow_table_name, get_feedback_sessions(ngo))
+
+    with transaction.atomic():
+        cursor.execute("DROP TABLE IF EXISTS %s" % connection.ops.quote_name(table_name))
+        cursor.execute("ALTER TABLE %s RENAME TO %s" % (connection.ops.quote_name(shadow_table_name),
+                                                        connection.ops.quote_name(table_name)))
+        set_refresh_mark(cursor, table_name, refreshed_at)
+
+
+def _superset_refresh(cursor, ngo, table_name, refreshed_at, refresh_mark):
+    # A session changes when it is edited or when feedback on it is saved
+    changed_session_ids = list(ReadSession.objects.filter(
+        Q(last_modification_time__gt=refresh_mark) |
+        Q(studentfeedback__last_modification_time__gt=refresh_mark),
+        readsessionclassroom__classroom__school__ngo=ngo).values_list('id', flat=True).distinct())
+
+    with transaction.atomic():
+        quoted_table_name = connection.ops.quote_name(table_name)
+        cursor.execute("DELETE FROM %s WHERE session_id NOT IN (SELECT id FROM %s)" % (
+            quoted_table_name, connection.ops.quote_name(ReadSession._meta.db_table)))
+        if changed_session_ids:
+            cursor.execute("DELETE FROM %s WHERE session_id IN (%s)" % (
+                quoted_table_name, ", ".join(["%s"] * len(changed_session_ids))), changed_session_ids)
+            insert_into(table_name, get_feedback_sessions(ngo).filter(id__in=changed_session_ids))
+        set_refresh_mark(cursor, table_name, refreshed_at)
+    return len(changed_session_ids)
+
+
+def _superset_init(incremental=False):
     with connection.cursor() as cursor:
-        ngos = NGO.objects.all().values_list("name", flat=True)
-
-        # /Drop temporary tables in case the process got cut off before
-        for ngo in ngos:
-            drop_table_str = "DROP TABLE IF EXISTS %s_sessions_feedback_master_details" % ngo
-            cursor.execute(
-                drop_table_str
-            )
-            # Create the new table from the summary query
-            ngo_filter = {
-                'readsessionclassroom__classroom__school__ngo__name': ngo,
-                'readsessionclassroom__classroom__school__ngo__is_active': True
-            }
-            feedback_sessions = ReadSession.objects.filter(**ngo_filter).annotate(
-                session_id=F('id'),
-                session_type=F('type'),
-                session_academic_year=F('academic_year__name'),
-                session_start_date_time=F('start_date_time'),
-                session_end_date_time=F('end_date_time'),
-                session_is_evaluated=F('is_evaluated'),
-                session_is_verified=F('is_verified'),
-                session_is_cancelled=F('is_cancelled'),
-                session_level=F('studentfeedback__level__en_in'),
-                session_feedback_comments=F('studentfeedback__comments'),
-                school_name=F('readsessionclassroom__classroom__school__name'),
-                school_ngo=F('readsessionclassroom__classroom__school__ngo__name'),
-                school_category=F('readsessionclassroom__classroom__school__school_category__name'),
-                school_type=F('readsessionclassroom__classroom__school__school_type__name'),
-                school_medium=F('readsessionclassroom__classroom__school__medium__name'),
-                school_is_active=F('readsessionclassroom__classroom__school__is_active'),
-                classroom=Concat('readsessionclassroom__classroom__school__name',
-                                 Value(' '),
-                                 'readsessionclassroom__classroom__standard',
-                                 Value(' '),
-                                 'readsessionclassroom__classroom__division', output_field=CharField()),
-                student_name=Concat('readsessionclassroom__classroom__classroomacademicyear__student__first_name',
-                                    Value(' '),
-                                    'readsessionclassroom__classroom__classroomacademicyear__student__last_name'),
-                student_gender=F('readsessionclassroom__classroom__classroomacademicyear__student__gender'),
-                student_is_dropout=F('readsessionclassroom__classroom__classroomacademicyear__student__is_dropout'),
-                student_has_attended_preschool=F(
-                    'readsessionclassroom__classroom__classroomacademicyear__student__has_attended_preschool'),
-                student_is_active=F('readsessionclassroom__classroom__classroomacademicyear__student__is_active'),
-                student_attendance=F('studentfeedback__attendance')
-            ).values_list(
-                'session_id',
-                'session_type',
-                'session_academic_year',
-                'session_start_date_time',
-                'session_end_date_time',
-                'session_is_evaluated',
-                'session_is_verified',
-                'session_is_cancelled',
-                'session_level',
-                'session_feedback_comments',
-                'school_name',
-                'school_ngo',
-                'school_category',
-                'school_type',
-                'school_medium',
-                'school_is_active',
-                'classroom',
-                'student_name',
-                'student_gender',
-                'student_is_dropout',
-                'student_has_attended_preschool',
-                'student_is_active',
-                'student_attendance'
-            )
-            create_table_str = "%s_sessions_feedback_master_details" % ngo
-            create_table_as(
-                create_table_str,
-                feedback_sessions,
-            )
+        ngos = NGO.objects.order_by('pk')
+
+        for ngo, table_name in superset_table_names(ngos).items():
+            # Changes made while this runs, or committed late, are picked up by the next refresh
+            refreshed_at = timezone.now() - SUPERSET_REFRESH_MARGIN
+            refresh_mark = get_refresh_mark(cursor, table_name) if incremental else None
+            if refresh_mark is not None and table_exists(cursor, table_name):
+                changed = _superset_refresh(cursor, ngo, table_name, refreshed_at, refresh_mark)
+                print("Refreshed %d sessions in %s" % (changed, table_name))
+            else:
+                _superset_rebuild(cursor, ngo, table_name, refreshed_at)
+                print("Rebuilt %s" % table_name)
 
 
 class Command(BaseCommand):
     help = 'Create tables for superset'
 
     def add_arguments(self, parser):
-        pass
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only refresh sessions changed since the last run')
 
     def handle(self, *args, **options):
-        _superset_init()
+        _superset_init(incremental=options['incremental'])
         print("Finished")
         return
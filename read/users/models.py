@@ -15,10 +15,11 @@
 from datetime import timedelta
 
 from django.db import models
+from django.db.models.signals import m2m_changed
 from django.utils.crypto import get_random_string
 from django.contrib.auth.models import AbstractUser
 from read.constants import PUBLIC_KEY_LENGTH_USER, LENGTH_TOKEN, LENGTH_RESET_PASSWORD_TOKEN
-from users.permissions import PERMISSION_CAN_IMPORT_USERS, PERMISSION_CAN_EXPORT_USERS
+from users.permissions import PERMISSION_CAN_IMPORT_USERS, PERMISSION_CAN_EXPORT_USERS, user_groups_changed
 from django.utils.translation import gettext as _
 
 
@@ -74,6 +75,12 @@ class User(AbstractUser):
         )
 
 
+# Signals are used where every write sends them: adding, removing, setting or clearing groups all send
+# m2m_changed, which is not the case for the bulk writes that refresh student levels explicitly
+m2m_changed.connect(user_groups_changed, sender=User.groups.through)
+m2m_changed.connect(user_groups_changed, sender=User.user_permissions.through)
+
+
 class MobileAuthToken(models.Model):
     token = models.CharField(max_length=LENGTH_TOKEN, default=generate_user_auth_token, unique=True)
     user = models.ForeignKey('users.User', null=True, blank=False, on_delete=models.PROTECT)
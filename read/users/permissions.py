@@ -12,6 +12,10 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import namedtuple
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
 from rest_framework import permissions
 
 # NGOS
@@ -145,10 +149,54 @@ PERMISSIONS_NGO_BOOK_FAIRY = PERMISSIONS_SESSION + [PERMISSION_CAN_VIEW_INVENTOR
 PERMISSION_NGO_SUPERVISIOR = PERMISSIONS_SESSION + [PERMISSION_CAN_VIEW_USER, PERMISSION_CAN_CHANGE_USER]
 
 
+# Changes are invalidated in the cache of the worker that made them. Unless CACHES is shared, the other workers
+# pick them up when their entry expires, as they do for permissions changed on a group
+USER_PERMISSIONS_CACHE_TTL = 60
+
+UserPermissions = namedtuple('UserPermissions', ['group_names', 'permissions'])
+
+
+def _user_permissions_cache_key(user_id):
+    return 'user_permissions:%s' % user_id
+
+
+def get_user_permissions(user):
+    if not user or not user.is_authenticated:
+        return UserPermissions((), frozenset())
+
+    # Kept on the user object for the rest of the request, and shared between requests for a short while
+    user_permissions = getattr(user, '_user_permissions', None)
+    if user_permissions is None:
+        user_permissions = cache.get(_user_permissions_cache_key(user.pk))
+        if user_permissions is None:
+            codenames = (Permission.objects.filter(group__user=user) | Permission.objects.filter(user=user)) \
+                .values_list('content_type__app_label', 'codename').distinct()
+            user_permissions = UserPermissions(tuple(sorted(user.groups.values_list('name', flat=True))),
+                                               frozenset('%s.%s' % codename for codename in codenames))
+            cache.set(_user_permissions_cache_key(user.pk), user_permissions, USER_PERMISSIONS_CACHE_TTL)
+        user._user_permissions = user_permissions
+    return user_permissions
+
+
+def invalidate_user_permissions(user_ids):
+    cache.delete_many([_user_permissions_cache_key(user_id) for user_id in user_ids])
+
+
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_user_permissions([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_permissions(pk_set)
+    elif action == 'pre_clear':
+        invalidate_user_permissions(instance.user_set.values_list('pk', flat=True))
+
+
 def has_permission(request, permission):
-    if request.user and request.user.has_perm(permission[2]):
-        return True
-    return False
+    user = request.user
+    if not user or not user.is_authenticated or not user.is_active:
+        return False
+    return user.is_superuser or permission[2] in get_user_permissions(user).permissions
 
 
 class IsSuperUser(permissions.BasePermission):
@@ -169,11 +217,8 @@ class IsBookFairy(permissions.BasePermission):
     """
 
     def has_permission(self, request, view):
-        if request.user:
-            groups = request.user.groups.all()
-            if groups.count() == 1 and groups[0].name.find(GroupType.BOOK_FAIRY.value) != -1:
-                return True
-        return False
+        group_names = get_user_permissions(request.user).group_names
+        return len(group_names) == 1 and group_names[0].find(GroupType.BOOK_FAIRY.value) != -1
 
 
 class CanAddUser(permissions.BasePermission):
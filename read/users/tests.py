@@ -12,6 +12,322 @@
 #    You should have received a copy of the GNU Affero General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from django.test import TestCase
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from academic_years.models import AcademicYear
+from classrooms.models import Classroom
+from ngos.models import NGO
+from read import translations
+from read.authentication import get_mobile_auth_token_cache_ttl, MOBILE_AUTH_TOKEN_CACHE_TTL, \
+    MOBILE_AUTH_TOKEN_LOCAL_CACHE_TTL
+from read.constants import GroupType
+from read.utils import get_ngo_specific_group_name, get_group_type_from_request_user
+from read_sessions.models import ReadSession, ReadSessionClassroom
+from schools.models import School, SchoolCategory, SchoolType, SchoolMedium, Standard
+from users.management.commands import locale_json, superset
+from users.models import User, MobileAuthToken
+from users.permissions import has_permission, IsBookFairy, PERMISSION_CAN_VIEW_BOOK
+
+
+class MobileAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ngo = NGO.objects.create(name='NGO', address='Pune')
+        self.user = User.objects.create_user(username='fairy', password='fairy', first_name='Book',
+                                             last_name='Fairy', ngo=ngo)
+        self.user.groups.add(Group.objects.create(name=get_ngo_specific_group_name(GroupType.BOOK_FAIRY, ngo.key)))
+        self.token = MobileAuthToken.objects.create(user=self.user, expiry_date=timezone.now() + timedelta(days=30))
+
+    def client_for(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        return client
+
+    def is_authenticated(self, token):
+        return self.client_for(token).get('/is_authenticated').data['is_authenticated']
+
+    def test_token_is_cached_until_logout(self):
+        self.assertTrue(self.is_authenticated(self.token.token))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.is_authenticated(self.token.token))
+        # Only the user is loaded, not the token
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(self.client_for(self.token.token).post('/mobile_logout').status_code, 200)
+        self.assertFalse(self.is_authenticated(self.token.token))
+
+    def test_deactivated_user_is_locked_out_while_token_is_cached(self):
+        self.assertTrue(self.is_authenticated(self.token.token))
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertFalse(self.is_authenticated(self.token.token))
+
+    def test_token_cache_is_short_lived_unless_shared(self):
+        self.assertEqual(get_mobile_auth_token_cache_ttl(), MOBILE_AUTH_TOKEN_LOCAL_CACHE_TTL)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache', 'LOCATION': '127.0.0.1:11211'}}):
+            self.assertEqual(get_mobile_auth_token_cache_ttl(), MOBILE_AUTH_TOKEN_CACHE_TTL)
+
+    def test_refresh_replaces_token(self):
+        response = self.client_for(self.token.token).post('/refresh_mobile_token')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.is_authenticated(self.token.token))
+        self.assertTrue(self.is_authenticated(response.data['token']))
+
+    def test_purge_deletes_expired_tokens(self):
+        MobileAuthToken.objects.create(user=self.user, expiry_date=timezone.now() - timedelta(days=1))
+        call_command('purge_mobile_auth_tokens')
+        self.assertEqual(list(MobileAuthToken.objects.all()), [self.token])
+
+
+class SupersetTestCase(TestCase):
+
+    def setUp(self):
+        self.ngo = NGO.objects.create(name='Read NGO', address='Pune')
+        self.academic_year = AcademicYear.objects.create(name='AY 19-20')
+        school = School.objects.create(name='School', address='Pune', pin_code=411001, ngo=self.ngo,
+                                       school_category=SchoolCategory.objects.create(name='SCHOOL_CATEGORY_CO_ED'),
+                                       school_type=SchoolType.objects.create(name='SCHOOL_TYPE_PMC'),
+                                       medium=SchoolMedium.objects.create(name='SCHOOL_MEDIUM_MARATHI'))
+        self.classroom = Classroom.objects.create(school=school, standard=Standard.objects.create(name='STANDARD_I'))
+        self.table_name = superset.superset_table_names([self.ngo])[self.ngo]
+
+    def create_session(self):
+        now = timezone.now()
+        read_session = ReadSession.objects.create(academic_year=self.academic_year, start_date_time=now,
+                                                  end_date_time=now + timedelta(hours=1), type='REGULAR',
+                                                  start_time='10:00', end_time='11:00')
+        ReadSessionClassroom.objects.create(read_session=read_session, classroom=self.classroom)
+        return read_session
+
+    def session_ids(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT session_id FROM %s" % connection.ops.quote_name(self.table_name))
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def test_table_names_do_not_depend_on_order(self):
+        other_ngo = NGO.objects.create(name='Read-NGO', address='Mumbai')
+        table_names = superset.superset_table_names([other_ngo, self.ngo])
+        self.assertEqual(table_names, superset.superset_table_names([self.ngo, other_ngo]))
+        self.assertEqual(table_names[self.ngo], 'read_ngo' + superset.SUPERSET_TABLE_SUFFIX)
+        self.assertNotEqual(table_names[other_ngo], table_names[self.ngo])
+
+    def test_rebuild_and_incremental_refresh(self):
+        first = self.create_session()
+        call_command('superset', incremental=True)
+        self.assertEqual(self.session_ids(), [first.id])
+
+        second = self.create_session()
+        call_command('superset', incremental=True)
+        self.assertEqual(self.session_ids(), [first.id, second.id])
+
+        # Saved before the last refresh started, but committed after it
+        late = self.create_session()
+        ReadSession.objects.filter(pk=late.pk).update(last_modification_time=timezone.now() - timedelta(minutes=5))
+        ReadSessionClassroom.objects.filter(read_session=second).delete()
+        second.delete()
+        call_command('superset', incremental=True)
+        self.assertEqual(self.session_ids(), [first.id, late.id])
+
+        call_command('superset')
+        self.assertEqual(self.session_ids(), [first.id, late.id])
+
+
+class UserPermissionsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ngo = NGO.objects.create(name='NGO', address='Pune')
+        self.book_fairies = Group.objects.create(name=get_ngo_specific_group_name(GroupType.BOOK_FAIRY, ngo.key))
+        self.book_fairies.permissions.add(Permission.objects.get(codename=PERMISSION_CAN_VIEW_BOOK[0],
+                                                                 content_type__app_label='books'))
+        self.supervisors = Group.objects.create(name=get_ngo_specific_group_name(GroupType.SUPERVISOR, ngo.key))
+        self.user = User.objects.create_user(username='fairy', password='fairy', first_name='Book',
+                                             last_name='Fairy', ngo=ngo)
+        self.user.groups.add(self.book_fairies)
+
+    def check_user(self):
+        request = APIRequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        return (has_permission(request, PERMISSION_CAN_VIEW_BOOK), IsBookFairy().has_permission(request, None),
+                get_group_type_from_request_user(request.user))
+
+    def test_checks_are_answered_from_cache(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.check_user(), (True, True, GroupType.BOOK_FAIRY))
+        self.assertEqual(len(queries), 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.check_user(), (True, True, GroupType.BOOK_FAIRY))
+        self.assertEqual(len(queries), 1)
+
+    def test_group_changes_invalidate_cache(self):
+        self.check_user()
+        self.user.groups.add(self.supervisors)
+        self.assertEqual(self.check_user(), (True, False, None))
+        self.supervisors.user_set.remove(self.user)
+        self.assertEqual(self.check_user(), (True, True, GroupType.BOOK_FAIRY))
+        self.book_fairies.user_set.clear()
+        self.assertEqual(self.check_user(), (False, False, None))
+
+
+class TranslationsTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_one_language_per_accept_language(self):
+        response = self.client.get('/translations', HTTP_ACCEPT_LANGUAGE='mr_IN')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(list(data), ['mr_IN'])
+        with open('static/locale_mr_IN.json', encoding='utf-8') as data_file:
+            self.assertEqual(data['mr_IN'], json.load(data_file))
+
+        response = self.client.get('/translations', HTTP_ACCEPT_LANGUAGE='en-US,en;q=0.9')
+        self.assertEqual(sorted(json.loads(response.content.decode('utf-8'))), ['en_IN', 'mr_IN'])
+        with open('static/locale_manifest.json', encoding='utf-8') as manifest_file:
+            self.assertEqual(response['ETag'], 'W/"%s"' % json.load(manifest_file)['version'])
+
+    def test_etag_and_gzip(self):
+        response = self.client.get('/translations', HTTP_ACCEPT_LANGUAGE='en_IN', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('en_IN', json.loads(gzip.decompress(response.content).decode('utf-8')))
+
+        response = self.client.get('/translations', HTTP_ACCEPT_LANGUAGE='en_IN', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/translations', HTTP_ACCEPT_LANGUAGE='mr_IN', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_files_are_read_once_until_modified(self):
+        with mock.patch.dict(translations._translation_files, clear=True), \
+                mock.patch.dict(translations._translation_bundles, clear=True), \
+                mock.patch('read.translations.open', mock.mock_open(read_data=b'{"KEY": "value"}')) as mock_open, \
+                mock.patch('read.translations.os.stat') as mock_stat:
+            mock_stat.return_value.st_mtime_ns = 1
+            first = translations.get_translation_bundle(['en_IN'])
+            self.assertIs(translations.get_translation_bundle(['en_IN']), first)
+            self.assertEqual(mock_open.call_count, 1)
+
+            mock_stat.return_value.st_mtime_ns = 2
+            self.assertIsNot(translations.get_translation_bundle(['en_IN']), first)
+            self.assertEqual(mock_open.call_count, 2)
+
+
+PO_FILE = r"""#, fuzzy
+msgid ""
+msgstr ""
+"Language: mr_IN\n"
+
+#, fuzzy
+msgid "LABEL_BOOK"
+msgstr "पुस्तक"
+
+msgid ""
+"LABEL_LONG_"
+"MESSAGE"
+msgstr ""
+"Say \"hello\" "
+"twice"
+
+msgid "LABEL_UNTRANSLATED"
+msgstr ""
+
+msgctxt "menu"
+msgid "LABEL_BOOK"
+msgstr "वही"
+
+msgid "LABEL_BOOK_COUNT"
+msgid_plural "LABEL_BOOK_COUNTS"
+msgstr[0] "एक पुस्तक"
+msgstr[1] "पुस्तके"
+
+#~ msgid "LABEL_OLD"
+#~ msgstr "जुने"
+"""
+
+
+class LocaleJsonTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for locale in ('en_IN', 'mr_IN'):
+            os.makedirs(os.path.join(self.directory.name, locale, 'LC_MESSAGES'))
+            with open(locale_json.get_po_path(locale, 'django', self.directory.name), 'w', encoding='utf-8') as f:
+                f.write(PO_FILE)
+        for name, path in (('TRANSLATION_BUNDLE_PATH', 'locale_bundle.json'),
+                           ('TRANSLATION_MANIFEST_PATH', 'locale_manifest.json')):
+            patcher = mock.patch.object(locale_json, name, os.path.join(self.directory.name, path))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(locale_json, 'get_translation_file_path',
+                                    lambda locale: os.path.join(self.directory.name, 'locale_%s.json' % locale))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_compile_po_file(self):
+        messages = locale_json.compile_po_file(locale_json.get_po_path('mr_IN', 'django', self.directory.name))
+        self.assertEqual(messages, {
+            'LABEL_BOOK': 'पुस्तक',
+            'LABEL_LONG_MESSAGE': 'Say "hello" twice',
+            'menu\x04LABEL_BOOK': 'वही',
+            'LABEL_BOOK_COUNT': ['एक पुस्तक', 'पुस्तके'],
+        })
+
+    def test_only_changed_locales_are_written(self):
+        manifest, changed = locale_json.po_to_json(['en_IN', 'mr_IN'], 'django', self.directory.name)
+        self.assertEqual(changed, ['en_IN', 'mr_IN'])
+        with open(locale_json.TRANSLATION_BUNDLE_PATH, 'rb') as f:
+            bundle = f.read()
+        self.assertEqual(translations.get_translation_hash(bundle), manifest['version'])
+        self.assertEqual(json.loads(bundle.decode('utf-8'))['mr_IN']['LABEL_BOOK'], 'पुस्तक')
+
+        with mock.patch.object(locale_json, 'compile_po_file') as compile_po_file:
+            self.assertEqual(locale_json.po_to_json(['en_IN', 'mr_IN'], 'django', self.directory.name),
+                             (manifest, []))
+            compile_po_file.assert_not_called()
+
+        with open(locale_json.get_po_path('en_IN', 'django', self.directory.name), 'a', encoding='utf-8') as f:
+            f.write('\nmsgid "LABEL_NEW"\nmsgstr "New"\n')
+        new_manifest, changed = locale_json.po_to_json(['en_IN', 'mr_IN'], 'django', self.directory.name)
+        self.assertEqual(changed, ['en_IN'])
+        self.assertNotEqual(new_manifest['version'], manifest['version'])
+
+
+class WorkerStartupTestCase(SimpleTestCase):
+    # Loading the URLconf imports every view module, which is what a worker does before its first request
+    HEAVY_MODULES = ('reportlab', 'xlsxwriter', 'openpyxl')
+    URLCONF_IMPORT_BUDGET = 1.0
+
+    def test_urlconf_import_time(self):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                 'import django; django.setup(); import read.urls'],
+                                cwd=settings.BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        imports = {}
+        for line in result.stderr.decode().splitlines():
+            if line.startswith('import time:') and '|' in line:
+                self_time, cumulative, module = line[len('import time:'):].split('|')
+                if cumulative.strip().isdigit():
+                    imports[module.strip()] = int(cumulative) / 1000000
+
+        self.assertIn('read.urls', imports)
+        heavy = [module for module in imports if module.split('.')[0] in self.HEAVY_MODULES]
+        self.assertEqual(heavy, [])
+        self.assertLess(imports['read.urls'], self.URLCONF_IMPORT_BUDGET)
@@ -32,11 +32,10 @@ def validate_create_user_request(request):
 
     return True, "No error"
 
-def validate_user_file_excel_content(rows):
-    if len(rows) == 0:
+def validate_user_file_excel_content(header_row):
+    if not header_row:
         return False, "Empty rows"
-    header_row = [cell.value for cell in rows[0]]
-    if header_row != USERS_EXCEL_FIELDS:
+    if [cell.value for cell in header_row] != USERS_EXCEL_FIELDS:
         return False, "Error in header"
 
     return True, "No error"
@@ -22,12 +22,16 @@ from rest_framework.response import Response
 from rest_framework.utils import json
 from rest_framework.viewsets import ViewSet
 
+from read.authentication import expire_mobile_auth_token
 from read.constants import GroupType, ERROR_LOGIN_1_JSON, \
     ERROR_LOGIN_2_JSON, ERROR_LOGIN_3_JSON, ERROR_LOGIN_4_JSON, ERROR_LOGIN_5_JSON, \
     SUCCESS_LOGOUT_1_JSON, ERROR_LOGOUT_1_JSON, ERROR_403_JSON, SUCCESS_LANGUAGE_CHANGE_JSON, ERROR_400_JSON, \
     ERROR_500_JSON, API_URL
+from read.activation import set_keys_active
+from read.tenancy import belongs_to_ngo
+from read.translations import create_translations_response
 from read.utils import get_ngo_specific_group_name, create_serializer_error, \
- create_response_error, request_user_belongs_to_users_ngo, request_user_belongs_to_user_ngo
+ create_response_error, request_user_belongs_to_user_ngo
 
 from read.validators import validate_user_type
 from users.models import User, MobileAuthToken, UserResetPassword
@@ -91,19 +95,24 @@ class UserViewSet(ViewSet):
             return Response(serializer.data)
         return Response(status=400, data=create_serializer_error(serializer))
 
-    @action(methods=['POST'], detail=False, permission_classes=[CanDeleteUser])
+    @action(methods=['POST'], detail=False,
+            permission_classes=[CanDeleteUser, belongs_to_ngo(User, allow_read_admin=True)])
     def deactivate_user(self, request, pk=None):
         keys = request.data.get('keys')
         user_keys = json.loads(keys)
 
-        if not request_user_belongs_to_users_ngo(request, user_keys):
-            return Response(status=403, data=ERROR_403_JSON())
+        # READ admins have no NGO and may change users of any NGO
+        count = set_keys_active(User, user_keys, False, ngo=request.user.ngo)
+        return Response({'users': count})
 
-        users = User.objects.filter(key__in=user_keys)
-        for user in users:
-            user.is_active = False
-            user.save()
-        return Response(status=204)
+    @action(methods=['POST'], detail=False,
+            permission_classes=[CanDeleteUser, belongs_to_ngo(User, allow_read_admin=True)])
+    def activate_user(self, request, pk=None):
+        keys = request.data.get('keys')
+        user_keys = json.loads(keys)
+
+        count = set_keys_active(User, user_keys, True, ngo=request.user.ngo)
+        return Response({'users': count})
 
     @action(methods=['POST'], detail=True, permission_classes=[CanChangeUser])
     def set_language(self, request, pk=None):
@@ -235,6 +244,8 @@ def login_mobile_view(request):
 @api_view(['POST'])
 def logout_mobile_view(request):
     if request.user and request.user.is_authenticated:
+        if isinstance(request.auth, MobileAuthToken):
+            expire_mobile_auth_token(request.auth)
         logout(request)
         return Response(data=SUCCESS_LOGOUT_1_JSON(), status=200)
     else:
@@ -247,6 +258,8 @@ def refresh_mobile_token_view(request):
     if request.user and request.user.is_authenticated:
         expiry_date = datetime.now(tz=timezone.utc) + timedelta(days=30)
         auth_token = MobileAuthToken.objects.create(user=request.user, expiry_date=expiry_date)
+        if isinstance(request.auth, MobileAuthToken):
+            expire_mobile_auth_token(request.auth)
         return Response(status=200, data={
             'token': auth_token.token,
             'expiry_date': auth_token.expiry_date,
@@ -344,17 +357,7 @@ def is_authenticated(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def translations(request):
-    response = {}
-    with open('static/locale_en_IN.json', encoding='utf-8') as data_file:
-        data = json.loads(data_file.read())
-        data_file.close()
-        response.update({'en_IN': data})
-    with open('static/locale_mr_IN.json', encoding='utf-8') as data_file:
-        data = json.loads(data_file.read())
-        data_file.close()
-        response.update({'mr_IN': data})
-
-    return Response(status=200, data=response)
+    return create_translations_response(request)
 
 
 @api_view(['GET'])